@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
 import datetime
+import json
+import os
+import concurrent.futures
 from src.data_manager import DataManager
+from src.formatting import format_records, format_record_labels
+from src.importer import import_statement, DEFAULT_CATEGORIES
+from src.categorizer import Categorizer, load_rules, save_rules
+from src.trends import GRANULARITIES, GRANULARITY_LABELS, build_trend, trend_figure, balance_figure
+from src.metrics import metrics, METRICS_ENV, METRICS_PORT_ENV
+from src import profiler
 import plotly.express as px
-import plotly.graph_objects as go
 
 # 应用版本信息
 APP_VERSION = "0.0.1"
@@ -202,6 +210,15 @@ def get_data_manager():
 
 data_manager = get_data_manager()
 
+@st.cache_resource
+def start_metrics_server(port):
+    """启动Prometheus指标服务，每个进程只启动一次"""
+    metrics.enable()
+    return metrics.serve_prometheus(port)
+
+if os.environ.get(METRICS_PORT_ENV):
+    start_metrics_server(int(os.environ[METRICS_PORT_ENV]))
+
 def is_wechat_browser():
     """
     检测是否在微信浏览器中运行
@@ -280,7 +297,45 @@ def show_wechat_warning():
     </div>
     """, unsafe_allow_html=True)
 
+def show_profiler_panel():
+    """开启耗时分析时，在页面底部显示本次运行各部分的耗时"""
+    rerun_profiler = profiler.current()
+    if rerun_profiler is None:
+        return
+    
+    total = rerun_profiler.total_seconds()
+    with st.expander(f"⏱️ 本次运行耗时 {total * 1000:.1f} ms", expanded=False):
+        rows = [
+            {
+                '部分': '　' * row['depth'] + row['name'],
+                '耗时(ms)': round(row['seconds'] * 1000, 2),
+                '占比': f"{row['seconds'] / total:.1%}" if total else "-"
+            }
+            for row in rerun_profiler.rows
+        ]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        
+        if rerun_profiler.profile_text:
+            st.markdown(f"#### 🔬 页面函数分析（{rerun_profiler.mode}）")
+            st.code(rerun_profiler.profile_text, language=None)
+        else:
+            st.caption(f"在网址后加 ?{profiler.PROFILE_QUERY_PARAM}=cprofile 或 ?{profiler.PROFILE_QUERY_PARAM}=pyinstrument 可查看页面函数的函数级分析")
+
+def get_profile_param():
+    """读取网址中的耗时分析参数，Streamlit 1.30 之前没有 st.query_params，改用实验接口"""
+    if hasattr(st, 'query_params'):
+        return st.query_params.get(profiler.PROFILE_QUERY_PARAM)
+    values = st.experimental_get_query_params().get(profiler.PROFILE_QUERY_PARAM)
+    return values[0] if values else None
+
 def main():
+    # 通过环境变量或网址参数开启耗时分析，URL参数优先
+    mode = profiler.resolve_mode(
+        get_profile_param(),
+        os.environ.get(profiler.PROFILE_ENV)
+    )
+    profiler.activate(profiler.RerunProfiler(mode) if mode else None)
+    
     # 微信浏览器检测和提示
     st.components.v1.html("""
     <script>
@@ -394,6 +449,7 @@ def main():
     })();
     </script>
     """, height=0)
+    profiler.checkpoint("微信检测脚本")
     
     # 主标题和版本信息
     col1, col2 = st.columns([3, 1])
@@ -418,7 +474,7 @@ def main():
         st.markdown("## 📊 功能菜单")
         page = st.selectbox(
             "选择功能",
-            ["📝 记账", "📈 统计", "📋 记录查看", "⚙️ 设置"]
+            ["📝 记账", "📈 统计", "📋 记录查看", "📥 导入账单", "⚙️ 设置"]
         )
         
         st.markdown("---")
@@ -440,23 +496,58 @@ def main():
         st.markdown("---")
         st.markdown("## 💡 使用提示")
         st.info("点击上方菜单选择不同功能")
+    profiler.checkpoint("标题和侧边栏")
+    
+    show_version_history = st.session_state.get('show_version_history', False)
+    with profiler.section("📜 版本历史" if show_version_history else page, profile=True):
+        # 版本历史查看
+        if show_version_history:
+            show_version_history_page()
+        # 根据选择显示不同页面
+        elif page == "📝 记账":
+            show_add_record_page()
+        elif page == "📈 统计":
+            show_statistics_page()
+        elif page == "📋 记录查看":
+            show_records_page()
+        elif page == "📥 导入账单":
+            show_import_page()
+        elif page == "⚙️ 设置":
+            show_settings_page()
     
-    # 版本历史查看
-    if st.session_state.get('show_version_history', False):
-        show_version_history_page()
-    # 根据选择显示不同页面
-    elif page == "📝 记账":
-        show_add_record_page()
-    elif page == "📈 统计":
-        show_statistics_page()
-    elif page == "📋 记录查看":
-        show_records_page()
-    elif page == "⚙️ 设置":
-        show_settings_page()
+    show_profiler_panel()
+
+# 等待后台保存记录的最长时间（秒），超时后下次运行页面时再显示结果
+SAVE_WAIT_SECONDS = 60
+
+def show_save_results():
+    """等待已提交的记录由后台线程写完，并显示写入结果"""
+    futures = st.session_state.get('save_futures', [])
+    if not futures:
+        return
+    
+    # 写入通常很快就完成；合并日志等较慢的写入先显示提示，写完后原地换成结果
+    placeholder = st.empty()
+    done, pending = concurrent.futures.wait(futures, timeout=0.5)
+    if pending:
+        placeholder.info("⏳ 记录正在后台保存...")
+        done, pending = concurrent.futures.wait(futures, timeout=SAVE_WAIT_SECONDS)
+        if pending:
+            return
+    
+    del st.session_state['save_futures']
+    failed = sum(1 for future in done if not future.result())
+    if failed:
+        placeholder.error(f"❌ 有 {failed} 条记录保存失败，请重试")
+    else:
+        placeholder.success("✅ 记录保存成功！")
 
 def show_add_record_page():
     st.markdown("## 📝 添加记账记录")
     
+    # 之前提交的记录由后台线程写入，这里显示写入结果
+    show_save_results()
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -513,60 +604,113 @@ def show_add_record_page():
             # 组合日期和时间
             datetime_obj = datetime.datetime.combine(date, time)
             
-            # 保存记录
-            success = data_manager.add_record(
+            # 交给后台线程保存，重新运行页面时显示结果；还没显示结果的记录不会被覆盖
+            future = data_manager.add_record_async(
                 record_type="支出" if record_type == "💸 支出" else "收入",
                 amount=amount,
                 category=category,
                 date=datetime_obj,
                 note=note
             )
-            
-            if success:
-                st.success("✅ 记录保存成功！")
-                st.rerun()
-            else:
-                st.error("❌ 保存失败，请重试")
+            st.session_state.save_futures = st.session_state.get('save_futures', []) + [future]
+            st.rerun()
         else:
             st.warning("⚠️ 请输入有效的金额")
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_date_bounds(data_version):
+    """全部记录的最早和最晚日期，没有记录时返回None，按数据版本缓存"""
+    rollup = data_manager.get_rollup()
+    if rollup.empty:
+        return None
+    return rollup['日期'].min().date(), rollup['日期'].max().date()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_statistics_view(data_version, start_date, end_date, granularity='auto'):
+    """
+    计算统计页面的收支合计和图表，按数据版本、时间范围和趋势粒度缓存
+    
+    数据未变化时调整其他控件引起的重绘直接复用结果，不再重新汇总和生成图表。
+    
+    Returns:
+        tuple: (统计结果, 收支趋势图, 支出分类饼图, 余额走势图, 截至结束日期的累计结余)，
+            所选时间范围内没有数据时返回None
+    """
+    rollup_filtered = data_manager.get_rollup(start_date, end_date)
+    
+    if rollup_filtered.empty:
+        return None
+    
+    # 计算统计信息
+    stats = data_manager.get_statistics(start_date, end_date)
+    
+    # 收支趋势图，范围较长时按周、月或季度合计，点数多时降采样
+    trend, granularity = build_trend(rollup_filtered, granularity, start_date, end_date)
+    trend_fig = trend_figure(trend, granularity)
+    
+    # 支出分类饼图
+    pie_fig = None
+    expense_data = rollup_filtered[rollup_filtered['类型'] == '支出']
+    if not expense_data.empty:
+        category_data = expense_data.groupby('分类')['金额'].sum()
+        
+        pie_fig = px.pie(
+            values=category_data.values,
+            names=category_data.index,
+            title="💸 支出分类分布",
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+        pie_fig.update_traces(textposition='inside', textinfo='percent+label')
+    
+    # 余额走势图，开始日期之前的记录也计入余额
+    balance_fig = balance_figure(data_manager.get_balance_series(start_date, end_date))
+    closing_balance = data_manager.balance_at(end_date)
+    
+    return stats, trend_fig, pie_fig, balance_fig, closing_balance
+
 def show_statistics_page():
     st.markdown("## 📈 统计分析")
     
-    # 获取数据
-    df = data_manager.get_all_records()
+    # 数据版本不变时，下面的汇总和图表都直接取自缓存
+    data_version = data_manager.get_version()
+    date_bounds = get_date_bounds(data_version)
+    profiler.checkpoint("数据版本和日期范围")
     
-    if df.empty:
+    if date_bounds is None:
         st.info("📊 暂无数据，请先添加一些记录")
         return
     
-    # 时间范围选择
-    col1, col2 = st.columns(2)
+    # 时间范围和趋势粒度选择
+    col1, col2, col3 = st.columns(3)
     with col1:
         start_date = st.date_input(
             "开始日期",
-            value=df['日期'].min().date() if not df.empty else datetime.date.today()
+            value=date_bounds[0]
         )
     with col2:
         end_date = st.date_input(
             "结束日期",
-            value=df['日期'].max().date() if not df.empty else datetime.date.today()
+            value=date_bounds[1]
+        )
+    with col3:
+        granularity = st.selectbox(
+            "趋势粒度",
+            ['auto'] + list(GRANULARITIES),
+            format_func=lambda option: "自动" if option == 'auto' else GRANULARITY_LABELS[option]
         )
     
     # 筛选数据
-    df_filtered = df[
-        (df['日期'].dt.date >= start_date) & 
-        (df['日期'].dt.date <= end_date)
-    ]
+    view = build_statistics_view(data_version, start_date, end_date, granularity)
+    profiler.checkpoint("统计汇总和图表构建")
     
-    if df_filtered.empty:
+    if view is None:
         st.warning("⚠️ 所选时间范围内没有数据")
         return
     
-    # 计算统计信息
-    total_income = df_filtered[df_filtered['类型'] == '收入']['金额'].sum()
-    total_expense = df_filtered[df_filtered['类型'] == '支出']['金额'].sum()
-    balance = total_income - total_expense
+    stats, trend_fig, pie_fig, balance_fig, closing_balance = view
+    total_income = stats['total_income']
+    total_expense = stats['total_expense']
+    balance = stats['balance']
     
     # 显示统计卡片
     col1, col2, col3 = st.columns(3)
@@ -587,63 +731,75 @@ def show_statistics_page():
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("---")
+    profiler.checkpoint("统计卡片")
     
     # 图表展示
     col1, col2 = st.columns(2)
     
     with col1:
-        # 收支趋势图
-        daily_data = df_filtered.groupby([df_filtered['日期'].dt.date, '类型'])['金额'].sum().unstack(fill_value=0)
-        
-        if not daily_data.empty:
-            fig = go.Figure()
-            if '收入' in daily_data.columns:
-                fig.add_trace(go.Scatter(
-                    x=daily_data.index,
-                    y=daily_data['收入'],
-                    mode='lines+markers',
-                    name='收入',
-                    line=dict(color='#4caf50', width=3)
-                ))
-            if '支出' in daily_data.columns:
-                fig.add_trace(go.Scatter(
-                    x=daily_data.index,
-                    y=daily_data['支出'],
-                    mode='lines+markers',
-                    name='支出',
-                    line=dict(color='#f44336', width=3)
-                ))
-            
-            fig.update_layout(
-                title="📈 收支趋势",
-                xaxis_title="日期",
-                yaxis_title="金额 (元)",
-                height=400
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        if trend_fig is not None:
+            st.plotly_chart(trend_fig, use_container_width=True)
     
     with col2:
-        # 支出分类饼图
-        expense_data = df_filtered[df_filtered['类型'] == '支出']
-        if not expense_data.empty:
-            category_data = expense_data.groupby('分类')['金额'].sum()
-            
-            fig = px.pie(
-                values=category_data.values,
-                names=category_data.index,
-                title="💸 支出分类分布",
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig, use_container_width=True)
+        if pie_fig is not None:
+            st.plotly_chart(pie_fig, use_container_width=True)
+    
+    if balance_fig is not None:
+        st.plotly_chart(balance_fig, use_container_width=True)
+        st.caption(f"截至 {end_date} 的累计结余：¥{closing_balance:.2f}")
+    profiler.checkpoint("渲染图表")
+
+# 记录查看页面的排序选项对应的排序字段和方向
+RECORD_SORT_OPTIONS = {
+    "日期降序": ('日期', False),
+    "日期升序": ('日期', True),
+    "金额降序": ('金额', False),
+    "金额升序": ('金额', True)
+}
+
+# 记录查看页面每页可选的记录数
+RECORD_PAGE_SIZES = [20, 50, 100, 200]
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_record_categories(data_version):
+    """记录总数和出现过的分类，从汇总数据中取得，按数据版本缓存"""
+    rollup = data_manager.get_rollup()
+    return int(rollup['笔数'].sum()), sorted(rollup['分类'].unique())
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_records_page(data_version, record_type_filter, category_filter, sort_by, page, page_size):
+    """
+    查询并格式化记录查看页面的一页记录，按数据版本、筛选条件和页码缓存
+    
+    Returns:
+        tuple: (用于显示的当前页表格, 符合条件的记录总数)
+    """
+    sort_column, ascending = RECORD_SORT_OPTIONS[sort_by]
+    page_df, total = data_manager.query_records(
+        record_type=None if record_type_filter == "全部" else record_type_filter,
+        category=None if category_filter == "全部" else category_filter,
+        sort_by=sort_column,
+        ascending=ascending,
+        offset=(page - 1) * page_size,
+        limit=page_size
+    )
+    
+    # 只格式化当前页
+    return format_records(page_df), total
 
 def show_records_page():
     st.markdown("## 📋 记录查看")
     
+    # 上一次显示时的数据版本，用户是根据当时的列表选择要删除的记录
+    seen_version = st.session_state.get('records_version')
+    data_version = data_manager.get_version()
+    st.session_state.records_version = data_version
+    
     # 获取数据
-    df = data_manager.get_all_records()
+    record_count, categories = get_record_categories(data_version)
+    profiler.checkpoint("数据版本和分类列表")
     
-    if df.empty:
+    if record_count == 0:
         st.info("📊 暂无记录，请先添加一些记录")
         return
     
@@ -659,38 +815,41 @@ def show_records_page():
     with col2:
         category_filter = st.selectbox(
             "分类",
-            ["全部"] + list(df['分类'].unique())
+            ["全部"] + categories
         )
     
     with col3:
         sort_by = st.selectbox(
             "排序方式",
-            ["日期降序", "日期升序", "金额降序", "金额升序"]
+            list(RECORD_SORT_OPTIONS)
         )
     
-    # 筛选数据
-    filtered_df = df.copy()
+    # 分页选项
+    col1, col2 = st.columns([1, 3])
     
-    if record_type_filter != "全部":
-        filtered_df = filtered_df[filtered_df['类型'] == record_type_filter]
+    with col1:
+        page_size = st.selectbox(
+            "每页记录数",
+            RECORD_PAGE_SIZES,
+            index=1
+        )
     
-    if category_filter != "全部":
-        filtered_df = filtered_df[filtered_df['分类'] == category_filter]
+    # 总页数取决于筛选结果，先按第一页查询得到总数
+    _, total = build_records_page(data_version, record_type_filter, category_filter, sort_by, 1, page_size)
+    page_count = max(1, -(-total // page_size))
     
-    # 排序
-    if sort_by == "日期降序":
-        filtered_df = filtered_df.sort_values('日期', ascending=False)
-    elif sort_by == "日期升序":
-        filtered_df = filtered_df.sort_values('日期', ascending=True)
-    elif sort_by == "金额降序":
-        filtered_df = filtered_df.sort_values('金额', ascending=False)
-    elif sort_by == "金额升序":
-        filtered_df = filtered_df.sort_values('金额', ascending=True)
+    with col2:
+        page = st.number_input(
+            f"页码（共 {page_count} 页，{total} 条记录）",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            step=1
+        )
     
-    # 格式化显示
-    display_df = filtered_df.copy()
-    display_df['日期'] = display_df['日期'].dt.strftime('%Y-%m-%d %H:%M')
-    display_df['金额'] = display_df['金额'].apply(lambda x: f"¥{x:.2f}")
+    # 只查询和格式化当前页，数据版本和筛选条件都没变时直接使用缓存的结果
+    display_df, total = build_records_page(data_version, record_type_filter, category_filter, sort_by, int(page), page_size)
+    profiler.checkpoint("筛选和查询当前页")
     
     # 显示记录
     st.dataframe(
@@ -698,24 +857,127 @@ def show_records_page():
         use_container_width=True,
         hide_index=True
     )
+    profiler.checkpoint("显示记录")
     
     # 删除记录功能
     st.markdown("---")
     st.markdown("### 🗑️ 删除记录")
     
-    if not filtered_df.empty:
-        record_to_delete = st.selectbox(
-            "选择要删除的记录",
-            range(len(filtered_df)),
-            format_func=lambda x: f"{filtered_df.iloc[x]['日期'].strftime('%Y-%m-%d %H:%M')} - {filtered_df.iloc[x]['类型']} - {filtered_df.iloc[x]['分类']} - ¥{filtered_df.iloc[x]['金额']:.2f}"
+    if total > 0:
+        # 按ID查找要删除的记录，删除时不受筛选、排序和分页影响
+        record_to_delete = int(st.number_input(
+            "要删除的记录ID（见上表ID列）",
+            min_value=1,
+            value=int(display_df['ID'].iloc[0]) if not display_df.empty else 1,
+            step=1
+        ))
+        record = data_manager.get_record(record_to_delete)
+        
+        if record is None:
+            st.warning("⚠️ 没有找到该ID的记录")
+        else:
+            st.info(format_record_labels(pd.DataFrame([record])).iloc[0])
+            
+            if st.button("🗑️ 删除该记录", type="secondary"):
+                if data_manager.delete_record(record_to_delete, expected_version=seen_version):
+                    st.success("✅ 记录删除成功！")
+                    st.rerun()
+                elif data_manager.get_version() != seen_version:
+                    st.warning("⚠️ 记录已被其他会话修改，请确认列表后重试")
+                else:
+                    st.error("❌ 删除失败，请重试")
+
+# 导入页面可选的账单格式
+STATEMENT_FORMAT_OPTIONS = {
+    "自动识别": None,
+    "支付宝": "alipay",
+    "微信支付": "wechat",
+    "银行流水": "bank"
+}
+
+def load_rules_text():
+    """读取分类规则的JSON文本，规则文件不存在时写入默认规则"""
+    return json.dumps(load_rules(data_manager.data_dir), ensure_ascii=False, indent=2)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def preview_statement(file_id, data_version, statement_format, rules_text, _uploaded_file):
+    """试运行导入得到预览结果，按上传文件、数据版本、账单格式和分类规则缓存，不写入数据"""
+    categorizer = Categorizer(json.loads(rules_text)) if rules_text else None
+    return import_statement(data_manager, _uploaded_file, fmt=statement_format, dry_run=True, categorizer=categorizer)
+
+def show_import_page():
+    st.markdown("## 📥 导入账单")
+    st.markdown("支持支付宝、微信支付导出的账单和银行流水（CSV或XLSX），导入前先预览，已经导入过的记录会自动跳过。")
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        uploaded_file = st.file_uploader("选择账单文件", type=["csv", "xlsx"])
+    
+    with col2:
+        format_label = st.selectbox("账单格式", list(STATEMENT_FORMAT_OPTIONS))
+    
+    auto_categorize = st.checkbox("🏷️ 按分类规则自动分类", value=True, help="分类规则可在设置页面修改")
+    
+    if uploaded_file is None:
+        return
+    
+    statement_format = STATEMENT_FORMAT_OPTIONS[format_label]
+    
+    rules_text = None
+    if auto_categorize:
+        try:
+            rules_text = load_rules_text()
+            # 规则文件可能被手动改坏，先校验，无效时不自动分类
+            Categorizer(json.loads(rules_text))
+        except Exception as e:
+            rules_text = None
+            st.warning(f"⚠️ 分类规则读取失败，将使用默认分类: {e}")
+    
+    # 先试运行，数据版本变化（例如导入完成）后重新计算
+    with st.spinner("正在读取账单..."):
+        preview = preview_statement(
+            uploaded_file.file_id, data_manager.get_version(), statement_format, rules_text, uploaded_file
         )
+    profiler.checkpoint("读取账单和预览")
+    
+    if preview is None:
+        st.error("❌ 无法识别账单格式，请确认文件是支付宝、微信支付或银行导出的账单")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("📥 待导入", f"{preview['new']} 条")
+    
+    with col2:
+        st.metric("🔁 重复跳过", f"{preview['duplicates']} 条")
+    
+    with col3:
+        st.metric("🚫 无效或不计收支", f"{preview['skipped']} 条")
+    
+    st.caption(f"账单格式：{preview['format']}")
+    
+    if preview['new'] == 0:
+        st.info("📊 没有需要导入的新记录")
+        return
+    
+    st.markdown(f"#### 👀 预览（前 {len(preview['preview'])} 条）")
+    st.dataframe(
+        format_records(preview['preview']),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    if st.button("📥 确认导入", type="primary"):
+        with st.spinner("正在导入..."):
+            categorizer = Categorizer(json.loads(rules_text)) if rules_text else None
+            result = import_statement(data_manager, uploaded_file, fmt=statement_format, categorizer=categorizer)
         
-        if st.button("🗑️ 删除选中记录", type="secondary"):
-            if data_manager.delete_record(record_to_delete):
-                st.success("✅ 记录删除成功！")
-                st.rerun()
-            else:
-                st.error("❌ 删除失败，请重试")
+        if result is not None and result['imported'] == result['new']:
+            st.success(f"✅ 成功导入 {result['imported']} 条记录，跳过重复记录 {result['duplicates']} 条")
+        else:
+            st.error("❌ 导入失败，请重试")
 
 def show_version_history_page():
     """显示版本历史页面"""
@@ -847,6 +1109,74 @@ def show_version_history_page():
         st.session_state.show_version_history = False
         st.rerun()
 
+def show_diagnostics():
+    """显示各项数据操作的耗时、读写量和缓存命中情况"""
+    st.markdown("### 🩺 诊断信息")
+    
+    enabled = st.toggle(
+        "开启性能统计",
+        value=metrics.enabled,
+        help=f"对所有会话生效；也可以在启动前设置环境变量 {METRICS_ENV}=1，"
+             f"设置 {METRICS_PORT_ENV} 时会在该端口提供 /metrics 供Prometheus采集"
+    )
+    if enabled and not metrics.enabled:
+        metrics.enable()
+    elif not enabled and metrics.enabled:
+        metrics.disable()
+    
+    snapshot = metrics.snapshot()
+    if not snapshot['operations']:
+        st.info("📊 暂无统计数据，开启性能统计后操作一下即可看到")
+        return
+    
+    rows = [
+        {
+            '操作': operation,
+            '调用次数': stats['count'],
+            '错误': stats['errors'],
+            '平均耗时(ms)': round(stats['total_seconds'] / stats['count'] * 1000, 2) if stats['count'] else 0,
+            '最长耗时(ms)': round(stats['max_seconds'] * 1000, 2),
+            '总耗时(ms)': round(stats['total_seconds'] * 1000, 1),
+            '行数': stats['rows'],
+            '读取(KB)': round(stats['bytes_read'] / 1024, 1),
+            '写入(KB)': round(stats['bytes_written'] / 1024, 1)
+        }
+        for operation, stats in snapshot['operations'].items()
+    ]
+    st.caption(f"统计开始于 {snapshot['started_at'].strftime('%Y-%m-%d %H:%M:%S')}，按总耗时排序")
+    st.dataframe(
+        pd.DataFrame(rows).sort_values('总耗时(ms)', ascending=False),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    if snapshot['cache']:
+        cols = st.columns(len(snapshot['cache']))
+        for col, (cache, counts) in zip(cols, snapshot['cache'].items()):
+            total = counts['hits'] + counts['misses']
+            with col:
+                st.metric(f"缓存命中率（{cache}）", f"{counts['hits'] / total:.0%}" if total else "-",
+                          help=f"命中 {counts['hits']} 次，未命中 {counts['misses']} 次")
+    
+    if snapshot['errors']:
+        st.markdown("#### ⚠️ 最近的错误")
+        st.dataframe(pd.DataFrame(snapshot['errors'][::-1]), use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.download_button(
+            label="📥 下载Prometheus格式指标",
+            data=metrics.to_prometheus(),
+            file_name="myaccount_metrics.prom",
+            mime="text/plain"
+        )
+    
+    with col2:
+        if st.button("🔄 重置统计"):
+            metrics.reset()
+            st.rerun()
+
 def show_settings_page():
     st.markdown("## ⚙️ 设置")
     
@@ -855,16 +1185,41 @@ def show_settings_page():
     col1, col2 = st.columns(2)
     
     with col1:
+        rollup = data_manager.get_rollup()
+        
+        # 导出筛选条件
+        with st.expander("🔍 导出筛选", expanded=False):
+            export_type = st.selectbox("记录类型", ["全部", "收入", "支出"], key="export_type")
+            categories = sorted(rollup['分类'].astype(str).unique()) if not rollup.empty else []
+            export_category = st.selectbox("分类", ["全部"] + categories, key="export_category")
+            
+            start_date = end_date = None
+            if not rollup.empty and st.checkbox("按时间范围导出", key="export_by_date"):
+                start_date = st.date_input("开始日期", value=rollup['日期'].min().date(), key="export_start")
+                end_date = st.date_input("结束日期", value=rollup['日期'].max().date(), key="export_end")
+            
+            compress = st.checkbox("gzip压缩（适合大账本）", key="export_gzip")
+        
         if st.button("📤 导出数据", type="primary"):
-            df = data_manager.get_all_records()
-            if not df.empty:
-                csv = df.to_csv(index=False, encoding='utf-8-sig')
-                st.download_button(
-                    label="💾 下载CSV文件",
-                    data=csv,
-                    file_name=f"记账数据_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
-                )
+            if not rollup.empty:
+                try:
+                    # 分块生成CSV，不再整表转换成一个大字符串
+                    data = b"".join(data_manager.iter_csv(
+                        compress=compress,
+                        start_date=start_date,
+                        end_date=end_date,
+                        record_type=None if export_type == "全部" else export_type,
+                        category=None if export_category == "全部" else export_category
+                    ))
+                    extension = "csv.gz" if compress else "csv"
+                    st.download_button(
+                        label="💾 下载CSV文件",
+                        data=data,
+                        file_name=f"记账数据_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                        mime="application/gzip" if compress else "text/csv"
+                    )
+                except Exception as e:
+                    st.error(f"❌ 导出失败: {e}")
             else:
                 st.warning("⚠️ 暂无数据可导出")
     
@@ -877,6 +1232,55 @@ def show_settings_page():
                 else:
                     st.error("❌ 清空失败")
     
+    st.markdown("---")
+    profiler.checkpoint("数据管理")
+    st.markdown("### 🏷️ 自动分类规则")
+    st.caption(
+        "按顺序匹配，排在前面的规则优先。每条规则写明分类（category），"
+        "以及关键词（keywords）、正则表达式（pattern）、类型（type）、金额范围（min_amount / max_amount）中的任意几项。"
+    )
+    
+    try:
+        rules_text = load_rules_text()
+    except Exception as e:
+        st.error(f"❌ 分类规则读取失败: {e}")
+        rules_text = "[]"
+    
+    edited_rules = st.text_area("分类规则（JSON）", value=rules_text, height=240, key="category_rules")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("💾 保存规则"):
+            try:
+                save_rules(json.loads(edited_rules), data_manager.data_dir)
+                st.success("✅ 分类规则已保存")
+            except (ValueError, TypeError) as e:
+                st.error(f"❌ 分类规则无效: {e}")
+    
+    with col2:
+        only_default = st.checkbox(
+            "只修改默认分类的记录",
+            value=True,
+            help=f"只处理分类为 {'、'.join(DEFAULT_CATEGORIES.values())} 的记录，不覆盖手动选择的分类"
+        )
+        if st.button("🔄 按规则重新分类历史记录", help="使用已保存的规则"):
+            try:
+                categorizer = Categorizer(json.loads(rules_text))
+                with st.spinner("正在重新分类..."):
+                    changed = data_manager.recategorize(
+                        categorizer,
+                        only=list(DEFAULT_CATEGORIES.values()) if only_default else None
+                    )
+                st.success(f"✅ 已重新分类 {changed} 条记录")
+            except (ValueError, TypeError) as e:
+                st.error(f"❌ 分类规则无效: {e}")
+    
+    st.markdown("---")
+    profiler.checkpoint("自动分类规则")
+    show_diagnostics()
+    profiler.checkpoint("诊断信息")
+    
     st.markdown("---")
     st.markdown("### ℹ️ 关于")
     
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试脚本 - 在不同规模的模拟账本上测量 DataManager 各项操作的耗时和内存峰值
+
+用法：
+    python benchmark.py                          # 默认 1000、10000、100000 行
+    python benchmark.py 1000 1000000 --backend sqlite
+    python benchmark.py --output new.json --compare old.json
+    python benchmark.py --legacy                 # 同时运行与旧实现的对照测试
+    python benchmark.py 100000 --load-workers 1 2 4   # 分区存储冷启动读取耗时随进程数的变化
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import glob
+import argparse
+import platform
+import tracemalloc
+import subprocess
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT_DIR)
+
+from src.data_manager import DataManager
+from src.storage import BACKENDS, write_excel
+from src.formatting import format_records, format_record_labels
+from version_manager import VersionManager
+
+BENCH_DIR = "bench_data"
+
+# 默认的账本规模
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# 每项操作的默认测量次数，读取全量、导出、清空等较重的操作测量次数为其四分之一
+DEFAULT_REPEAT = 20
+
+# 模拟账本的随机种子，相同种子生成的账本完全相同
+DEFAULT_SEED = 42
+
+# 对比基准结果时，p50耗时超过基准的多少倍视为性能退化
+REGRESSION_THRESHOLD = 1.2
+
+# 模拟账本中的分类和商户
+EXPENSE_CATEGORIES = ["🍽️ 餐饮", "🚗 交通", "🛒 购物", "🏠 住房", "💊 医疗", "🎮 娱乐", "📚 教育", "其他"]
+INCOME_CATEGORIES = ["💼 工资", "💹 投资", "🎁 奖金", "💸 其他收入"]
+MERCHANTS = ["美团", "滴滴出行", "淘宝", "京东", "超市", "星巴克", "地铁", "房租", "医院", "电影院", "书店", "公司"]
+
+
+def synthetic_records(rows, seed=DEFAULT_SEED):
+    """
+    生成模拟账本记录，约四分之三为支出，金额呈对数正态分布，日期按时间顺序分布在三年内
+    
+    Args:
+        rows (int): 记录数
+        seed (int): 随机种子
+    
+    Returns:
+        pd.DataFrame: 带ID和创建时间的记录
+    """
+    rng = np.random.default_rng(seed)
+    is_expense = rng.random(rows) < 0.75
+    categories = np.where(
+        is_expense,
+        np.array(EXPENSE_CATEGORIES, dtype=object)[rng.integers(0, len(EXPENSE_CATEGORIES), rows)],
+        np.array(INCOME_CATEGORIES, dtype=object)[rng.integers(0, len(INCOME_CATEGORIES), rows)]
+    )
+    dates = pd.Timestamp(2021, 1, 1) + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365 * 86400, rows)), unit='s')
+    notes = pd.Series(np.array(MERCHANTS, dtype=object)[rng.integers(0, len(MERCHANTS), rows)])
+    
+    return pd.DataFrame({
+        'ID': np.arange(1, rows + 1),
+        '类型': np.where(is_expense, '支出', '收入'),
+        '金额': np.maximum(np.round(rng.lognormal(3.5, 1.2, rows), 2), 0.01),
+        '分类': categories,
+        '日期': dates,
+        '备注': notes.str.cat(pd.Series(rng.integers(0, 1000, rows).astype(str)), sep=' '),
+        '创建时间': dates
+    })
+
+
+def generate_ledger(dm, rows, seed=DEFAULT_SEED):
+    """生成指定行数的模拟账本并写入数据管理器的存储"""
+    df = synthetic_records(rows, seed)
+    if isinstance(dm.backend, BACKENDS['excel']):
+        write_excel(df, dm.file_path, next_id=rows + 1)
+    else:
+        dm.add_records(df.drop(columns=['ID', '创建时间']))
+
+
+def rewrite_insert(dm, record):
+    """旧的写入方式：读取全部记录、拼接一行后整体重写，作为对照"""
+    df = dm.get_all_records()
+    record = dict(record, ID=df['ID'].max() + 1 if not df.empty else 1)
+    df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
+    with pd.ExcelWriter(dm.file_path, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='记账记录', index=False)
+        dm._format_excel_sheet(writer.sheets['记账记录'])
+
+
+def benchmark_add_record(sizes=(1000, 10000, 100000), repeat=50):
+    """测量追加写入、日志合并与全量重写在不同规模下的单条耗时（毫秒）"""
+    results = []
+    for rows in sizes:
+        dm = DataManager(data_dir=BENCH_DIR, filename=f"bench_{rows}.xlsx", fold_rows=repeat + 2)
+        generate_ledger(dm, rows)
+        
+        # 首次写入需要扫描一遍已有ID，不计入单条耗时
+        dm.add_record('支出', 12.5, '🍽️ 餐饮', datetime.now(), '预热')
+        
+        append_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dm.add_record('支出', 12.5, '🍽️ 餐饮', datetime.now(), '性能测试')
+            append_times.append((time.perf_counter() - start) * 1000)
+        
+        # 日志合并进Excel的耗时按合并条数摊到每条记录上
+        start = time.perf_counter()
+        dm.flush()
+        fold_ms = (time.perf_counter() - start) * 1000
+        
+        record = {
+            '类型': '支出', '金额': 12.5, '分类': '🍽️ 餐饮',
+            '日期': datetime.now(), '备注': '性能测试', '创建时间': datetime.now()
+        }
+        start = time.perf_counter()
+        rewrite_insert(dm, record)
+        rewrite_ms = (time.perf_counter() - start) * 1000
+        
+        append_times.sort()
+        result = {
+            'rows': rows,
+            'append_ms': append_times[len(append_times) // 2],
+            'fold_ms_per_record': fold_ms / (repeat + 1),
+            'rewrite_ms': rewrite_ms,
+        }
+        results.append(result)
+        print(f"{rows:>8} 行 | 追加写入 {result['append_ms']:>8.2f} ms/条"
+              f" | 合并摊销 {result['fold_ms_per_record']:>8.2f} ms/条"
+              f" | 全量重写 {result['rewrite_ms']:>10.1f} ms/条")
+    
+    return results
+
+
+def benchmark_cold_load(sizes=(1000, 10000, 100000)):
+    """测量新建DataManager后首次读取全部记录的耗时（毫秒）"""
+    results = []
+    for rows in sizes:
+        dm = DataManager(data_dir=BENCH_DIR, filename=f"load_{rows}.xlsx")
+        generate_ledger(dm, rows)
+        
+        # 第一次读取需要解析Excel并生成Parquet旁路文件
+        start = time.perf_counter()
+        DataManager(data_dir=BENCH_DIR, filename=f"load_{rows}.xlsx").get_all_records()
+        excel_ms = (time.perf_counter() - start) * 1000
+        
+        # 之后的冷启动直接读取旁路文件
+        start = time.perf_counter()
+        DataManager(data_dir=BENCH_DIR, filename=f"load_{rows}.xlsx").get_all_records()
+        sidecar_ms = (time.perf_counter() - start) * 1000
+        
+        result = {'rows': rows, 'excel_ms': excel_ms, 'sidecar_ms': sidecar_ms}
+        results.append(result)
+        print(f"{rows:>8} 行 | 解析Excel {excel_ms:>10.1f} ms | 读取旁路文件 {sidecar_ms:>8.1f} ms")
+    
+    return results
+
+
+def legacy_format(df):
+    """旧的显示格式化方式：逐行lambda格式化金额、strftime格式化日期、按位置逐条生成删除选项，作为对照"""
+    display_df = df.copy()
+    display_df['日期'] = display_df['日期'].dt.strftime('%Y-%m-%d %H:%M')
+    display_df['金额'] = display_df['金额'].apply(lambda x: f"¥{x:.2f}")
+    labels = [
+        f"{df.iloc[x]['日期'].strftime('%Y-%m-%d %H:%M')} - {df.iloc[x]['类型']} - {df.iloc[x]['分类']} - ¥{df.iloc[x]['金额']:.2f}"
+        for x in range(len(df))
+    ]
+    return display_df, labels
+
+
+def benchmark_formatting(sizes=(1000, 10000, 100000)):
+    """测量记录显示格式化的耗时（毫秒），旧方式逐行生成删除选项过慢，超过5万行时不再测量"""
+    results = []
+    for rows in sizes:
+        start = datetime(2020, 1, 1)
+        df = pd.DataFrame({
+            'ID': range(1, rows + 1),
+            '类型': ['支出' if i % 4 else '收入' for i in range(rows)],
+            '金额': [round(10 + (i % 500) * 1.37, 2) for i in range(rows)],
+            '分类': ['🍽️ 餐饮' if i % 4 else '💼 工资' for i in range(rows)],
+            '日期': [start + timedelta(minutes=7 * i) for i in range(rows)],
+        })
+        
+        start_time = time.perf_counter()
+        format_records(df)
+        format_record_labels(df)
+        vectorized_ms = (time.perf_counter() - start_time) * 1000
+        
+        legacy_ms = None
+        if rows <= 50000:
+            start_time = time.perf_counter()
+            legacy_format(df)
+            legacy_ms = (time.perf_counter() - start_time) * 1000
+        
+        result = {'rows': rows, 'vectorized_ms': vectorized_ms, 'legacy_ms': legacy_ms}
+        results.append(result)
+        legacy_text = f"{legacy_ms:>10.1f} ms" if legacy_ms is not None else f"{'-':>10} ms"
+        print(f"{rows:>8} 行 | 向量化格式化 {vectorized_ms:>8.1f} ms | 逐行格式化 {legacy_text}")
+    
+    return results
+
+
+def summarize(times_ms):
+    """把多次测量的耗时汇总为均值和百分位数（毫秒）"""
+    times = np.array(times_ms)
+    return {
+        'count': len(times),
+        'mean_ms': round(float(times.mean()), 3),
+        'p50_ms': round(float(np.percentile(times, 50)), 3),
+        'p90_ms': round(float(np.percentile(times, 90)), 3),
+        'p99_ms': round(float(np.percentile(times, 99)), 3),
+        'max_ms': round(float(times.max()), 3),
+    }
+
+
+def measure(operation, repeat, setup=None):
+    """
+    多次执行操作并测量耗时，另外单独执行一次测量内存峰值
+    
+    tracemalloc会明显拖慢执行，所以耗时和内存分开测量。内存峰值只包含Python和numpy分配的内存，
+    pyarrow等扩展库自行分配的内存不计入。
+    
+    Args:
+        operation (callable): 被测操作，接收setup的返回值
+        repeat (int): 测量耗时的次数
+        setup (callable): 每次执行前的准备工作，不计入耗时
+    
+    Returns:
+        dict: 耗时统计和内存峰值（MB）
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        operation(state)
+        times.append((time.perf_counter() - start) * 1000)
+    
+    state = setup() if setup else None
+    tracemalloc.start()
+    try:
+        operation(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    result = summarize(times)
+    result['peak_memory_mb'] = round(peak / 1024 / 1024, 3)
+    return result
+
+
+def benchmark_operations(rows, backend="excel", repeat=DEFAULT_REPEAT, seed=DEFAULT_SEED):
+    """
+    在指定规模的模拟账本上测量 DataManager 各项操作
+    
+    账本只生成一次作为模板，需要原始账本的操作（冷读取、清空）每次从模板复制一份。
+    
+    Returns:
+        list: 每项操作一条结果
+    """
+    template_dir = os.path.join(BENCH_DIR, f"template_{backend}_{rows}")
+    work_dir = os.path.join(BENCH_DIR, f"work_{backend}_{rows}")
+    
+    start = time.perf_counter()
+    generate_ledger(DataManager(data_dir=template_dir, backend=backend), rows, seed)
+    # 读取一次，Excel后端会生成Parquet旁路文件，之后的冷启动与实际使用一致
+    DataManager(data_dir=template_dir, backend=backend).get_all_records()
+    print(f"   生成 {rows} 行模拟账本用时 {time.perf_counter() - start:.1f} s")
+    
+    def fresh_copy():
+        """从模板复制一份账本，返回已读取记录的数据管理器"""
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.copytree(template_dir, work_dir)
+        dm = DataManager(data_dir=work_dir, backend=backend)
+        dm.get_all_records()
+        return dm
+    
+    heavy_repeat = max(3, repeat // 4)
+    rng = np.random.default_rng(seed)
+    dm = fresh_copy()
+    records = dm.get_all_records()
+    first_date, last_date = records['日期'].min(), records['日期'].max()
+    delete_ids = iter(rng.choice(records['ID'].to_numpy(), size=repeat + 1, replace=False).tolist())
+    export_path = os.path.join(BENCH_DIR, "export.csv")
+    
+    def random_range(_):
+        """随机选取约一个月的统计区间"""
+        start_date = first_date + (last_date - first_date) * rng.random()
+        return dm.get_statistics(start_date, start_date + timedelta(days=30))
+    
+    operations = [
+        ('add_record', lambda _: dm.add_record('支出', 12.5, '🍽️ 餐饮', datetime.now(), '性能测试'), repeat, None),
+        ('delete_record', lambda _: dm.delete_record(next(delete_ids)), repeat, None),
+        ('get_all_records', lambda _: dm.get_all_records(), repeat, None),
+        ('get_all_records_cold', lambda _: DataManager(data_dir=work_dir, backend=backend).get_all_records(),
+         heavy_repeat, None),
+        ('get_statistics', random_range, repeat, None),
+        ('export_to_csv', lambda _: dm.export_to_csv(export_path), heavy_repeat, None),
+        ('clear_all_data', lambda fresh_dm: fresh_dm.clear_all_data(), heavy_repeat, fresh_copy),
+    ]
+    
+    results = []
+    for name, operation, times, setup in operations:
+        result = {'rows': rows, 'backend': backend, 'operation': name}
+        result.update(measure(operation, times, setup))
+        results.append(result)
+        print(f"{rows:>9} 行 | {name:<22} | p50 {result['p50_ms']:>9.2f} ms | p90 {result['p90_ms']:>9.2f} ms"
+              f" | p99 {result['p99_ms']:>9.2f} ms | 内存峰值 {result['peak_memory_mb']:>8.1f} MB")
+    
+    shutil.rmtree(template_dir, ignore_errors=True)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def benchmark_parallel_load(rows, workers_list, executor='process', repeat=DEFAULT_REPEAT, seed=DEFAULT_SEED):
+    """
+    在按月分区的模拟账本上测量冷启动读取全部记录的耗时随并行读取的进程（线程）数的变化
+    
+    每次测量前删除Parquet旁路文件，各分区都要解析Excel，这是受CPU限制、最能体现并行效果的情况。
+    进程池的启动耗时计入冷启动。
+    
+    Returns:
+        list: 每个进程数一条结果
+    """
+    template_dir = os.path.join(BENCH_DIR, f"template_parallel_{rows}")
+    work_dir = os.path.join(BENCH_DIR, f"work_parallel_{rows}")
+    
+    start = time.perf_counter()
+    dm = DataManager(data_dir=template_dir, backend="partitioned")
+    generate_ledger(dm, rows, seed)
+    dm.flush()
+    partitions = len(dm.backend.partition_keys())
+    print(f"   生成 {rows} 行、{partitions} 个分区的模拟账本用时 {time.perf_counter() - start:.1f} s")
+    
+    def fresh_copy():
+        """从模板复制一份没有旁路文件的账本"""
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.copytree(template_dir, work_dir)
+        for path in glob.glob(os.path.join(work_dir, '*', '*.parquet')):
+            os.remove(path)
+    
+    results = []
+    baseline = None
+    for workers in workers_list:
+        def cold_load(_):
+            DataManager(data_dir=work_dir, backend="partitioned", load_workers=workers,
+                        load_executor=executor).get_all_records()
+        
+        result = {'rows': rows, 'backend': 'partitioned', 'operation': f"cold_load_{executor}_{workers}"}
+        result.update(measure(cold_load, max(3, repeat // 4), fresh_copy))
+        results.append(result)
+        
+        baseline = baseline or result['p50_ms']
+        print(f"{rows:>9} 行 | {workers:>2} 个{'进程' if executor == 'process' else '线程'} | "
+              f"p50 {result['p50_ms']:>9.2f} ms | 加速 {baseline / result['p50_ms']:.2f}x")
+    
+    shutil.rmtree(template_dir, ignore_errors=True)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def environment_info():
+    """记录运行环境，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    
+    version_manager = VersionManager()
+    version_manager.app_file = os.path.join(ROOT_DIR, version_manager.app_file)
+    
+    return {
+        'app_version': version_manager.get_current_version(),
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_results(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """
+    与基准结果逐项对比p50耗时
+    
+    Returns:
+        list: 耗时超过基准threshold倍的操作
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    
+    base = {(item['rows'], item['backend'], item['operation']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        key = (item['rows'], item['backend'], item['operation'])
+        if key not in base or not base[key]['p50_ms']:
+            continue
+        ratio = item['p50_ms'] / base[key]['p50_ms']
+        flag = "⚠️" if ratio > threshold else "  "
+        print(f"{flag} {item['rows']:>9} 行 | {item['operation']:<22} | p50 {base[key]['p50_ms']:>9.2f} → "
+              f"{item['p50_ms']:>9.2f} ms ({ratio:.2f}x)")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    """主测试函数"""
+    print("=" * 50)
+    print("⏱️ 我的记账本 - 性能测试")
+    print("=" * 50)
+    
+    parser = argparse.ArgumentParser(description="DataManager 性能测试")
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help="账本行数，可指定多个")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='excel', help="存储后端")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="每项操作的测量次数")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="模拟账本的随机种子")
+    parser.add_argument('--output', default='benchmark_results.json', help="结果JSON文件路径")
+    parser.add_argument('--compare', help="作为基准的结果JSON文件，p50耗时退化时以状态码1退出")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="判定退化的耗时倍数")
+    parser.add_argument('--legacy', action='store_true', help="同时运行与旧实现的对照测试")
+    parser.add_argument('--load-workers', nargs='+', type=int,
+                        help="改为测量分区存储冷启动读取耗时随这些进程（线程）数的变化")
+    parser.add_argument('--load-executor', choices=['process', 'thread'], default='process',
+                        help="并行读取分区的方式")
+    args = parser.parse_args()
+    
+    regressions = []
+    try:
+        results = []
+        if args.load_workers:
+            print(f"\n🧵 分区存储并行读取耗时（CPU核数 {os.cpu_count()}）...")
+            for rows in args.sizes:
+                results.extend(benchmark_parallel_load(rows, args.load_workers, args.load_executor, args.repeat, args.seed))
+        else:
+            print(f"\n📊 各项操作耗时（{args.backend}后端）...")
+            for rows in args.sizes:
+                results.extend(benchmark_operations(rows, args.backend, args.repeat, args.seed))
+        
+        report = {
+            'environment': environment_info(),
+            'settings': {'backend': args.backend, 'repeat': args.repeat, 'seed': args.seed, 'sizes': args.sizes,
+                         'load_workers': args.load_workers, 'load_executor': args.load_executor},
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.output}")
+        
+        if args.compare:
+            print(f"\n🔍 与基准 {args.compare} 对比...")
+            regressions = compare_results(results, args.compare, args.threshold)
+            print(f"\n{'⚠️ 发现 ' + str(len(regressions)) + ' 项性能退化' if regressions else '✅ 没有发现性能退化'}")
+        
+        if args.legacy:
+            print("\n📝 单条记录写入耗时...")
+            benchmark_add_record(args.sizes)
+            
+            print("\n📂 冷启动读取耗时...")
+            benchmark_cold_load(args.sizes)
+            
+            print("\n🧾 记录显示格式化耗时...")
+            benchmark_formatting(args.sizes)
+    finally:
+        if os.path.exists(BENCH_DIR):
+            shutil.rmtree(BENCH_DIR)
+    
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
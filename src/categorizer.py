@@ -0,0 +1,252 @@
+# 自动分类模块
+
+import os
+import re
+import json
+import pandas as pd
+import numpy as np
+from .metrics import timed
+
+# 分类规则文件名，保存在数据目录中
+RULES_FILENAME = 'category_rules.json'
+
+# 规则文件不存在时写入的默认规则，按顺序匹配，排在前面的规则优先
+DEFAULT_RULES = [
+    {'category': '💼 工资', 'type': '收入', 'keywords': ['工资', '薪资', '代发']},
+    {'category': '🎁 奖金', 'type': '收入', 'keywords': ['奖金', '红包', '年终']},
+    {'category': '💹 投资', 'type': '收入', 'keywords': ['收益', '理财', '利息', '基金']},
+    {'category': '🚗 交通', 'type': '支出', 'keywords': ['滴滴', '打车', '地铁', '公交', '加油', '停车', '高铁', '12306']},
+    {'category': '🍽️ 餐饮', 'type': '支出', 'keywords': ['美团', '饿了么', '外卖', '餐', '咖啡', '星巴克', '奶茶']},
+    {'category': '🛒 购物', 'type': '支出', 'keywords': ['淘宝', '天猫', '京东', '拼多多', '超市', '盒马']},
+    {'category': '🏠 住房', 'type': '支出', 'keywords': ['房租', '物业', '电费', '水费', '燃气']},
+    {'category': '💊 医疗', 'type': '支出', 'keywords': ['医院', '药房', '药店', '挂号']},
+    {'category': '🎮 娱乐', 'type': '支出', 'keywords': ['电影', '游戏', '视频会员', 'KTV']},
+    {'category': '📚 教育', 'type': '支出', 'keywords': ['书店', '课程', '培训', '学费']},
+]
+
+# 不带内联全局标志的正则的编译标志，用于识别 (?i) 这类只能出现在整个正则开头的写法
+PLAIN_REGEX_FLAGS = re.compile('').flags
+
+
+class Categorizer:
+    """
+    按规则自动分类
+    
+    每条规则包含分类（category），以及以下任意条件，全部满足时命中：
+    keywords（备注中包含任一关键词）、pattern（备注匹配正则表达式）、
+    type（收入/支出）、min_amount / max_amount（金额范围，含两端）。
+    多条规则命中时取排在最前面的。
+    
+    所有规则的关键词和正则在构造时合并为一个正则表达式，分类时对备注列只扫描一遍。
+    带分组、反向引用或 (?i) 等内联全局标志的正则放进合并后的正则会出错或改变含义，
+    这类规则单独匹配。
+    """
+    
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): 规则字典的列表
+        
+        Raises:
+            ValueError: 规则缺少分类或正则表达式无效
+        """
+        self.rules = [dict(rule) for rule in rules]
+        
+        patterns = []
+        self._text_rules = {}
+        self._plain_rules = []
+        self._standalone_rules = []
+        for index, rule in enumerate(self.rules):
+            if not rule.get('category'):
+                raise ValueError(f"第 {index + 1} 条规则缺少分类")
+            
+            alternatives = [re.escape(keyword) for keyword in rule.get('keywords', []) if keyword]
+            standalone = None
+            if rule.get('pattern'):
+                # 校验单条正则，出错时能指出是哪条规则
+                try:
+                    compiled = re.compile(rule['pattern'])
+                except re.error as e:
+                    raise ValueError(f"第 {index + 1} 条规则的正则表达式无效: {e}")
+                if compiled.groups or compiled.flags != PLAIN_REGEX_FLAGS:
+                    standalone = compiled
+                else:
+                    alternatives.append(f"(?:{rule['pattern']})")
+            
+            if standalone is not None:
+                # 关键词和正则分别匹配，任一命中即可
+                matchers = [re.compile('|'.join(alternatives))] if alternatives else []
+                self._text_rules[index] = matchers + [standalone]
+                self._standalone_rules.append(index)
+            elif alternatives:
+                patterns.append((index, f"(?P<r{index}>{'|'.join(alternatives)})"))
+                self._text_rules[index] = [re.compile('|'.join(alternatives))]
+            else:
+                # 只按类型和金额匹配的规则
+                self._plain_rules.append(index)
+        
+        # 放在零宽断言里，每个位置都尝试一次，关键词互相重叠时也不会漏掉
+        self._combined = self._combine(patterns) if patterns else None
+        
+        self._categories = np.array([rule['category'] for rule in self.rules], dtype=object)
+        self._types = np.array([rule.get('type') for rule in self.rules], dtype=object)
+        self._min_amounts = np.array([rule.get('min_amount', -np.inf) for rule in self.rules], dtype=float)
+        self._max_amounts = np.array([rule.get('max_amount', np.inf) for rule in self.rules], dtype=float)
+    
+    @staticmethod
+    def _combine(patterns):
+        """把 (规则序号, 命名分组) 合并为一个正则，无法合并时指出是哪条规则"""
+        try:
+            return re.compile(f"(?=(?:{'|'.join(pattern for _, pattern in patterns)}))")
+        except re.error as e:
+            # 逐条加入，第一条使合并失败的就是出错的规则
+            for count in range(1, len(patterns) + 1):
+                try:
+                    re.compile(f"(?=(?:{'|'.join(pattern for _, pattern in patterns[:count])}))")
+                except re.error:
+                    raise ValueError(f"第 {patterns[count - 1][0] + 1} 条规则的正则表达式无法与其他规则合并: {e}")
+            raise ValueError(f"分类规则无法合并为一个正则表达式: {e}")
+    
+    @classmethod
+    def load(cls, data_dir="data"):
+        """
+        从数据目录读取规则，文件不存在时写入默认规则
+        
+        Args:
+            data_dir (str): 数据目录
+        
+        Returns:
+            Categorizer: 分类器
+        """
+        return cls(load_rules(data_dir))
+    
+    def _passes(self, rule_ids, record_types, amounts):
+        """规则的类型和金额条件是否满足，三个数组逐项对应"""
+        required = self._types[rule_ids]
+        return (
+            ((required == None) | (required == record_types))  # noqa: E711
+            & (amounts >= self._min_amounts[rule_ids])
+            & (amounts <= self._max_amounts[rule_ids])
+        )
+    
+    @timed(rows=len)
+    def categorize(self, df):
+        """
+        为每条记录找出命中的分类
+        
+        Args:
+            df (pd.DataFrame): 记录，需要 备注、类型、金额 列
+        
+        Returns:
+            pd.Series: 命中的分类，索引与输入一致，没有命中任何规则时为None
+        """
+        n = len(df)
+        notes = df['备注'].fillna('').astype(str).reset_index(drop=True) if '备注' in df.columns else pd.Series([''] * n)
+        record_types = df['类型'].to_numpy(dtype=object)
+        amounts = pd.to_numeric(df['金额'], errors='coerce').to_numpy(dtype=float)
+        
+        # 每条记录命中的最靠前的规则，len(rules)表示没有命中
+        best = np.full(n, len(self.rules))
+        
+        for rule_id in self._plain_rules:
+            passed = self._passes(np.full(n, rule_id), record_types, amounts)
+            best = np.where(passed, np.minimum(best, rule_id), best)
+        
+        if (self._combined is not None or self._standalone_rules) and n:
+            # 相同的备注（商户名等）大量重复，每个不同的备注只扫描一遍
+            codes, uniques = pd.factorize(notes)
+            first_hits = np.array([self._first_hit(note) for note in uniques] + [len(self.rules)])
+            hit_rules = first_hits[codes]
+            
+            hit = hit_rules < len(self.rules)
+            passed = hit.copy()
+            passed[hit] = self._passes(hit_rules[hit], record_types[hit], amounts[hit])
+            best = np.where(passed, np.minimum(best, hit_rules), best)
+            
+            # 最靠前的命中规则不满足类型或金额条件时，可能遮住了后面的规则，逐条规则复查这些记录
+            failed = np.flatnonzero(hit & ~passed)
+            fallback = np.full(len(failed), len(self.rules))
+            for rule_id, matchers in self._text_rules.items():
+                pending = np.flatnonzero(fallback == len(self.rules))
+                if pending.size == 0:
+                    break
+                rows = failed[pending]
+                found = np.zeros(len(rows), dtype=bool)
+                for matcher in matchers:
+                    if matcher.groups:
+                        # 带分组的正则交给str.contains会提示改用extract，直接逐条查找
+                        found |= notes.iloc[rows].map(lambda note: matcher.search(note) is not None).to_numpy(dtype=bool)
+                    else:
+                        found |= notes.iloc[rows].str.contains(matcher).to_numpy(dtype=bool)
+                matched = found & self._passes(np.full(len(rows), rule_id), record_types[rows], amounts[rows])
+                fallback[pending[matched]] = rule_id
+            best[failed] = np.minimum(best[failed], fallback)
+        
+        result = np.where(best < len(self.rules), self._categories[np.minimum(best, len(self.rules) - 1)], None)
+        return pd.Series(result, index=df.index, dtype=object)
+    
+    def _first_hit(self, note):
+        """合并后的正则扫描一遍备注，返回命中的最靠前的规则序号，没有命中时返回规则总数"""
+        hits = [int(match.lastgroup[1:]) for match in self._combined.finditer(note)] if self._combined else []
+        hits += [
+            rule_id for rule_id in self._standalone_rules
+            if any(matcher.search(note) for matcher in self._text_rules[rule_id])
+        ]
+        return min(hits) if hits else len(self.rules)
+    
+    def apply(self, df, only=None):
+        """
+        返回按规则重新分类后的记录，没有命中的记录保持原分类
+        
+        Args:
+            df (pd.DataFrame): 记录
+            only (list): 只修改原分类在其中的记录，例如只处理导入时的默认分类
+        
+        Returns:
+            pd.DataFrame: 新的记录表，不修改传入的记录
+        """
+        categories = self.categorize(df)
+        matched = categories.notna()
+        if only is not None:
+            matched &= df['分类'].isin(only)
+        df = df.copy()
+        if isinstance(df['分类'].dtype, pd.CategoricalDtype):
+            # 分类列是category时，规则中的新分类要先加入类别
+            new_categories = pd.Index(categories[matched].unique()).difference(df['分类'].cat.categories)
+            df['分类'] = df['分类'].cat.add_categories(new_categories)
+        df.loc[matched, '分类'] = categories[matched]
+        return df
+
+
+def rules_path(data_dir="data"):
+    """分类规则文件路径"""
+    return os.path.join(data_dir, RULES_FILENAME)
+
+
+def load_rules(data_dir="data"):
+    """
+    读取分类规则，文件不存在时写入并返回默认规则
+    
+    Returns:
+        list: 规则字典的列表
+    """
+    path = rules_path(data_dir)
+    if not os.path.exists(path):
+        save_rules(DEFAULT_RULES, data_dir)
+        return [dict(rule) for rule in DEFAULT_RULES]
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_rules(rules, data_dir="data"):
+    """
+    校验并保存分类规则
+    
+    Raises:
+        ValueError: 规则无效
+    """
+    Categorizer(rules)
+    os.makedirs(data_dir, exist_ok=True)
+    with open(rules_path(data_dir), 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
@@ -1,84 +1,199 @@
 import pandas as pd
+import numpy as np
 import os
+import codecs
+import zlib
+import functools
+import threading
+import atexit
+from concurrent.futures import Future
+import datetime as dt
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+from .storage import (BACKENDS, JOURNAL_FOLD_ROWS, COLUMNS, RECORD_TYPES, empty_frame, invalid_records,
+                      format_excel_sheet, write_excel)
+from .metrics import metrics, timed
+
+# 内存中金额以分为单位的整数保存，合计不产生浮点尾差，对外返回时再换算为元
+AMOUNT_SCALE = 100
+
+# 类型列的分类类型，类别固定为RECORD_TYPES
+TYPE_DTYPE = pd.CategoricalDtype(RECORD_TYPES)
+
+# 按日期字符串写入的数据文件使用的格式，手动编辑过的文件可能混有其他写法
+DATE_PARSE_FORMAT = 'ISO8601'
+
+# 流式导出时每块的记录数
+EXPORT_CHUNK_ROWS = 5000
+
+# 导出CSV中的日期格式，各块保持一致
+EXPORT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# add_record参数名与账本字段的对应关系，批量添加时两种写法都可以使用
+FIELD_ALIASES = {
+    'record_type': '类型',
+    'amount': '金额',
+    'category': '分类',
+    'date': '日期',
+    'note': '备注'
+}
+
+def to_cents(amounts):
+    """把以元为单位的金额换算为以分为单位的int64"""
+    return (pd.to_numeric(amounts) * AMOUNT_SCALE).round().astype('int64')
+
+
+def from_cents(cents):
+    """把以分为单位的金额换算为以元为单位的浮点数"""
+    return cents / AMOUNT_SCALE
+
+
+def _parse_dates(values):
+    """把日期列解析为datetime64，已经是datetime64时不再解析"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    try:
+        return pd.to_datetime(values, format=DATE_PARSE_FORMAT)
+    except ValueError:
+        return pd.to_datetime(values, format='mixed')
+
+
+def apply_schema(df):
+    """
+    把记录转换为内存中的账本格式
+    
+    类型、分类为category，金额为以分为单位的int64，日期和创建时间为datetime64，备注为字符串。
+    没有分类或备注的记录统一为空字符串，与汇总数据一致。
+    缺少ID或金额、类型不是收入/支出的记录（手动编辑数据文件时可能出现）被跳过并打印提示，
+    不会使整个账本读取失败。
+    
+    Args:
+        df (pd.DataFrame): 存储后端读出或待写入的记录，金额以元为单位
+    
+    Returns:
+        pd.DataFrame: 转换后的新记录表
+    """
+    invalid = invalid_records(df)
+    if invalid.any():
+        print(f"跳过 {int(invalid.sum())} 条无效记录（缺少ID或金额，或类型不是收入/支出），请检查数据文件")
+        df = df[~invalid.to_numpy()].reset_index(drop=True)
+    else:
+        df = df.copy()
+    if 'ID' in df.columns:
+        df['ID'] = pd.to_numeric(df['ID']).astype('int64')
+    df['类型'] = df['类型'].astype(TYPE_DTYPE)
+    df['金额'] = to_cents(df['金额'])
+    df['分类'] = df['分类'].fillna('').astype('category')
+    df['日期'] = _parse_dates(df['日期'])
+    df['备注'] = df['备注'].fillna('').astype(str)
+    if '创建时间' in df.columns:
+        df['创建时间'] = _parse_dates(df['创建时间'])
+    return df
+
+
+def concat_records(frames):
+    """
+    合并内存格式的记录，分类列的类别取并集，合并后仍是category
+    
+    新的类别追加在已有类别之后，第一个记录表（通常是缓存）的类别编码不变，无需重新编码。
+    """
+    categories = frames[0]['分类'].cat.categories
+    for frame in frames[1:]:
+        categories = categories.append(frame['分类'].cat.categories.difference(categories))
+    
+    aligned = []
+    for frame in frames:
+        column = frame['分类']
+        own = column.cat.categories
+        if not own.equals(categories):
+            if own.equals(categories[:len(own)]):
+                column = column.cat.add_categories(categories[len(own):])
+            else:
+                column = column.cat.set_categories(categories)
+            frame = frame.assign(分类=column)
+        aligned.append(frame)
+    return pd.concat(aligned, ignore_index=True)
+
+
+def _locked(method):
+    """在存储后端的锁内执行，其他会话或进程的写入不会与之交错"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.backend.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class DataManager:
-    def __init__(self, data_dir="data", filename="account_records.xlsx"):
+    def __init__(self, data_dir="data", filename=None, backend="excel", fold_rows=JOURNAL_FOLD_ROWS,
+                 partition_by="month", load_workers=None, load_executor="process"):
         """
         初始化数据管理器
         
         Args:
             data_dir (str): 数据存储目录
-            filename (str): Excel文件名
+            filename (str): 数据文件名，默认由存储后端决定
+            backend (str): 存储后端，excel、partitioned 或 sqlite
+            fold_rows (int): Excel追加日志达到多少条时合并进Excel文件
+            partition_by (str): partitioned后端新建时按月（month）还是按年（year）分区
+            load_workers (int): partitioned后端并行读取分区的进程或线程数，默认为CPU核数
+            load_executor (str): partitioned后端并行读取的方式，process 或 thread
         """
-        self.data_dir = data_dir
-        self.filename = filename
-        self.file_path = os.path.join(data_dir, filename)
+        if backend not in BACKENDS:
+            raise ValueError(f"不支持的存储后端: {backend}")
         
         # 确保数据目录存在
         os.makedirs(data_dir, exist_ok=True)
         
-        # 初始化Excel文件
-        self._init_excel_file()
-    
-    def _init_excel_file(self):
-        """初始化Excel文件，如果不存在则创建"""
-        if not os.path.exists(self.file_path):
-            # 创建空的DataFrame
-            df = pd.DataFrame(columns=[
-                'ID', '类型', '金额', '分类', '日期', '备注', '创建时间'
-            ])
-            
-            # 保存到Excel
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='记账记录', index=False)
-                
-                # 获取工作表并设置样式
-                worksheet = writer.sheets['记账记录']
-                self._format_excel_sheet(worksheet)
+        # 初始化存储后端
+        if backend == "excel":
+            self.backend = BACKENDS[backend](data_dir, filename, fold_rows=fold_rows)
+        elif backend == "partitioned":
+            self.backend = BACKENDS[backend](
+                data_dir, filename, fold_rows=fold_rows, partition_by=partition_by,
+                load_workers=load_workers, load_executor=load_executor
+            )
+        else:
+            self.backend = BACKENDS[backend](data_dir, filename)
+        
+        self.data_dir = data_dir
+        self.filename = self.backend.filename
+        self.file_path = self.backend.file_path
+        
+        # 已解析记录的内存缓存，数据文件签名变化时重新读取
+        self._cache = None
+        self._cache_signature = None
+        
+        # 缓存对应的数据版本号，用于识别数据文件在程序外被修改
+        self._cache_version = None
+        
+        # 缓存记录的ID到行位置的索引，随缓存一起失效
+        self._id_index = None
+        
+        # 按 日期×类型×分类 汇总的金额和笔数，随写入增量更新，缓存重新读取时重建
+        self._rollup = None
+        
+        # 按日期排序的索引：缓存行位置的排列及对应的有序日期，用于二分查找时间范围
+        self._date_order = None
+        self._sorted_dates = None
+        
+        # 与有序日期一一对应的累计结余（分），随增删增量更新，只重新累加受影响日期之后的部分
+        self._running_balance = None
+        
+        # 等待写入的批次，拿到锁的写入方把排队的批次合并成一次写入
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        
+        # 是否有已取出队列、尚未写完的批次
+        self._writing = False
+        
+        # 后台写入线程，第一次异步添加时启动
+        self._writer = None
+        self._pending_event = threading.Event()
     
     def _format_excel_sheet(self, worksheet):
         """格式化Excel工作表"""
-        # 设置标题行样式
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="2E86AB", end_color="2E86AB", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # 设置边框
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # 应用标题行样式
-        for cell in worksheet[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # 设置列宽
-        column_widths = {
-            'A': 8,   # ID
-            'B': 10,  # 类型
-            'C': 12,  # 金额
-            'D': 15,  # 分类
-            'E': 20,  # 日期
-            'F': 30,  # 备注
-            'G': 20   # 创建时间
-        }
-        
-        for col, width in column_widths.items():
-            worksheet.column_dimensions[col].width = width
-        
-        # 冻结首行
-        worksheet.freeze_panes = 'A2'
+        format_excel_sheet(worksheet)
     
+    @timed()
     def add_record(self, record_type, amount, category, date, note=""):
         """
         添加记录
@@ -93,41 +208,253 @@ class DataManager:
         Returns:
             bool: 是否添加成功
         """
+        return self.add_records([{
+            '类型': record_type,
+            '金额': amount,
+            '分类': category,
+            '日期': date,
+            '备注': note
+        }]) == 1
+    
+    @timed()
+    def add_records(self, records):
+        """
+        批量添加记录，整批校验通过后只写入一次
+        
+        多个会话同时添加时，先拿到锁的一方把其他会话排队的批次一起写入（组提交），
+        其余会话拿到锁时发现自己的批次已写入即直接返回。
+        
+        Args:
+            records: 记录字典的列表或迭代器，或DataFrame。字段可以用账本列名
+                （类型、金额、分类、日期、备注），也可以用add_record的参数名
+        
+        Returns:
+            int: 添加的记录数，校验或写入失败时为0
+        """
         try:
-            # 读取现有数据
-            df = self.get_all_records()
+            if isinstance(records, pd.DataFrame):
+                df = records
+            else:
+                df = pd.DataFrame(list(records))
             
-            # 生成新ID
-            new_id = df['ID'].max() + 1 if not df.empty else 1
-            
-            # 创建新记录
-            new_record = {
-                'ID': new_id,
-                '类型': record_type,
-                '金额': amount,
-                '分类': category,
-                '日期': date,
-                '备注': note,
-                '创建时间': datetime.now()
-            }
+            df = self._prepare_records(df)
+            if df is None or df.empty:
+                return 0
             
-            # 添加到DataFrame
-            df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
+            batch = {'df': df, 'done': False, 'count': 0}
+            with self._pending_lock:
+                self._pending.append(batch)
             
-            # 保存到Excel
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='记账记录', index=False)
-                
-                # 重新格式化工作表
-                worksheet = writer.sheets['记账记录']
-                self._format_excel_sheet(worksheet)
+            with self.backend.lock:
+                if not batch['done']:
+                    self._commit_pending()
+            return batch['count']
+        
+        except Exception as e:
+            print(f"添加记录时出错: {e}")
+            metrics.record_error(e)
+            return 0
+    
+    def add_record_async(self, record_type, amount, category, date, note=""):
+        """
+        添加记录但不等待写入完成，由后台线程写入
+        
+        参数同add_record。
+        
+        Returns:
+            Future: 写入完成后结果为是否添加成功
+        """
+        future = Future()
+        self.add_records_async([{
+            '类型': record_type,
+            '金额': amount,
+            '分类': category,
+            '日期': date,
+            '备注': note
+        }]).add_done_callback(lambda done: future.set_result(done.result() == 1))
+        return future
+    
+    @timed()
+    def add_records_async(self, records):
+        """
+        批量添加记录但不等待写入完成
+        
+        记录在调用线程中校验后排入写入队列，后台线程把排队的批次合并后一次写入，
+        写入耗时不再阻塞调用方。写入完成前读取记录不会包含这些记录。
+        
+        Args:
+            records: 同add_records
+        
+        Returns:
+            Future: 写入完成后结果为添加的记录数，校验或写入失败时为0
+        """
+        future = Future()
+        try:
+            if isinstance(records, pd.DataFrame):
+                df = records
+            else:
+                df = pd.DataFrame(list(records))
             
+            df = self._prepare_records(df)
+            if df is None or df.empty:
+                future.set_result(0)
+                return future
+            
+            with self._pending_lock:
+                self._pending.append({'df': df, 'done': False, 'count': 0, 'future': future})
+                self._start_writer()
+            self._pending_event.set()
+        
+        except Exception as e:
+            print(f"添加记录时出错: {e}")
+            metrics.record_error(e)
+            future.set_result(0)
+        return future
+    
+    def _start_writer(self):
+        """启动后台写入线程，调用方需已持有_pending_lock"""
+        if self._writer is None:
+            # 后台线程随解释器退出，退出前写完还在排队的记录；线程重启时不再重复注册
+            atexit.register(self._write_on_exit)
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="DataManager-writer", daemon=True)
+            self._writer.start()
+    
+    def _writer_loop(self):
+        """后台写入线程：有记录排队时拿锁，把排队的批次合并后一次写入"""
+        while True:
+            self._pending_event.wait()
+            self._pending_event.clear()
+            with self.backend.lock:
+                if self._pending:
+                    self._commit_pending()
+    
+    def _write_on_exit(self):
+        """解释器退出前写完排队中的记录，既没有排队也没有正在写入的批次时不再加锁"""
+        with self._pending_lock:
+            idle = not self._pending and not self._writing
+        if not idle:
+            self.wait_for_writes()
+    
+    @timed()
+    def wait_for_writes(self):
+        """
+        在当前线程写完所有排队中的记录，返回时异步添加的记录都已写入
+        
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            # 后台线程先取出排队的批次再写入，队列为空时写入可能仍在进行；
+            # 它在整个写入期间持有锁，拿到锁就说明已写完，再写入剩下的批次
+            with self.backend.lock:
+                if self._pending:
+                    self._commit_pending()
             return True
+        except Exception as e:
+            print(f"写入排队记录时出错: {e}")
+            metrics.record_error(e)
+            return False
+    
+    @timed('write_batch')
+    def _commit_pending(self):
+        """把排队的全部批次合并后写入一次，调用方需已持有锁"""
+        with self._pending_lock:
+            batches, self._pending = self._pending, []
+            self._writing = True
+        
+        try:
+            if len(batches) == 1:
+                df = batches[0]['df']
+            else:
+                df = pd.concat([batch['df'] for batch in batches], ignore_index=True)
+            
+            # 写入前缓存有效时，写入后直接把新记录并入缓存
+            cache_valid = self._cache_is_valid()
+            
+            ids = self.backend.append(df)
+            self.backend.bump_version()
+            metrics.add_rows(len(df))
+            
+            if cache_valid:
+                df.insert(0, 'ID', ids)
+                added = apply_schema(df)
+                first_position = len(self._cache)
+                self._append_to_cache(added)
+                self._update_rollup(added=added)
+                self._index_added_dates(first_position, added['日期'])
+            else:
+                self._invalidate_cache()
             
+            for batch in batches:
+                batch['count'] = len(batch['df'])
+        
         except Exception as e:
             print(f"添加记录时出错: {e}")
+            metrics.record_error(e)
+            self._invalidate_cache()
+        
+        finally:
+            for batch in batches:
+                batch['done'] = True
+                if 'future' in batch:
+                    batch['future'].set_result(batch['count'])
+            self._writing = False
+    
+    def _prepare_records(self, df):
+        """整理待添加记录的字段并整批校验，有无效记录时返回None"""
+        df = df.rename(columns=FIELD_ALIASES)
+        
+        missing = [column for column in ('类型', '金额', '日期') if column not in df.columns]
+        if missing:
+            print(f"添加记录时缺少字段: {', '.join(missing)}")
+            return None
+        
+        prepared = pd.DataFrame({
+            '类型': df['类型'],
+            '金额': pd.to_numeric(df['金额'], errors='coerce'),
+            '分类': df['分类'] if '分类' in df.columns else '',
+            '日期': pd.to_datetime(df['日期'], errors='coerce'),
+            '备注': df['备注'].fillna('') if '备注' in df.columns else '',
+            '创建时间': datetime.now()
+        }).reset_index(drop=True)
+        
+        # 类型、金额和日期都必须有效，任何一条无效时整批不写入
+        invalid = (
+            ~prepared['类型'].isin(RECORD_TYPES)
+            | ~(prepared['金额'] > 0)
+            | prepared['日期'].isna()
+        )
+        if invalid.any():
+            first_invalid = invalid.to_numpy().nonzero()[0][0]
+            print(f"有 {invalid.sum()} 条记录无效（第 {first_invalid + 1} 条起），本批记录未添加")
+            return None
+        
+        return prepared
+    
+    @timed()
+    @_locked
+    def flush(self):
+        """
+        把存储后端中尚未落盘的缓冲写入数据文件
+        
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            cache_valid = self._cache_is_valid()
+            self.backend.flush()
+            
+            # 落盘不改变记录内容，只需更新缓存对应的文件签名
+            if cache_valid:
+                self._set_cache(self._cache)
+            return True
+        except Exception as e:
+            print(f"写入缓冲数据时出错: {e}")
+            metrics.record_error(e)
             return False
     
+    @timed(rows=len)
     def get_all_records(self):
         """
         获取所有记录
@@ -136,60 +463,288 @@ class DataManager:
             pd.DataFrame: 所有记录
         """
         try:
-            if os.path.exists(self.file_path):
-                df = pd.read_excel(self.file_path, sheet_name='记账记录')
-                # 确保日期列是datetime类型
-                if '日期' in df.columns:
-                    df['日期'] = pd.to_datetime(df['日期'])
-                if '创建时间' in df.columns:
-                    df['创建时间'] = pd.to_datetime(df['创建时间'])
-                return df
-            else:
-                return pd.DataFrame(columns=[
-                    'ID', '类型', '金额', '分类', '日期', '备注', '创建时间'
-                ])
+            return self._public(self._load_records())
         except Exception as e:
             print(f"读取记录时出错: {e}")
-            return pd.DataFrame(columns=[
-                'ID', '类型', '金额', '分类', '日期', '备注', '创建时间'
-            ])
+            metrics.record_error(e)
+            return empty_frame()
     
-    def delete_record(self, record_index):
+    @_locked
+    def _load_records(self):
+        """返回缓存的记录，数据文件被改动过才重新读取"""
+        if self._cache_is_valid():
+            metrics.cache_hit('records')
+        else:
+            metrics.cache_miss('records')
+            signature = self.backend.signature()
+            version = self.backend.version()
+            if self._cache_version == version:
+                # 文件变了但版本号没变，说明是在程序外手动修改的，版本号加一使依赖它的缓存失效
+                version = self.backend.bump_version()
+            df = apply_schema(self.backend.read_all())
+            
+            self._cache = df
+            self._cache_signature = signature
+            self._cache_version = version
+            self._id_index = None
+            self._rollup = None
+            self._date_order = None
+            self._sorted_dates = None
+            self._running_balance = None
+        return self._cache
+    
+    @staticmethod
+    def _public(df):
+        """把缓存格式的记录转换为对外返回的新记录表，金额换算为元"""
+        return df.assign(金额=from_cents(df['金额']))
+    
+    def _cache_is_valid(self):
+        """缓存存在且数据文件自读取后未被改动"""
+        return self._cache is not None and self._cache_signature == self.backend.signature()
+    
+    def _set_cache(self, df):
+        """写入完成后用新的数据和文件签名更新缓存"""
+        self._cache = df
+        self._cache_signature = self.backend.signature()
+        self._cache_version = self.backend.version()
+        self._id_index = None
+    
+    def _append_to_cache(self, new_df):
+        """把刚写入的记录并入缓存"""
+        if self._cache.empty:
+            self._set_cache(new_df.reset_index(drop=True))
+        else:
+            self._set_cache(concat_records([self._cache, new_df]))
+    
+    def _invalidate_cache(self):
+        """丢弃缓存，下次读取时重新解析数据文件"""
+        self._cache = None
+        self._cache_signature = None
+        self._id_index = None
+        self._rollup = None
+        self._date_order = None
+        self._sorted_dates = None
+        self._running_balance = None
+    
+    def _record_position(self, record_id):
+        """通过ID索引查找记录在缓存中的行位置，不存在时返回None"""
+        df = self._load_records()
+        if self._id_index is None:
+            self._id_index = pd.Index(df['ID'])
+        if record_id not in self._id_index:
+            return None
+        return self._id_index.get_loc(record_id)
+    
+    @timed()
+    @_locked
+    def get_record(self, record_id):
         """
-        删除记录
+        按ID获取一条记录
         
         Args:
-            record_index (int): 记录索引
+            record_id (int): 记录ID
+        
+        Returns:
+            dict: 记录内容，不存在时返回None
+        """
+        try:
+            position = self._record_position(record_id)
+            if position is None:
+                return None
+            record = self._cache.iloc[position].to_dict()
+            record['金额'] = float(from_cents(record['金额']))
+            return record
+        
+        except Exception as e:
+            print(f"读取记录时出错: {e}")
+            metrics.record_error(e)
+            return None
+    
+    @timed()
+    @_locked
+    def get_version(self):
+        """
+        获取数据版本号，只增不减
+        
+        每次添加、删除、修改或清空后加一，数据文件在程序外被修改后也会加一，
+        可作为缓存统计结果、图表等派生数据的键。
+        
+        Returns:
+            int: 版本号
+        """
+        self._load_records()
+        return self.backend.version()
+    
+    def _version_conflict(self, expected_version):
+        """数据版本已不是调用方读取时的版本，调用方需已持有锁"""
+        if expected_version is not None and self.backend.version() != expected_version:
+            print(f"数据已被修改（读取时版本 {expected_version}，当前版本 {self.backend.version()}）")
+            return True
+        return False
+    
+    @timed(rows=int)
+    @_locked
+    def delete_record(self, record_id, expected_version=None):
+        """
+        按ID删除记录，其余记录的ID保持不变，已删除的ID不会再被分配
+        
+        Args:
+            record_id (int): 记录ID
+            expected_version (int): 读取记录时的数据版本号，提供时版本已变化则不删除
         
         Returns:
             bool: 是否删除成功
         """
         try:
-            df = self.get_all_records()
+            if self._version_conflict(expected_version):
+                return False
             
-            if record_index < 0 or record_index >= len(df):
+            position = self._record_position(record_id)
+            if position is None:
                 return False
             
-            # 删除指定索引的记录
-            df = df.drop(df.index[record_index]).reset_index(drop=True)
+            self.backend.delete([record_id])
+            self.backend.bump_version()
             
-            # 重新分配ID
-            df['ID'] = range(1, len(df) + 1)
+            # 缓存中只移除这一行
+            df = self._cache
+            self._update_rollup(removed=df.iloc[[position]])
+            self._index_removed_position(position)
+            self._set_cache(df.drop(df.index[position]).reset_index(drop=True))
+            return True
+        
+        except Exception as e:
+            print(f"删除记录时出错: {e}")
+            metrics.record_error(e)
+            self._invalidate_cache()
+            return False
+    
+    @timed(rows=int)
+    @_locked
+    def update_record(self, record_id, expected_version=None, **changes):
+        """
+        按ID修改记录
+        
+        Args:
+            record_id (int): 记录ID
+            expected_version (int): 读取记录时的数据版本号，提供时版本已变化则不修改
+            **changes: 要修改的字段，可用账本列名或add_record的参数名，例如 amount=35.5
+        
+        Returns:
+            bool: 是否修改成功
+        """
+        try:
+            if self._version_conflict(expected_version):
+                return False
             
-            # 保存到Excel
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='记账记录', index=False)
-                
-                # 重新格式化工作表
-                worksheet = writer.sheets['记账记录']
-                self._format_excel_sheet(worksheet)
+            position = self._record_position(record_id)
+            if position is None:
+                return False
             
-            return True
+            changes = self._prepare_changes(changes)
+            if not changes:
+                return False
             
+            self.backend.update(record_id, changes)
+            self.backend.bump_version()
+            
+            # 缓存中只修改这一行
+            df = self._cache.copy()
+            for column, value in changes.items():
+                if column == '金额':
+                    value = int(round(value * AMOUNT_SCALE))
+                elif column in ('分类', '备注') and value is None:
+                    value = ''
+                if column == '分类' and value not in df['分类'].cat.categories:
+                    df['分类'] = df['分类'].cat.add_categories([value])
+                df.loc[df.index[position], column] = value
+            self._update_rollup(added=df.iloc[[position]], removed=self._cache.iloc[[position]])
+            if '日期' in changes:
+                # 日期变化后重新排序，修改很少发生，下次查询时再重建即可
+                self._date_order = None
+                self._sorted_dates = None
+                self._running_balance = None
+            elif '金额' in changes or '类型' in changes:
+                self._index_changed_amount(position, self._cache, df)
+            self._set_cache(df)
+            return True
+        
         except Exception as e:
-            print(f"删除记录时出错: {e}")
+            print(f"修改记录时出错: {e}")
+            metrics.record_error(e)
+            self._invalidate_cache()
             return False
     
+    def _prepare_changes(self, changes):
+        """整理并校验要修改的字段，无效时返回None"""
+        changes = {FIELD_ALIASES.get(column, column): value for column, value in changes.items()}
+        
+        unknown = [column for column in changes if column not in ('类型', '金额', '分类', '日期', '备注')]
+        if unknown:
+            print(f"不能修改的字段: {', '.join(unknown)}")
+            return None
+        
+        if '类型' in changes and changes['类型'] not in RECORD_TYPES:
+            print(f"无效的记录类型: {changes['类型']}")
+            return None
+        if '金额' in changes:
+            changes['金额'] = float(changes['金额'])
+            if not changes['金额'] > 0:
+                print(f"无效的金额: {changes['金额']}")
+                return None
+        if '日期' in changes:
+            changes['日期'] = pd.Timestamp(changes['日期'])
+        
+        return changes
+    
+    @timed(rows=int)
+    @_locked
+    def recategorize(self, categorizer, only=None, expected_version=None):
+        """
+        按分类规则重新分类已有记录，分类有变化的记录整批写入一次
+        
+        Args:
+            categorizer (Categorizer): 分类器
+            only (list): 只修改原分类在其中的记录，默认修改所有命中规则的记录
+            expected_version (int): 读取记录时的数据版本号，提供时版本已变化则不修改
+        
+        Returns:
+            int: 分类有变化的记录数，失败时为0
+        """
+        try:
+            if self._version_conflict(expected_version):
+                return 0
+            
+            df = self._load_records()
+            if df.empty:
+                return 0
+            
+            # 分类器按元比较金额条件，新的分类可能不在原有类别中，按取值比较
+            categories = categorizer.apply(self._public(df), only=only)['分类']
+            changed = categories.to_numpy(dtype=object) != df['分类'].to_numpy(dtype=object)
+            if not changed.any():
+                return 0
+            new_df = df.assign(分类=categories)
+            
+            self.backend.update_many([
+                (int(record_id), {'分类': category})
+                for record_id, category in zip(new_df['ID'][changed], new_df['分类'][changed])
+            ])
+            self.backend.bump_version()
+            
+            # 日期和ID都没变，只需更新汇总表
+            self._update_rollup(added=new_df[changed], removed=df[changed])
+            self._set_cache(new_df)
+            return int(changed.sum())
+        
+        except Exception as e:
+            print(f"重新分类时出错: {e}")
+            metrics.record_error(e)
+            self._invalidate_cache()
+            return 0
+    
+    @timed()
+    @_locked
     def clear_all_data(self):
         """
         清空所有数据
@@ -198,71 +753,392 @@ class DataManager:
             bool: 是否清空成功
         """
         try:
-            # 创建空的DataFrame
-            df = pd.DataFrame(columns=[
-                'ID', '类型', '金额', '分类', '日期', '备注', '创建时间'
-            ])
-            
-            # 保存到Excel
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='记账记录', index=False)
-                
-                # 重新格式化工作表
-                worksheet = writer.sheets['记账记录']
-                self._format_excel_sheet(worksheet)
-            
+            self.backend.clear()
+            self.backend.bump_version()
+            self._set_cache(apply_schema(empty_frame()))
+            self._rollup = None
+            self._date_order = None
+            self._sorted_dates = None
+            self._running_balance = None
             return True
-            
+        
         except Exception as e:
             print(f"清空数据时出错: {e}")
+            metrics.record_error(e)
             return False
     
+    @staticmethod
+    def _aggregate(df):
+        """把缓存格式的记录按 日期×类型×分类 汇总为金额合计（分）和笔数"""
+        keys = [df['日期'].dt.normalize(), df['类型'], df['分类']]
+        grouped = df['金额'].groupby(keys, observed=True)
+        result = pd.DataFrame({'金额': grouped.sum(), '笔数': grouped.count()})
+        
+        # 按类别编码分组，结果的类型和分类层换成普通字符串，类别不同的汇总表也能直接相加
+        levels = result.index.levels
+        result.index = result.index.set_levels([levels[1].astype(str), levels[2].astype(str)], level=[1, 2])
+        return result
+    
+    def _get_rollup(self):
+        """返回与缓存记录一致的汇总表，缺失时从缓存重建"""
+        df = self._load_records()
+        if self._rollup is None:
+            self._rollup = self._aggregate(df).sort_index()
+        return self._rollup
+    
+    def _update_rollup(self, added=None, removed=None):
+        """把新增或移除的记录增量计入汇总表，汇总表尚未建立时无需处理"""
+        if self._rollup is None:
+            return
+        
+        rollup = self._rollup
+        if added is not None and not added.empty:
+            rollup = rollup.add(self._aggregate(added), fill_value=0)
+        if removed is not None and not removed.empty:
+            rollup = rollup.sub(self._aggregate(removed), fill_value=0)
+        
+        # 对齐时补零会转为浮点数，去掉已没有记录的分组后换回整数
+        rollup = rollup[rollup['笔数'] > 0].sort_index()
+        rollup['金额'] = rollup['金额'].round().astype('int64')
+        rollup['笔数'] = rollup['笔数'].astype(int)
+        self._rollup = rollup
+    
+    @timed()
+    @_locked
+    def get_rollup(self, start_date=None, end_date=None):
+        """
+        获取按 日期×类型×分类 预先汇总的金额和笔数
+        
+        汇总表随新增、删除和修改增量维护，统计页面的合计、趋势图和饼图都可以由它得出，
+        无需扫描全部记录。
+        
+        Args:
+            start_date (date): 开始日期（含）
+            end_date (date): 结束日期（含）
+        
+        Returns:
+            pd.DataFrame: 日期、类型、分类、金额、笔数 五列
+        """
+        try:
+            result = self._rollup_between(start_date, end_date).reset_index()
+            result.columns = ['日期', '类型', '分类', '金额', '笔数']
+            result['金额'] = from_cents(result['金额'])
+            return result
+        
+        except Exception as e:
+            print(f"获取汇总数据时出错: {e}")
+            metrics.record_error(e)
+            return pd.DataFrame(columns=['日期', '类型', '分类', '金额', '笔数'])
+    
+    def _rollup_between(self, start_date=None, end_date=None):
+        """汇总表中日期范围内的部分，金额以分为单位"""
+        rollup = self._get_rollup()
+        days = rollup.index.get_level_values(0)
+        
+        mask = None
+        if start_date:
+            mask = days >= pd.Timestamp(start_date).normalize()
+        if end_date:
+            end_mask = days <= pd.Timestamp(end_date).normalize()
+            mask = end_mask if mask is None else mask & end_mask
+        if mask is not None:
+            rollup = rollup[mask]
+        return rollup
+    
+    def _date_index(self):
+        """返回按日期排序的缓存行位置及对应的有序日期，缺失时重建"""
+        df = self._load_records()
+        if self._date_order is None:
+            dates = df['日期'].to_numpy()
+            self._date_order = np.argsort(dates, kind='stable')
+            self._sorted_dates = dates[self._date_order]
+        return self._date_order, self._sorted_dates
+    
+    def _index_added_dates(self, first_position, dates):
+        """把新追加到缓存末尾的记录插入日期索引，无需重新排序"""
+        if self._date_order is None:
+            return
+        
+        dates = dates.to_numpy().astype(self._sorted_dates.dtype)
+        new_order = np.argsort(dates, kind='stable')
+        new_dates = dates[new_order]
+        
+        # 相同日期排在已有记录之后，保持写入顺序
+        slots = np.searchsorted(self._sorted_dates, new_dates, side='right')
+        self._sorted_dates = np.insert(self._sorted_dates, slots, new_dates)
+        self._date_order = np.insert(self._date_order, slots, new_order + first_position)
+        
+        if self._running_balance is not None and len(slots):
+            # 最早的新记录之前的累计结余不变，只从它开始重新累加，调用方需已把新记录并入缓存
+            start = int(slots[0])
+            base = self._running_balance[start - 1] if start else 0
+            suffix = self._signed_cents(self._cache, self._date_order[start:])
+            self._running_balance = np.concatenate([self._running_balance[:start], base + np.cumsum(suffix)])
+    
+    def _index_removed_position(self, position):
+        """从日期索引中移除缓存中的一行，其后的行位置前移一位"""
+        if self._date_order is None:
+            return
+        
+        keep = self._date_order != position
+        if self._running_balance is not None:
+            # 被删除的记录之后的累计结余都减去它的金额
+            slot = int(np.flatnonzero(~keep)[0])
+            running = self._running_balance
+            amount = running[slot] - (running[slot - 1] if slot else 0)
+            running = np.delete(running, slot)
+            running[slot:] -= amount
+            self._running_balance = running
+        
+        order = self._date_order[keep]
+        self._date_order = np.where(order > position, order - 1, order)
+        self._sorted_dates = self._sorted_dates[keep]
+    
+    def _index_changed_amount(self, position, old_df, new_df):
+        """记录的金额或类型被修改后，把差额计入它之后的累计结余"""
+        if self._running_balance is None:
+            return
+        
+        slot = int(np.flatnonzero(self._date_order == position)[0])
+        delta = self._signed_cents(new_df, [position])[0] - self._signed_cents(old_df, [position])[0]
+        self._running_balance[slot:] += delta
+    
+    @staticmethod
+    def _signed_cents(df, positions):
+        """缓存中指定行的带符号金额（分），收入为正、支出为负"""
+        amounts = df['金额'].to_numpy()[positions]
+        # TYPE_DTYPE的类别依次为收入、支出，编码0即收入
+        codes = df['类型'].cat.codes.to_numpy()[positions].astype(np.int64)
+        return amounts * (1 - 2 * codes)
+    
+    def _balance_index(self):
+        """返回有序日期及对应的累计结余（分），缺失时整列累加重建"""
+        order, sorted_dates = self._date_index()
+        if self._running_balance is None:
+            self._running_balance = np.cumsum(self._signed_cents(self._cache, order))
+        return sorted_dates, self._running_balance
+    
+    def _end_slot(self, sorted_dates, end_date):
+        """结束时间在有序日期中的右边界，传入date时包含当天全天"""
+        if self._is_whole_day(end_date):
+            end = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_datetime64()
+            return np.searchsorted(sorted_dates, end.astype(sorted_dates.dtype), side='left')
+        end = pd.Timestamp(end_date).to_datetime64()
+        return np.searchsorted(sorted_dates, end.astype(sorted_dates.dtype), side='right')
+    
+    def _date_range_slice(self, start_date=None, end_date=None):
+        """
+        二分查找时间范围在日期索引中的区间
+        
+        只传日期（date）时包含当天全天，传入datetime时精确到时刻，两端都包含。
+        
+        Returns:
+            np.ndarray: 范围内记录在缓存中的行位置，按日期排序
+        """
+        order, sorted_dates = self._date_index()
+        
+        lo = 0
+        hi = len(sorted_dates)
+        if start_date is not None:
+            start = pd.Timestamp(start_date).to_datetime64().astype(sorted_dates.dtype)
+            lo = np.searchsorted(sorted_dates, start, side='left')
+        if end_date is not None:
+            hi = self._end_slot(sorted_dates, end_date)
+        
+        return order[lo:max(lo, hi)]
+    
+    @timed(rows=len)
+    @_locked
+    def get_records_between(self, start_date=None, end_date=None):
+        """
+        获取时间范围内的记录，按日期升序排列
+        
+        通过有序日期索引二分查找，耗时为 O(log n + k)，不会逐行比较日期。
+        
+        Args:
+            start_date (datetime): 开始时间（含），传入date时从当天零点开始
+            end_date (datetime): 结束时间（含），传入date时包含当天全天
+        
+        Returns:
+            pd.DataFrame: 范围内的记录
+        """
+        try:
+            positions = self._date_range_slice(start_date, end_date)
+            return self._public(self._cache.iloc[positions].reset_index(drop=True))
+        
+        except Exception as e:
+            print(f"读取记录时出错: {e}")
+            metrics.record_error(e)
+            return empty_frame()
+    
+    @timed(rows=lambda result: len(result[0]))
+    @_locked
+    def query_records(self, record_type=None, category=None, start_date=None, end_date=None,
+                      sort_by='日期', ascending=False, offset=0, limit=50):
+        """
+        分页查询记录，筛选和排序后只取出一页
+        
+        按日期排序时直接沿用有序日期索引，筛选是整列的向量比较，
+        返回的只有一页记录，页面渲染耗时不随账本增大。
+        
+        Args:
+            record_type (str): 只查询该类型（收入/支出）
+            category (str): 只查询该分类
+            start_date (datetime): 开始时间（含），传入date时从当天零点开始
+            end_date (datetime): 结束时间（含），传入date时包含当天全天
+            sort_by (str): 排序字段，日期 或 金额
+            ascending (bool): 是否升序
+            offset (int): 跳过的记录数
+            limit (int): 每页记录数
+        
+        Returns:
+            tuple: (当前页记录的DataFrame, 符合条件的记录总数)
+        """
+        try:
+            if sort_by not in ('日期', '金额'):
+                raise ValueError(f"不支持的排序字段: {sort_by}")
+            
+            df = self._load_records()
+            positions = self._filter_positions(df, self._date_range_slice(start_date, end_date), record_type, category)
+            
+            if sort_by == '金额':
+                # 稳定排序，金额相同的记录保持日期顺序
+                positions = positions[np.argsort(df['金额'].to_numpy()[positions], kind='stable')]
+            if not ascending:
+                positions = positions[::-1]
+            
+            page = df.iloc[positions[offset:offset + limit]].reset_index(drop=True)
+            return self._public(page), len(positions)
+        
+        except Exception as e:
+            print(f"查询记录时出错: {e}")
+            metrics.record_error(e)
+            return empty_frame(), 0
+    
+    @timed()
+    @_locked
+    def balance_at(self, when):
+        """
+        获取截至某一时刻的累计结余（此前全部收入减全部支出）
+        
+        在有序日期索引上二分查找，再取出该位置的累计结余，耗时为 O(log n)。
+        
+        Args:
+            when (datetime): 截止时间（含），传入date时包含当天全天
+        
+        Returns:
+            float: 累计结余（元），出错时为0
+        """
+        try:
+            sorted_dates, running = self._balance_index()
+            count = self._end_slot(sorted_dates, when)
+            return from_cents(int(running[count - 1])) if count else 0.0
+        
+        except Exception as e:
+            print(f"计算累计结余时出错: {e}")
+            metrics.record_error(e)
+            return 0
+    
+    @timed(rows=len)
+    @_locked
+    def get_balance_series(self, start_date=None, end_date=None):
+        """
+        获取按日的期末累计结余，用于余额走势图
+        
+        开始日期之前的记录同样计入结余，每天的值都是截至当天的实际结余。
+        
+        Args:
+            start_date (datetime): 开始时间（含），传入date时从当天零点开始
+            end_date (datetime): 结束时间（含），传入date时包含当天全天
+        
+        Returns:
+            pd.Series: 以日期为索引的累计结余（元），只包含有记录的日期
+        """
+        try:
+            sorted_dates, running = self._balance_index()
+            
+            lo = 0
+            hi = len(sorted_dates)
+            if start_date is not None:
+                start = pd.Timestamp(start_date).to_datetime64().astype(sorted_dates.dtype)
+                lo = np.searchsorted(sorted_dates, start, side='left')
+            if end_date is not None:
+                hi = max(lo, self._end_slot(sorted_dates, end_date))
+            
+            days = sorted_dates[lo:hi].astype('datetime64[D]')
+            if len(days) == 0:
+                return pd.Series(dtype=float, index=pd.DatetimeIndex([], name='日期'), name='余额')
+            
+            # 每天最后一条记录处的累计结余就是当天的期末结余
+            last = np.append(np.flatnonzero(days[1:] != days[:-1]), len(days) - 1)
+            index = pd.DatetimeIndex(days[last], name='日期')
+            return pd.Series(from_cents(running[lo:hi][last]), index=index, name='余额')
+        
+        except Exception as e:
+            print(f"计算余额走势时出错: {e}")
+            metrics.record_error(e)
+            return pd.Series(dtype=float, index=pd.DatetimeIndex([], name='日期'), name='余额')
+    
+    @staticmethod
+    def _is_whole_day(value):
+        """未提供或只精确到日的时间边界可以直接用按日汇总的数据统计"""
+        return value is None or (isinstance(value, dt.date) and not isinstance(value, datetime))
+    
+    @timed()
+    @_locked
     def get_statistics(self, start_date=None, end_date=None):
         """
         获取统计数据
         
         Args:
-            start_date (datetime): 开始日期
-            end_date (datetime): 结束日期
+            start_date (datetime): 开始日期，传入date时包含当天
+            end_date (datetime): 结束日期，传入date时包含当天
         
         Returns:
             dict: 统计数据
         """
         try:
-            df = self.get_all_records()
+            stats = None
+            if not self._cache_is_valid():
+                # 记录尚未读入内存时，能直接统计的后端（SQLite、分区存储）只读取范围内的数据
+                end = end_date
+                if end_date is not None and self._is_whole_day(end_date):
+                    end = pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+                stats = self.backend.statistics(start_date, end)
             
-            if df.empty:
-                return {
-                    'total_income': 0,
-                    'total_expense': 0,
-                    'balance': 0,
-                    'record_count': 0
+            if stats is None and self._is_whole_day(start_date) and self._is_whole_day(end_date):
+                # 按日的时间范围直接由汇总表得出
+                rollup = self._rollup_between(start_date, end_date)
+                totals = rollup['金额'].groupby(level=1).sum()
+                stats = {
+                    'total_income': totals.get('收入', 0),
+                    'total_expense': totals.get('支出', 0),
+                    'record_count': int(rollup['笔数'].sum())
                 }
             
-            # 时间筛选
-            if start_date:
-                df = df[df['日期'] >= start_date]
-            if end_date:
-                df = df[df['日期'] <= end_date]
-            
-            # 计算统计
-            income_df = df[df['类型'] == '收入']
-            expense_df = df[df['类型'] == '支出']
-            
-            total_income = income_df['金额'].sum() if not income_df.empty else 0
-            total_expense = expense_df['金额'].sum() if not expense_df.empty else 0
-            balance = total_income - total_expense
-            record_count = len(df)
+            # 范围精确到时刻时，用日期索引取出内存中范围内的记录计算
+            if stats is None:
+                df = self._load_records().iloc[self._date_range_slice(start_date, end_date)]
+                
+                stats = {
+                    'total_income': df.loc[df['类型'] == '收入', '金额'].sum(),
+                    'total_expense': df.loc[df['类型'] == '支出', '金额'].sum(),
+                    'record_count': len(df)
+                }
             
+            # 合计都是以分为单位的整数，最后才换算为元
+            income = int(stats['total_income'])
+            expense = int(stats['total_expense'])
             return {
-                'total_income': total_income,
-                'total_expense': total_expense,
-                'balance': balance,
-                'record_count': record_count
+                'total_income': from_cents(income),
+                'total_expense': from_cents(expense),
+                'balance': from_cents(income - expense),
+                'record_count': int(stats['record_count'])
             }
-            
+        
         except Exception as e:
             print(f"获取统计数据时出错: {e}")
+            metrics.record_error(e)
             return {
                 'total_income': 0,
                 'total_expense': 0,
@@ -270,9 +1146,102 @@ class DataManager:
                 'record_count': 0
             }
     
-    def export_to_csv(self, output_path=None):
+    def _select_positions(self, df, start_date=None, end_date=None, record_type=None, category=None):
+        """按时间范围、类型和分类筛选，返回符合条件的记录在缓存中的行位置"""
+        if start_date is None and end_date is None:
+            positions = np.arange(len(df))
+        else:
+            positions = self._date_range_slice(start_date, end_date)
+        return self._filter_positions(df, positions, record_type, category)
+    
+    @staticmethod
+    def _filter_positions(df, positions, record_type=None, category=None):
+        """在给定行位置中保留类型和分类符合条件的，顺序不变"""
+        # 先对整列做向量比较得到布尔数组，避免把字符串列转换成Python对象
+        if record_type:
+            matches = df['类型'] == record_type
+            positions = positions[matches.to_numpy(dtype=bool, na_value=False)[positions]]
+        if category is not None:
+            # 分类列是category，比较的是类别编码；没有分类的记录已统一为空字符串，与汇总数据一致
+            matches = df['分类'] == category
+            positions = positions[matches.to_numpy(dtype=bool, na_value=False)[positions]]
+        return positions
+    
+    @timed()
+    def iter_csv(self, chunk_size=EXPORT_CHUNK_ROWS, compress=False, start_date=None, end_date=None,
+                 record_type=None, category=None):
         """
-        导出数据到CSV文件
+        分块生成CSV内容，内存占用只与块大小有关
+        
+        开头只写一次UTF-8 BOM，Excel打开不乱码。指定时间范围时按日期升序输出，否则按写入顺序。
+        
+        Args:
+            chunk_size (int): 每块的记录数
+            compress (bool): 是否输出gzip压缩后的内容
+            start_date (date): 开始日期（含）
+            end_date (date): 结束日期（含）
+            record_type (str): 只导出该类型（收入/支出）
+            category (str): 只导出该分类
+        
+        Yields:
+            bytes: 编码后的CSV内容片段
+        """
+        # 固定住当前缓存，导出过程中其他会话写入也不影响本次结果
+        with self.backend.lock:
+            df = self._load_records()
+            positions = self._select_positions(df, start_date, end_date, record_type, category)
+        
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+        
+        def encode(text, first=False):
+            data = (codecs.BOM_UTF8 if first else b'') + text.encode('utf-8')
+            return compressor.compress(data) if compressor else data
+        
+        # 表头
+        yield encode(','.join(COLUMNS) + '\n', first=True)
+        
+        for begin in range(0, len(positions), chunk_size):
+            chunk = self._public(df.iloc[positions[begin:begin + chunk_size]][COLUMNS])
+            data = encode(chunk.to_csv(index=False, header=False, date_format=EXPORT_DATE_FORMAT))
+            if data:
+                yield data
+        
+        if compressor:
+            yield compressor.flush()
+    
+    @timed()
+    def export_to_csv(self, output_path=None, compress=False, **filters):
+        """
+        导出数据到CSV文件，分块写入
+        
+        Args:
+            output_path (str): 输出文件路径
+            compress (bool): 是否gzip压缩
+            **filters: 筛选条件，参见iter_csv的start_date、end_date、record_type、category
+        
+        Returns:
+            str: 输出文件路径
+        """
+        try:
+            if output_path is None:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                extension = 'csv.gz' if compress else 'csv'
+                output_path = os.path.join(self.data_dir, f"account_export_{timestamp}.{extension}")
+            
+            with open(output_path, 'wb') as f:
+                for data in self.iter_csv(compress=compress, **filters):
+                    f.write(data)
+            return output_path
+        
+        except Exception as e:
+            print(f"导出数据时出错: {e}")
+            metrics.record_error(e)
+            return None
+    
+    @timed()
+    def export_to_excel(self, output_path=None):
+        """
+        导出数据到格式化的Excel文件，任何存储后端都可使用
         
         Args:
             output_path (str): 输出文件路径
@@ -285,14 +1254,12 @@ class DataManager:
             
             if output_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                output_path = os.path.join(self.data_dir, f"account_export_{timestamp}.csv")
+                output_path = os.path.join(self.data_dir, f"account_export_{timestamp}.xlsx")
             
-            df.to_csv(output_path, index=False, encoding='utf-8-sig')
+            write_excel(df[COLUMNS], output_path)
             return output_path
-            
+        
         except Exception as e:
             print(f"导出数据时出错: {e}")
+            metrics.record_error(e)
             return None
-
-
-
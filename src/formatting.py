@@ -0,0 +1,99 @@
+# 显示格式化模块
+
+import pandas as pd
+import numpy as np
+from .metrics import timed
+
+# 页面上显示的日期格式
+DISPLAY_DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+# 金额前缀
+AMOUNT_PREFIX = '¥'
+
+# 与ISO格式前缀相同的日期格式，对应numpy的时间精度，可以整列转换而不必逐个strftime
+ISO_DATE_FORMATS = {
+    '%Y-%m-%d': 'D',
+    '%Y-%m-%d %H:%M': 'm',
+    '%Y-%m-%d %H:%M:%S': 's'
+}
+
+
+def format_amounts(amounts, prefix=AMOUNT_PREFIX):
+    """
+    把金额列格式化为两位小数的文本，例如 ¥12.50
+    
+    账本中的金额大量重复，先去重再格式化，每个不同的金额只格式化一次。
+    
+    Args:
+        amounts (pd.Series): 金额
+        prefix (str): 金额前缀
+    
+    Returns:
+        pd.Series: 格式化后的文本，索引与输入一致，缺失值为空字符串
+    """
+    codes, uniques = pd.factorize(amounts.round(2))
+    labels = np.array([f"{prefix}{value:.2f}" for value in uniques] + [''], dtype=object)
+    # 缺失值的编码为-1，正好取到末尾的空字符串
+    return pd.Series(labels[codes], index=amounts.index)
+
+
+def format_dates(dates, date_format=DISPLAY_DATE_FORMAT):
+    """
+    把日期列格式化为文本
+    
+    ISO前缀格式（如 %Y-%m-%d %H:%M）由numpy整列转换，其他格式退回strftime。
+    
+    Args:
+        dates (pd.Series): datetime类型的日期
+        date_format (str): strftime格式
+    
+    Returns:
+        pd.Series: 格式化后的文本，索引与输入一致，缺失值为空字符串
+    """
+    unit = ISO_DATE_FORMATS.get(date_format)
+    if unit is None or getattr(dates.dt, 'tz', None) is not None:
+        return dates.dt.strftime(date_format).fillna('')
+    
+    values = np.datetime_as_string(dates.to_numpy(), unit=unit)
+    result = pd.Series(values, index=dates.index, dtype=object).str.replace('T', ' ', regex=False)
+    return result.where(dates.notna(), '')
+
+
+@timed(rows=len)
+def format_records(df, date_format=DISPLAY_DATE_FORMAT):
+    """
+    生成用于显示的记录表，日期和金额替换为格式化后的文本，其余列不变
+    
+    Args:
+        df (pd.DataFrame): 记录
+        date_format (str): 日期格式
+    
+    Returns:
+        pd.DataFrame: 新的表格，不修改传入的记录
+    """
+    columns = {}
+    if '日期' in df.columns:
+        columns['日期'] = format_dates(df['日期'], date_format)
+    if '金额' in df.columns:
+        columns['金额'] = format_amounts(df['金额'])
+    return df.assign(**columns)
+
+
+@timed(rows=len)
+def format_record_labels(df, date_format=DISPLAY_DATE_FORMAT):
+    """
+    生成每条记录的一行描述，例如 2024-01-02 12:00 - 支出 - 🍽️ 餐饮 - ¥35.50
+    
+    Args:
+        df (pd.DataFrame): 记录
+        date_format (str): 日期格式
+    
+    Returns:
+        pd.Series: 描述文本，索引与输入一致
+    """
+    return (
+        format_dates(df['日期'], date_format)
+        + ' - ' + df['类型'].astype(object).fillna('').astype(str)
+        + ' - ' + df['分类'].astype(object).fillna('').astype(str)
+        + ' - ' + format_amounts(df['金额'])
+    )
@@ -0,0 +1,368 @@
+# 账单导入模块
+
+import os
+import csv
+import codecs
+import pandas as pd
+import numpy as np
+import openpyxl
+from .data_manager import RECORD_TYPES, to_cents
+from .metrics import metrics, timed
+
+# 分块读取账单时每块的行数
+IMPORT_CHUNK_ROWS = 20000
+
+# 在文件开头的多少行内查找表头，支付宝、微信账单的表头前有若干行说明文字
+HEADER_SCAN_LINES = 60
+
+# 识别表头和编码时读取的字节数
+HEADER_SCAN_BYTES = 64 * 1024
+
+# 依次尝试的CSV编码，支付宝账单为GBK
+CSV_ENCODINGS = ('utf-8-sig', 'gb18030')
+
+# 账单中没有对应分类时使用的默认分类
+DEFAULT_CATEGORIES = {'支出': '其他', '收入': '💸 其他收入'}
+
+# 交易状态中包含这些文字的记录不导入
+EXCLUDED_STATUSES = ('关闭', '失败')
+
+# 预览时显示的记录数
+PREVIEW_ROWS = 50
+
+# 支持的账单格式：markers中的列全部存在时识别为该格式，其余为各字段可能的列名，按顺序取第一个存在的
+STATEMENT_FORMATS = {
+    'wechat': {
+        'name': '微信支付',
+        'markers': ('收/支', '当前状态'),
+        'date': ('交易时间',),
+        'amount': ('金额(元)', '金额（元）', '金额'),
+        'direction': ('收/支',),
+        'status': ('当前状态',),
+        'note': ('交易对方', '商品', '备注'),
+    },
+    'alipay': {
+        'name': '支付宝',
+        'markers': ('收/支', '交易状态'),
+        'date': ('交易时间', '交易创建时间', '付款时间'),
+        'amount': ('金额', '金额（元）', '金额(元)'),
+        'direction': ('收/支',),
+        'status': ('交易状态',),
+        'note': ('交易对方', '商品说明', '商品名称', '备注'),
+    },
+    'bank': {
+        'name': '银行流水',
+        'markers': (),
+        'date': ('交易日期', '记账日期', '交易时间', '日期'),
+        # 带正负号的金额，负数为支出
+        'amount': ('交易金额', '发生额', '金额'),
+        # 收入和支出分两列的流水
+        'income': ('收入金额', '贷方金额', '存入金额', '收入'),
+        'expense': ('支出金额', '借方金额', '支取金额', '支出'),
+        'note': ('对方户名', '摘要', '交易摘要', '用途', '备注'),
+    },
+}
+
+
+def _find_column(columns, candidates):
+    """返回候选列名中第一个存在的，都不存在时返回None"""
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    return None
+
+
+def _match_format(columns, fmt=None):
+    """按表头判断账单格式，指定fmt时只检查该格式，无法识别时返回None"""
+    for key in ([fmt] if fmt else STATEMENT_FORMATS):
+        spec = STATEMENT_FORMATS[key]
+        if not all(marker in columns for marker in spec['markers']):
+            continue
+        if _find_column(columns, spec['date']) is None:
+            continue
+        has_amount = _find_column(columns, spec['amount']) is not None
+        has_split = (_find_column(columns, spec.get('income', ())) is not None
+                     and _find_column(columns, spec.get('expense', ())) is not None)
+        if has_amount or has_split:
+            return key
+    return None
+
+
+def _open_binary(source):
+    """
+    以二进制方式打开账单
+    
+    Args:
+        source: 文件路径，或已打开的二进制文件对象（如Streamlit上传的文件）
+    
+    Returns:
+        tuple: (文件对象, 是否需要由调用方关闭)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb'), True
+    source.seek(0)
+    return source, False
+
+
+def _clean_header(cells):
+    """去掉表头单元格两端的空白和制表符"""
+    return [str(cell).strip() if cell is not None else '' for cell in cells]
+
+
+def _read_layout(f, fmt=None):
+    """
+    识别账单的文件类型、编码、格式和表头所在行
+    
+    Returns:
+        dict: kind（csv/excel）、encoding、format、header_row、columns，无法识别时返回None
+    """
+    sample = f.read(HEADER_SCAN_BYTES)
+    f.seek(0)
+    
+    # xlsx文件是zip压缩包
+    if sample.startswith(b'PK\x03\x04'):
+        workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            for row_number, row in enumerate(workbook.active.iter_rows(values_only=True)):
+                if row_number >= HEADER_SCAN_LINES:
+                    break
+                columns = _clean_header(row)
+                key = _match_format(columns, fmt)
+                if key:
+                    return {'kind': 'excel', 'encoding': None, 'format': key,
+                            'header_row': row_number, 'columns': columns}
+        finally:
+            workbook.close()
+            f.seek(0)
+        return None
+    
+    for encoding in CSV_ENCODINGS:
+        try:
+            # 增量解码，样本末尾被截断的多字节字符不算解码失败
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        
+        lines = text.splitlines()[:HEADER_SCAN_LINES]
+        for row_number, line in enumerate(lines):
+            columns = _clean_header(next(csv.reader([line]), []))
+            key = _match_format(columns, fmt)
+            if key:
+                return {'kind': 'csv', 'encoding': encoding, 'format': key,
+                        'header_row': row_number, 'columns': columns}
+    return None
+
+
+def _iter_raw_chunks(f, layout, chunk_size):
+    """按表头逐块读取账单原始内容，每块为列名已清理的DataFrame"""
+    if layout['kind'] == 'csv':
+        reader = pd.read_csv(
+            f,
+            encoding=layout['encoding'],
+            skiprows=layout['header_row'],
+            dtype=str,
+            chunksize=chunk_size,
+            index_col=False,
+            on_bad_lines='skip'
+        )
+        for chunk in reader:
+            chunk.columns = _clean_header(chunk.columns)
+            yield chunk
+        return
+    
+    # read_only模式逐行读取工作表，内存只保存当前块
+    workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row_number, row in enumerate(workbook.active.iter_rows(values_only=True)):
+            if row_number <= layout['header_row']:
+                continue
+            rows.append(row[:len(layout['columns'])])
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows, columns=layout['columns'])
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=layout['columns'])
+    finally:
+        workbook.close()
+
+
+def _text(series):
+    """把列转换为去掉两端空白的文本，缺失值和占位符“/”为空字符串"""
+    text = series.astype(object).where(series.notna(), '').astype(str).str.strip()
+    return text.where(text != '/', '')
+
+
+def _amount(series):
+    """把金额列转换为数值，去掉货币符号和千位分隔符"""
+    text = _text(series).str.replace(r'[¥￥,\s]', '', regex=True)
+    return pd.to_numeric(text, errors='coerce')
+
+
+def _normalize_chunk(chunk, spec):
+    """
+    把一块原始账单转换为账本字段
+    
+    Returns:
+        tuple: (整理后的记录DataFrame, 无效或不计收支而跳过的行数)
+    """
+    columns = chunk.columns
+    dates = pd.to_datetime(_text(chunk[_find_column(columns, spec['date'])]), errors='coerce')
+    
+    amount_column = _find_column(columns, spec['amount'])
+    direction_column = _find_column(columns, spec.get('direction', ()))
+    if direction_column is not None:
+        # 支付宝、微信：收/支列给出类型，“不计收支”等不导入
+        amounts = _amount(chunk[amount_column])
+        direction = _text(chunk[direction_column])
+        record_types = direction.where(direction.isin(RECORD_TYPES))
+    elif amount_column is not None:
+        # 带正负号的银行流水
+        amounts = _amount(chunk[amount_column])
+        record_types = pd.Series(np.where(amounts < 0, '支出', '收入'), index=chunk.index).where(amounts.notna())
+        amounts = amounts.abs()
+    else:
+        income = _amount(chunk[_find_column(columns, spec['income'])]).fillna(0)
+        expense = _amount(chunk[_find_column(columns, spec['expense'])]).fillna(0)
+        record_types = pd.Series(
+            np.where(income > 0, '收入', np.where(expense > 0, '支出', None)), index=chunk.index
+        )
+        amounts = income.where(income > 0, expense)
+    
+    # 备注由交易对方、商品说明等拼接而成
+    note_columns = [column for column in spec['note'] if column in columns]
+    notes = pd.Series('', index=chunk.index)
+    for column in note_columns:
+        notes = notes.str.cat(_text(chunk[column]), sep=' ')
+    notes = notes.str.replace(r'\s+', ' ', regex=True).str.strip()
+    
+    valid = dates.notna() & (amounts > 0) & record_types.notna()
+    status_column = _find_column(columns, spec.get('status', ()))
+    if status_column is not None:
+        excluded = _text(chunk[status_column]).str.contains('|'.join(EXCLUDED_STATUSES))
+        valid &= ~excluded
+    
+    records = pd.DataFrame({
+        '类型': record_types,
+        '金额': amounts.round(2),
+        '分类': record_types.map(DEFAULT_CATEGORIES),
+        '日期': dates,
+        '备注': notes
+    })[valid].reset_index(drop=True)
+    return records, int((~valid).sum())
+
+
+def iter_statement(source, fmt=None, chunk_size=IMPORT_CHUNK_ROWS):
+    """
+    分块读取账单并转换为账本字段，内存占用只与块大小有关
+    
+    Args:
+        source: 账单文件路径或二进制文件对象，支持CSV和XLSX
+        fmt (str): 账单格式（wechat/alipay/bank），默认按表头自动识别
+        chunk_size (int): 每块的行数
+    
+    Yields:
+        tuple: (账单格式, 整理后的记录DataFrame, 本块跳过的行数)
+    """
+    f, should_close = _open_binary(source)
+    try:
+        layout = _read_layout(f, fmt)
+        if layout is None:
+            raise ValueError("无法识别的账单格式")
+        
+        spec = STATEMENT_FORMATS[layout['format']]
+        for chunk in _iter_raw_chunks(f, layout, chunk_size):
+            records, skipped = _normalize_chunk(chunk, spec)
+            yield layout['format'], records, skipped
+    finally:
+        if should_close:
+            f.close()
+
+
+def record_hashes(df):
+    """
+    按 日期（精确到秒）、类型、金额（分）、备注 计算每条记录的哈希值，用于识别重复导入
+    
+    Returns:
+        pd.Series: uint64哈希值，索引与输入一致
+    """
+    key = pd.DataFrame({
+        '日期': pd.to_datetime(df['日期']).dt.floor('s'),
+        '类型': df['类型'].astype(str),
+        '金额': to_cents(df['金额']),
+        '备注': df['备注'].fillna('').astype(str).str.strip()
+    })
+    return pd.util.hash_pandas_object(key, index=False)
+
+
+@timed()
+def import_statement(data_manager, source, fmt=None, dry_run=False, chunk_size=IMPORT_CHUNK_ROWS,
+                     categorizer=None):
+    """
+    导入账单：分块读取、去掉已有的重复记录后整批写入一次
+    
+    账本中已有的记录按哈希值计数，账单中与之相同的记录只跳过同样多条，
+    同一账单内金额、时间、备注都相同的多笔交易仍会导入。
+    
+    Args:
+        data_manager (DataManager): 数据管理器
+        source: 账单文件路径或二进制文件对象
+        fmt (str): 账单格式，默认自动识别
+        dry_run (bool): 只预览不写入
+        chunk_size (int): 每块的行数
+        categorizer (Categorizer): 提供时按分类规则为每块记录分类，没有命中的使用默认分类
+    
+    Returns:
+        dict: format（账单格式名称）、skipped（无效或不计收支的行数）、duplicates（重复的记录数）、
+            new（待导入的记录数）、imported（实际写入的记录数）、preview（待导入记录的前几条），
+            读取失败时返回None
+    """
+    try:
+        existing = record_hashes(data_manager.get_all_records()).value_counts()
+        seen = pd.Series(dtype='float64')
+        
+        statement_format = None
+        skipped = 0
+        duplicates = 0
+        new_chunks = []
+        for statement_format, records, chunk_skipped in iter_statement(source, fmt, chunk_size):
+            skipped += chunk_skipped
+            if records.empty:
+                continue
+            
+            # 本条是账单中第几次出现这一哈希值，超过账本中已有的条数才导入
+            hashes = record_hashes(records)
+            occurrence = hashes.map(seen).fillna(0) + hashes.groupby(hashes).cumcount()
+            keep = (occurrence >= hashes.map(existing).fillna(0)).to_numpy()
+            seen = seen.add(hashes.value_counts(), fill_value=0)
+            
+            duplicates += int((~keep).sum())
+            records = records[keep]
+            if categorizer is not None:
+                records = categorizer.apply(records)
+            new_chunks.append(records)
+        
+        if statement_format is None:
+            raise ValueError("账单中没有可读取的内容")
+        
+        new_records = pd.concat(new_chunks, ignore_index=True) if new_chunks else pd.DataFrame(
+            columns=['类型', '金额', '分类', '日期', '备注']
+        )
+        
+        imported = 0
+        if not dry_run and not new_records.empty:
+            imported = data_manager.add_records(new_records)
+        
+        return {
+            'format': STATEMENT_FORMATS[statement_format]['name'],
+            'skipped': skipped,
+            'duplicates': duplicates,
+            'new': len(new_records),
+            'imported': imported,
+            'preview': new_records.head(PREVIEW_ROWS)
+        }
+    
+    except Exception as e:
+        print(f"导入账单时出错: {e}")
+        metrics.record_error(e)
+        return None
@@ -0,0 +1,343 @@
+# 运行指标模块
+
+import os
+import time
+import inspect
+import functools
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 设置为1时在启动时开启指标统计，默认关闭
+METRICS_ENV = 'MYACCOUNT_METRICS'
+
+# 设置端口号时应用启动HTTP服务，供Prometheus采集
+METRICS_PORT_ENV = 'MYACCOUNT_METRICS_PORT'
+
+# Prometheus指标名前缀
+METRIC_PREFIX = 'myaccount'
+
+# 耗时直方图的桶上界（秒）
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 保留的最近错误条数
+RECENT_ERRORS = 20
+
+
+class OperationStats:
+    """单个操作的累计指标"""
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+    
+    def observe(self, seconds):
+        """记录一次调用的耗时"""
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+
+
+class Metrics:
+    """
+    进程内的运行指标：各操作的调用次数、耗时、错误、涉及的行数和读写字节数，以及缓存命中情况
+    
+    默认关闭，关闭时各记录方法只做一次判断后直接返回。嵌套调用的操作（例如add_record调用add_records）
+    各自计时，行数和字节数计入当前线程上所有正在执行的操作。
+    """
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def enable(self):
+        """开启指标统计"""
+        self.enabled = True
+    
+    def disable(self):
+        """关闭指标统计，已有的数据保留"""
+        self.enabled = False
+    
+    def reset(self):
+        """清空已统计的数据"""
+        with self._lock:
+            self._operations = {}
+            self._cache = {}
+            self._errors = deque(maxlen=RECENT_ERRORS)
+            self.started_at = datetime.now()
+    
+    def _stack(self):
+        """当前线程上正在执行的操作"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+    
+    def _stats(self, operation):
+        """取得操作的累计指标，调用方需已持有锁"""
+        if operation not in self._operations:
+            self._operations[operation] = OperationStats()
+        return self._operations[operation]
+    
+    def _add_to_active(self, field, amount):
+        """把行数或字节数计入当前线程上所有正在执行的操作"""
+        stack = self._stack()
+        if not stack:
+            return
+        with self._lock:
+            for operation in set(stack):
+                stats = self._stats(operation)
+                setattr(stats, field, getattr(stats, field) + amount)
+    
+    def add_rows(self, count):
+        """记录当前操作读取或写入的行数"""
+        if self.enabled and count:
+            self._add_to_active('rows', int(count))
+    
+    def add_bytes_read(self, count):
+        """记录当前操作从文件读取的字节数"""
+        if self.enabled and count:
+            self._add_to_active('bytes_read', int(count))
+    
+    def add_bytes_written(self, count):
+        """记录当前操作写入文件的字节数"""
+        if self.enabled and count:
+            self._add_to_active('bytes_written', int(count))
+    
+    def add_file_read(self, path):
+        """按文件大小记录当前操作读取的字节数"""
+        if self.enabled and os.path.exists(path):
+            self._add_to_active('bytes_read', os.path.getsize(path))
+    
+    def add_file_written(self, path):
+        """按文件大小记录当前操作写入的字节数"""
+        if self.enabled and os.path.exists(path):
+            self._add_to_active('bytes_written', os.path.getsize(path))
+    
+    def cache_hit(self, cache):
+        """记录一次缓存命中"""
+        if self.enabled:
+            with self._lock:
+                self._cache.setdefault(cache, [0, 0])[0] += 1
+    
+    def cache_miss(self, cache):
+        """记录一次缓存未命中"""
+        if self.enabled:
+            with self._lock:
+                self._cache.setdefault(cache, [0, 0])[1] += 1
+    
+    def record_error(self, error):
+        """记录当前操作中捕获的错误"""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        operation = stack[-1] if stack else None
+        with self._lock:
+            if operation is not None:
+                self._stats(operation).errors += 1
+            self._errors.append({
+                '时间': datetime.now(),
+                '操作': operation or '',
+                '错误': f"{type(error).__name__}: {error}"
+            })
+    
+    def observe(self, operation, seconds):
+        """记录一次操作的耗时"""
+        with self._lock:
+            self._stats(operation).observe(seconds)
+    
+    def timed(self, name=None, rows=None):
+        """
+        装饰器：统计被装饰函数的调用次数和耗时
+        
+        生成器函数按整个迭代过程计时（含调用方处理每块的时间），产出的bytes计入写入字节数。
+        
+        Args:
+            name (str): 操作名称，默认为函数名
+            rows (callable): 从返回值计算涉及行数的函数，例如len
+        """
+        def decorator(func):
+            operation = name or func.__name__
+            
+            if inspect.isgeneratorfunction(func):
+                # 生成器在两次产出之间会把控制权交还调用方，不放入调用栈，字节数直接计入本操作
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        yield from func(*args, **kwargs)
+                        return
+                    start = time.perf_counter()
+                    written = 0
+                    try:
+                        for item in func(*args, **kwargs):
+                            if isinstance(item, bytes):
+                                written += len(item)
+                            yield item
+                    finally:
+                        with self._lock:
+                            stats = self._stats(operation)
+                            stats.bytes_written += written
+                            stats.observe(time.perf_counter() - start)
+                return generator_wrapper
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                stack = self._stack()
+                stack.append(operation)
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                    if rows is not None and result is not None:
+                        self.add_rows(rows(result))
+                    return result
+                except Exception as e:
+                    self.record_error(e)
+                    raise
+                finally:
+                    stack.pop()
+                    self.observe(operation, time.perf_counter() - start)
+            return wrapper
+        return decorator
+    
+    def snapshot(self):
+        """
+        当前统计数据的副本
+        
+        Returns:
+            dict: operations（操作名到指标字典）、cache（缓存名到 hits、misses）、errors（最近的错误）、started_at
+        """
+        with self._lock:
+            operations = {
+                operation: {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'total_seconds': stats.total_seconds,
+                    'max_seconds': stats.max_seconds,
+                    'rows': stats.rows,
+                    'bytes_read': stats.bytes_read,
+                    'bytes_written': stats.bytes_written,
+                    'buckets': list(stats.buckets),
+                }
+                for operation, stats in self._operations.items()
+            }
+            cache = {name: {'hits': hits, 'misses': misses} for name, (hits, misses) in self._cache.items()}
+            return {
+                'operations': operations,
+                'cache': cache,
+                'errors': list(self._errors),
+                'started_at': self.started_at,
+            }
+    
+    def to_prometheus(self):
+        """
+        按Prometheus文本格式输出全部指标
+        
+        Returns:
+            str: 指标文本
+        """
+        data = self.snapshot()
+        operations = sorted(data['operations'].items())
+        lines = []
+        
+        def header(metric, metric_type, help_text):
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {metric_type}")
+        
+        header('operation_duration_seconds', 'histogram', 'DataManager operation wall time.')
+        for operation, stats in operations:
+            label = f'operation="{operation}"'
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                lines.append(f'{METRIC_PREFIX}_operation_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_operation_duration_seconds_bucket{{{label},le="+Inf"}} {stats["count"]}')
+            lines.append(f'{METRIC_PREFIX}_operation_duration_seconds_sum{{{label}}} {stats["total_seconds"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_operation_duration_seconds_count{{{label}}} {stats["count"]}')
+        
+        counters = (
+            ('operation_errors_total', 'errors', 'Errors caught inside DataManager operations.'),
+            ('operation_rows_total', 'rows', 'Rows read or written by DataManager operations.'),
+            ('operation_read_bytes_total', 'bytes_read', 'Bytes read from data files.'),
+            ('operation_written_bytes_total', 'bytes_written', 'Bytes written to data files or exports.'),
+        )
+        for metric, field, help_text in counters:
+            header(metric, 'counter', help_text)
+            for operation, stats in operations:
+                lines.append(f'{METRIC_PREFIX}_{metric}{{operation="{operation}"}} {stats[field]}')
+        
+        header('cache_requests_total', 'counter', 'Cache lookups by result.')
+        for cache, counts in sorted(data['cache'].items()):
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{cache}",result="hit"}} {counts["hits"]}')
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{cache}",result="miss"}} {counts["misses"]}')
+        
+        return '\n'.join(lines) + '\n'
+    
+    def write_prometheus(self, path):
+        """
+        把指标写入文件，供node_exporter的textfile采集器读取
+        
+        先写临时文件再替换，采集器不会读到写了一半的文件。
+        
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            print(f"写入指标文件时出错: {e}")
+            return False
+    
+    def serve_prometheus(self, port, host='127.0.0.1'):
+        """
+        在后台线程启动HTTP服务，GET /metrics 返回指标文本
+        
+        Returns:
+            ThreadingHTTPServer: 服务对象，调用shutdown()停止，启动失败时返回None
+        """
+        registry = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                # 不在控制台输出每次采集的访问日志
+                pass
+        
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except Exception as e:
+            print(f"启动指标服务时出错: {e}")
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+# 进程内共享的指标对象
+metrics = Metrics(enabled=os.environ.get(METRICS_ENV) == '1')
+
+# 便于直接使用的装饰器
+timed = metrics.timed
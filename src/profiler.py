@@ -0,0 +1,164 @@
+# 页面运行耗时分析模块
+
+import io
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    from pyinstrument import Profiler as InstrumentProfiler
+except ImportError:
+    # 未安装pyinstrument时只能使用cProfile
+    InstrumentProfiler = None
+
+# 环境变量或URL参数（?profile=...）开启耗时分析，取值见PROFILE_MODES
+PROFILE_ENV = 'MYACCOUNT_PROFILE'
+PROFILE_QUERY_PARAM = 'profile'
+
+# 可选的分析方式：timing只记录分段耗时，cprofile、pyinstrument另外对页面函数做函数级分析
+PROFILE_MODES = ('timing', 'cprofile', 'pyinstrument')
+
+# 等同于timing的取值
+PROFILE_ON_VALUES = ('1', 'true', 'on', 'yes')
+
+# cProfile结果显示的函数数
+CPROFILE_TOP = 30
+
+_local = threading.local()
+
+
+def resolve_mode(*values):
+    """
+    从环境变量、URL参数等取值中确定分析方式，取第一个有效的
+    
+    Returns:
+        str: PROFILE_MODES之一，都未开启时返回None
+    """
+    for value in values:
+        if not value:
+            continue
+        value = str(value).strip().lower()
+        if value in PROFILE_ON_VALUES:
+            return 'timing'
+        if value in PROFILE_MODES:
+            return value
+    return None
+
+
+class RerunProfiler:
+    """
+    记录一次页面运行中各部分的耗时
+    
+    section() 记录一段代码的耗时，可以嵌套；checkpoint() 记录从上一个检查点（或所在分段开始）到现在的耗时，
+    用于在不改动代码结构的情况下把一个页面函数切成几段。
+    """
+    
+    def __init__(self, mode='timing'):
+        """
+        Args:
+            mode (str): 分析方式，见PROFILE_MODES
+        """
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.rows = []
+        self.profile_text = None
+        self._open = []
+        self._lap = self.started
+    
+    def _add_row(self, name, seconds, depth):
+        self.rows.append({'name': name, 'seconds': seconds, 'depth': depth})
+    
+    @contextmanager
+    def section(self, name, profile=False):
+        """
+        记录一段代码的耗时
+        
+        Args:
+            name (str): 分段名称
+            profile (bool): 按分析方式对这段代码做函数级分析，一次运行中只分析第一个这样的分段
+        """
+        row = {'name': name, 'seconds': 0.0, 'depth': len(self._open)}
+        self.rows.append(row)
+        frame = {'row': row, 'lap': time.perf_counter()}
+        self._open.append(frame)
+        
+        profiler = None
+        if profile and self.profile_text is None:
+            profiler = self._start_profiler()
+        
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            row['seconds'] = time.perf_counter() - start
+            self._open.pop()
+            if profiler is not None:
+                self.profile_text = self._stop_profiler(profiler)
+    
+    def checkpoint(self, label):
+        """记录所在分段中从上一个检查点到现在的耗时"""
+        now = time.perf_counter()
+        if self._open:
+            frame = self._open[-1]
+            self._add_row(label, now - frame['lap'], len(self._open))
+            frame['lap'] = now
+        else:
+            self._add_row(label, now - self._lap, 0)
+            self._lap = now
+    
+    def total_seconds(self):
+        """从创建到现在的总耗时"""
+        return time.perf_counter() - self.started
+    
+    def _start_profiler(self):
+        """启动函数级分析，所选方式不可用时返回None"""
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.mode == 'pyinstrument':
+            if InstrumentProfiler is None:
+                self.profile_text = "未安装pyinstrument，请运行 pip install pyinstrument 或改用 ?profile=cprofile"
+                return None
+            profiler = InstrumentProfiler()
+            profiler.start()
+            return profiler
+        return None
+    
+    def _stop_profiler(self, profiler):
+        """停止函数级分析并返回文本结果"""
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.strip_dirs().sort_stats('cumulative').print_stats(CPROFILE_TOP)
+            return output.getvalue()
+        profiler.stop()
+        return profiler.output_text(unicode=True, color=False)
+
+
+def activate(profiler):
+    """把分析器设为当前线程（即当前会话的这次运行）使用的分析器，传入None时关闭"""
+    _local.profiler = profiler
+
+
+def current():
+    """当前线程使用的分析器，未开启时返回None"""
+    return getattr(_local, 'profiler', None)
+
+
+def section(name, profile=False):
+    """在当前分析器上记录一段代码的耗时，未开启分析时什么也不做"""
+    profiler = current()
+    if profiler is None:
+        return nullcontext()
+    return profiler.section(name, profile=profile)
+
+
+def checkpoint(label):
+    """在当前分析器上记录检查点，未开启分析时什么也不做"""
+    profiler = current()
+    if profiler is not None:
+        profiler.checkpoint(label)
@@ -0,0 +1,1221 @@
+# 存储后端模块
+
+
+
+import pandas as pd
+import os
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from .metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # 未安装pyarrow时不使用Parquet旁路文件，直接解析Excel
+    pa = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows上没有fcntl，改用msvcrt锁定文件
+    fcntl = None
+    import msvcrt
+
+# 账本字段
+COLUMNS = ['ID', '类型', '金额', '分类', '日期', '备注', '创建时间']
+
+# 记录类型
+RECORD_TYPES = ('收入', '支出')
+
+# Excel工作表名
+SHEET_NAME = '记账记录'
+
+# 保存ID分配进度的隐藏工作表，删除最大ID后也不会重复使用
+META_SHEET_NAME = '元数据'
+
+# SQLite中日期按固定格式存为文本，保证字符串顺序与时间顺序一致
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# 追加日志累计到多少条时合并进Excel文件
+JOURNAL_FOLD_ROWS = 500
+
+# Parquet旁路文件中记录对应Excel文件签名的元数据键
+SIDECAR_SOURCE_KEY = b'myaccount.source_signature'
+SIDECAR_NEXT_ID_KEY = b'myaccount.next_id'
+
+# 日期类字段，写入日志时序列化为ISO格式文本
+DATE_COLUMNS = ('日期', '创建时间')
+
+# 文本列，整列为空时pd.read_excel会读成全为NaN的float64
+TEXT_COLUMNS = ('类型', '分类', '备注')
+
+# Windows上等待其他进程释放文件锁时的重试间隔（秒）
+LOCK_RETRY_INTERVAL = 0.05
+
+# 分区存储的清单文件名，保存在分区目录中
+MANIFEST_FILENAME = 'manifest.json'
+
+# 可选的分区粒度及对应的pandas周期频率，分区键为周期的文本形式（例如 2024-08、2024）
+PARTITION_FREQS = {'month': 'M', 'year': 'Y'}
+
+# 并行读取分区的方式：process用进程池，解析Excel时不受GIL限制；thread用线程池，启动开销小
+LOAD_EXECUTORS = ('process', 'thread')
+
+
+def file_signature(path):
+    """文件的修改时间与大小，文件不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def fsync_directory(path):
+    """把目录项的变化（新建、改名）落盘，只在POSIX系统上需要"""
+    if os.name != 'posix':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    """
+    先写同目录下的临时文件并落盘，再替换目标文件，写到一半崩溃也不会损坏原文件
+    
+    Args:
+        path (str): 目标文件路径
+        write (callable): 接收临时文件路径并把内容写进去的函数
+    """
+    # 保留扩展名，pandas和openpyxl按扩展名选择写入格式
+    root, ext = os.path.splitext(path)
+    temp_path = f"{root}.tmp{ext}"
+    try:
+        write(temp_path)
+        metrics.add_file_written(temp_path)
+        with open(temp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    fsync_directory(os.path.dirname(path))
+
+
+class FileLock:
+    """
+    可重入的跨线程、跨进程锁
+    
+    同一进程内的线程之间用RLock互斥，进程之间锁住锁文件（fcntl.flock，Windows上为msvcrt.locking）。
+    锁文件中同时保存数据版本号，写入方每次修改数据后加一，用于检测并发修改。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+    
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+                self._file = os.fdopen(fd, 'r+b')
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._lock_windows()
+            except Exception:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+    
+    def _lock_windows(self):
+        """
+        用msvcrt锁定锁文件，直到拿到锁为止
+        
+        LK_LOCK重试约10秒后就抛出OSError，合并日志等写入持锁可能更久，改为反复尝试非阻塞的LK_NBLCK。
+        """
+        while True:
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(LOCK_RETRY_INTERVAL)
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+    
+    def read_version(self):
+        """读取锁文件中的版本号，调用方需已持有锁"""
+        self._file.seek(0)
+        content = self._file.read().strip()
+        return int(content) if content else 0
+    
+    def write_version(self, version):
+        """写入版本号，调用方需已持有锁"""
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(int(version)).encode())
+        self._file.flush()
+
+
+def empty_frame():
+    """创建只有表头的空记录表"""
+    return pd.DataFrame(columns=COLUMNS)
+
+
+def invalid_records(df):
+    """
+    找出缺少ID或金额、金额不是数字或类型不是收入/支出的记录
+    
+    手动编辑过的数据文件中可能有这样的行，读取和统计时跳过它们，其余记录照常使用。
+    
+    Returns:
+        pd.Series: 每条记录是否无效，索引与输入一致
+    """
+    invalid = pd.to_numeric(df['金额'], errors='coerce').isna() | ~df['类型'].isin(RECORD_TYPES)
+    if 'ID' in df.columns:
+        invalid |= pd.to_numeric(df['ID'], errors='coerce').isna()
+    return invalid
+
+
+def format_excel_sheet(worksheet):
+    """格式化Excel工作表"""
+    # 设置标题行样式
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="2E86AB", end_color="2E86AB", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    # 设置边框
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    
+    # 应用标题行样式
+    for cell in worksheet[1]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    # 设置列宽
+    column_widths = {
+        'A': 8,   # ID
+        'B': 10,  # 类型
+        'C': 12,  # 金额
+        'D': 15,  # 分类
+        'E': 20,  # 日期
+        'F': 30,  # 备注
+        'G': 20   # 创建时间
+    }
+    
+    for col, width in column_widths.items():
+        worksheet.column_dimensions[col].width = width
+    
+    # 冻结首行
+    worksheet.freeze_panes = 'A2'
+
+
+def write_excel(df, path, next_id=None):
+    """
+    把记录整体写成格式化的Excel文件
+    
+    Args:
+        df (pd.DataFrame): 记录
+        path (str): 输出文件路径
+        next_id (int): 下一个可分配的ID，提供时写入隐藏的元数据工作表
+    """
+    def write(temp_path):
+        with pd.ExcelWriter(temp_path, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name=SHEET_NAME, index=False)
+            format_excel_sheet(writer.sheets[SHEET_NAME])
+            
+            if next_id is not None:
+                meta = pd.DataFrame({'键': ['next_id'], '值': [int(next_id)]})
+                meta.to_excel(writer, sheet_name=META_SHEET_NAME, index=False)
+                writer.sheets[META_SHEET_NAME].sheet_state = 'hidden'
+    
+    atomic_write(path, write)
+
+
+def journal_value(column, value):
+    """把字段值转换为可写入JSON日志的形式"""
+    if column in DATE_COLUMNS:
+        return pd.Timestamp(value).isoformat()
+    if column == '金额':
+        return float(value)
+    return value
+
+
+class StorageBackend:
+    """
+    存储后端接口
+    
+    DataManager只通过这些方法读写数据，子类负责具体的存储格式。
+    新增记录传入的是不含ID的DataFrame，ID由后端分配，只增不减，删除后也不会被重复使用。
+    
+    后端方法本身不加锁，调用方在lock内完成“读取-校验-写入”并在写入后调用bump_version。
+    """
+    
+    # 后端名称，用于构造参数选择
+    name = None
+    
+    # 后端默认文件名
+    default_filename = None
+    
+    def __init__(self, data_dir, filename=None):
+        self.data_dir = data_dir
+        self.filename = filename or self.default_filename
+        self.file_path = os.path.join(data_dir, self.filename)
+        
+        # 所有会话和进程共用同名的锁文件
+        self.lock = FileLock(os.path.join(data_dir, os.path.splitext(self.filename)[0] + '.lock'))
+    
+    def version(self):
+        """数据版本号，每次写入后加一"""
+        with self.lock:
+            return self.lock.read_version()
+    
+    def bump_version(self):
+        """写入完成后把版本号加一，返回新的版本号"""
+        with self.lock:
+            version = self.lock.read_version() + 1
+            self.lock.write_version(version)
+            return version
+    
+    def read_all(self):
+        """读取全部记录，按写入顺序返回DataFrame"""
+        raise NotImplementedError
+    
+    def append(self, df):
+        """
+        追加一批记录，整批只写入一次
+        
+        Args:
+            df (pd.DataFrame): 已校验、不含ID列的记录
+        
+        Returns:
+            list: 按顺序分配给这些记录的ID
+        """
+        raise NotImplementedError
+    
+    def delete(self, ids):
+        """
+        按ID删除记录，其余记录的ID保持不变
+        
+        Args:
+            ids (list): 要删除的记录ID，调用方已确认存在
+        """
+        raise NotImplementedError
+    
+    def update(self, record_id, changes):
+        """
+        按ID修改一条记录
+        
+        Args:
+            record_id (int): 记录ID，调用方已确认存在
+            changes (dict): 要修改的字段及新值
+        """
+        raise NotImplementedError
+    
+    def update_many(self, updates):
+        """
+        批量修改记录，默认逐条调用update
+        
+        Args:
+            updates (list): (记录ID, 要修改的字段及新值) 的列表，调用方已确认ID存在
+        """
+        for record_id, changes in updates:
+            self.update(record_id, changes)
+    
+    def clear(self):
+        """清空全部记录，ID分配进度保留"""
+        raise NotImplementedError
+    
+    def flush(self):
+        """把尚未落盘的缓冲写入存储，默认无需处理"""
+        return True
+    
+    def statistics(self, start_date=None, end_date=None):
+        """
+        在存储中直接统计时间范围内的收支
+        
+        不支持索引查询的后端返回None，由DataManager用内存中的记录计算。
+        
+        Returns:
+            dict: total_income、total_expense（以分为单位的整数）、record_count
+        """
+        return None
+    
+    def signature(self):
+        """
+        数据文件的修改时间与大小
+        
+        签名不变说明数据未被改动，DataManager据此判断内存缓存是否仍然有效。
+        """
+        return tuple(file_signature(path) for path in self._data_paths())
+    
+    def _data_paths(self):
+        """保存数据的全部文件"""
+        return [self.file_path]
+
+
+class ExcelBackend(StorageBackend):
+    """
+    Excel文件存储
+    
+    新增、删除、修改和清空都先追加到同名的.journal日志文件并立即落盘，攒够fold_rows条后再合并进Excel：
+    只有新增时在工作表末尾追加行，有其他改动时整体重写一次。合并时先写临时文件再替换，
+    写到一半崩溃也不会损坏Excel。读取时把日志重放到Excel记录上，重放可重复执行，
+    替换Excel后、删除日志前崩溃也不会重复记录。
+    
+    安装了pyarrow时，Excel中的记录还会镜像到同名的.parquet旁路文件，旁路文件记录了
+    生成时Excel文件的签名，签名一致时直接读取旁路文件，Excel在外部被修改后自动重建。
+    """
+    
+    name = 'excel'
+    default_filename = 'account_records.xlsx'
+    
+    def __init__(self, data_dir, filename=None, fold_rows=JOURNAL_FOLD_ROWS):
+        super().__init__(data_dir, filename)
+        
+        # 改动先追加到日志文件，攒够一批后再合并进Excel
+        self.journal_path = os.path.join(data_dir, os.path.splitext(self.filename)[0] + '.journal')
+        self.fold_rows = fold_rows
+        
+        # Excel记录的列式镜像，冷启动时代替解析Excel
+        if pa is not None:
+            self.sidecar_path = os.path.join(data_dir, os.path.splitext(self.filename)[0] + '.parquet')
+        else:
+            self.sidecar_path = None
+        
+        # ID分配状态，文件签名变化时重新计算
+        self._next_id = None
+        self._journal_rows = 0
+        self._id_signature = None
+        
+        # 最近一次读取的Excel元数据中记录的下一个ID
+        self._workbook_next_id = None
+        
+        self._init_excel_file()
+    
+    def _init_excel_file(self):
+        """初始化Excel文件，如果不存在则创建"""
+        if not os.path.exists(self.file_path):
+            write_excel(empty_frame(), self.file_path, next_id=1)
+    
+    def read_all(self):
+        if not os.path.exists(self.file_path):
+            return empty_frame()
+        
+        # 把日志中尚未合并的改动重放到Excel记录上
+        adds_df, ops = self._read_journal()
+        return self._apply_journal(self._read_workbook(), adds_df, ops)
+    
+    def append(self, df):
+        self._init_excel_file()
+        
+        # 一次分配整批ID，写入过程中不再重新检查文件
+        first_id = self._allocate_id()
+        ids = list(range(first_id, first_id + len(df)))
+        
+        journal_df = df.copy()
+        journal_df.insert(0, 'ID', ids)
+        self._append_records(journal_df)
+        return ids
+    
+    def _append_records(self, df):
+        """把已带ID的一批记录追加到日志，分区存储由它写入统一分配了ID的记录"""
+        self._init_excel_file()
+        next_id = max(self._allocate_id(), int(df['ID'].max()) + 1)
+        
+        # 整批记录序列化后只在日志末尾追加一次，耗时与账本大小无关
+        lines = df[COLUMNS].to_json(
+            orient='records', lines=True, force_ascii=False,
+            date_format='iso', date_unit='us'
+        )
+        self._next_id = next_id
+        self._append_journal(lines.rstrip('\n').split('\n'))
+    
+    def delete(self, ids):
+        # 只追加删除标记，合并进Excel前由读取时的重放过滤掉
+        self._allocate_id()
+        self._append_journal([
+            json.dumps({'op': 'delete', 'ID': int(record_id)}) for record_id in ids
+        ])
+    
+    def update(self, record_id, changes):
+        self.update_many([(record_id, changes)])
+    
+    def update_many(self, updates):
+        # 所有修改标记一次追加、一次fsync
+        self._allocate_id()
+        self._append_journal([
+            json.dumps({
+                'op': 'update',
+                'ID': int(record_id),
+                'changes': {column: journal_value(column, value) for column, value in changes.items()}
+            }, ensure_ascii=False)
+            for record_id, changes in updates
+        ])
+    
+    def clear(self):
+        # 清空标记带上下一个ID，被清掉的新增记录的ID也不会重复使用
+        entry = {'op': 'clear', 'next_id': self._allocate_id()}
+        self._append_journal([json.dumps(entry)])
+        return True
+    
+    def flush(self):
+        """把追加日志中的改动合并进Excel文件"""
+        adds_df, ops = self._read_journal()
+        
+        if ops:
+            # 有删除、修改或清空时整体重写一次
+            self._write_all(self._apply_journal(self._read_workbook(), adds_df, ops))
+        elif not adds_df.empty:
+            # 只有新增时在工作表末尾追加
+            workbook_df = self._read_workbook()
+            next_id = self._allocate_id()
+            
+            # 上次合并后、删除日志前崩溃时，日志中可能有已写入Excel的记录
+            adds_df = adds_df[~adds_df['ID'].isin(workbook_df['ID'])]
+            
+            workbook = openpyxl.load_workbook(self.file_path)
+            worksheet = workbook[SHEET_NAME]
+            for row in adds_df.itertuples(index=False):
+                worksheet.append([
+                    cell.to_pydatetime() if isinstance(cell, pd.Timestamp) else cell
+                    for cell in row
+                ])
+            self._save_next_id(workbook, next_id)
+            atomic_write(self.file_path, workbook.save)
+            
+            self._write_sidecar(pd.concat([workbook_df, adds_df], ignore_index=True), next_id)
+        
+        self._remove_journal()
+        return True
+    
+    def _data_paths(self):
+        return [self.file_path, self.journal_path]
+    
+    def _append_journal(self, lines):
+        """在日志末尾追加若干行并落盘，攒够一批后合并进Excel"""
+        created = not os.path.exists(self.journal_path)
+        if not created:
+            self._trim_torn_tail()
+        text = '\n'.join(lines) + '\n'
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            fsync_directory(self.data_dir)
+        if metrics.enabled:
+            metrics.add_bytes_written(len(text.encode('utf-8')))
+        
+        self._journal_rows += len(lines)
+        self._id_signature = self.signature()
+        
+        if self._journal_rows >= self.fold_rows:
+            self.flush()
+    
+    def _trim_torn_tail(self):
+        """
+        截掉日志末尾写入中断留下的残缺行
+        
+        残缺行没有换行符，不截掉的话下一次追加的内容会接在它后面，
+        读取时整行被当作残缺行跳过，已经落盘的新记录就丢了。
+        """
+        with open(self.journal_path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+            
+            # 从末尾往前按块查找最后一个换行符，残缺行通常很短
+            keep = 0
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    keep = start + newline + 1
+                    break
+                position = start
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _allocate_id(self):
+        """分配下一个ID，文件未被外部改动时无需重新读取"""
+        if self._next_id is None or self._id_signature != self.signature():
+            workbook_df = self._read_workbook()
+            adds_df, ops = self._read_journal()
+            
+            # 取元数据、Excel和日志（含删除标记）中最大的ID，保证ID不会被重复使用
+            candidates = [self._workbook_next_id or 1]
+            candidates.extend(int(record_id) + 1 for record_id in workbook_df['ID'].dropna())
+            candidates.extend(int(record_id) + 1 for record_id in adds_df['ID'])
+            candidates.extend(op['ID'] + 1 if 'ID' in op else op['next_id'] for op in ops)
+            
+            self._next_id = max(candidates)
+            self._journal_rows = len(adds_df) + len(ops)
+            self._id_signature = self.signature()
+        
+        return self._next_id
+    
+    def _read_workbook(self):
+        """读取Excel中的记录，Parquet旁路文件与Excel一致时直接读取旁路文件"""
+        if self.sidecar_path and os.path.exists(self.sidecar_path):
+            try:
+                table = pq.read_table(self.sidecar_path, memory_map=True)
+                metadata = table.schema.metadata or {}
+                if metadata.get(SIDECAR_SOURCE_KEY) == self._workbook_signature_key():
+                    metrics.add_file_read(self.sidecar_path)
+                    next_id = metadata.get(SIDECAR_NEXT_ID_KEY)
+                    self._workbook_next_id = int(next_id) if next_id else None
+                    return table.to_pandas()
+            except Exception as e:
+                print(f"读取Parquet旁路文件时出错: {e}")
+        
+        # 旁路文件不存在或已过期，解析Excel后重建
+        sheets = pd.read_excel(self.file_path, sheet_name=None)
+        metrics.add_file_read(self.file_path)
+        df = sheets[SHEET_NAME]
+        
+        meta = sheets.get(META_SHEET_NAME)
+        if meta is not None and not meta.empty:
+            values = dict(zip(meta['键'], meta['值']))
+            self._workbook_next_id = int(values['next_id']) if 'next_id' in values else None
+        else:
+            self._workbook_next_id = None
+        
+        self._write_sidecar(df, self._workbook_next_id)
+        return df
+    
+    def _save_next_id(self, workbook, next_id):
+        """把下一个ID写入工作簿的隐藏元数据工作表"""
+        if META_SHEET_NAME in workbook.sheetnames:
+            worksheet = workbook[META_SHEET_NAME]
+        else:
+            worksheet = workbook.create_sheet(META_SHEET_NAME)
+            worksheet.sheet_state = 'hidden'
+            worksheet.append(['键', '值'])
+        worksheet['A2'] = 'next_id'
+        worksheet['B2'] = int(next_id)
+        self._workbook_next_id = int(next_id)
+    
+    def _write_sidecar(self, df, next_id=None):
+        """把与当前Excel文件内容一致的记录写入Parquet旁路文件"""
+        if not self.sidecar_path:
+            return
+        
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[SIDECAR_SOURCE_KEY] = self._workbook_signature_key()
+            if next_id is not None:
+                metadata[SIDECAR_NEXT_ID_KEY] = str(int(next_id)).encode()
+            
+            # 先写临时文件再替换，读取方不会看到写了一半的文件
+            table = table.replace_schema_metadata(metadata)
+            atomic_write(self.sidecar_path, lambda temp_path: pq.write_table(table, temp_path))
+        except Exception as e:
+            print(f"写入Parquet旁路文件时出错: {e}")
+    
+    def _workbook_signature_key(self):
+        """当前Excel文件签名的字节表示，存入旁路文件元数据"""
+        return json.dumps(file_signature(self.file_path)).encode()
+    
+    def _read_journal(self):
+        """
+        读取追加日志中尚未合并的改动
+        
+        Returns:
+            tuple: (新增记录的DataFrame, 按顺序排列的操作列表，有清空时第一项为最后一次清空)
+        """
+        records = []
+        ops = []
+        if os.path.exists(self.journal_path):
+            metrics.add_file_read(self.journal_path)
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 跳过写入中断留下的残缺行
+                        continue
+                    if entry.get('op') == 'clear':
+                        # 清空之前的改动不再需要重放
+                        records = []
+                        ops = [entry]
+                    elif 'op' in entry:
+                        ops.append(entry)
+                    else:
+                        records.append(entry)
+        
+        df = pd.DataFrame(records, columns=COLUMNS)
+        df['日期'] = pd.to_datetime(df['日期'], format='ISO8601')
+        df['创建时间'] = pd.to_datetime(df['创建时间'], format='ISO8601')
+        return df, ops
+    
+    def _apply_journal(self, df, adds_df, ops):
+        """把日志中的清空、新增、修改和删除依次应用到记录上，重复应用结果不变"""
+        if ops and ops[0]['op'] == 'clear':
+            df = empty_frame()
+            ops = ops[1:]
+        if not adds_df.empty:
+            # 合并进Excel后、删除日志前崩溃时，日志中的记录可能已经在Excel里
+            adds_df = adds_df[~adds_df['ID'].isin(df['ID'])]
+            df = pd.concat([df, adds_df], ignore_index=True) if not df.empty else adds_df
+        if not ops:
+            return df
+        
+        df = df.copy()
+        df['金额'] = df['金额'].astype(float)
+        deleted = set()
+        # 同一记录同一字段的多次修改只保留最后一次，再按字段整列写入
+        latest = {}
+        for op in ops:
+            if op['op'] == 'delete':
+                deleted.add(op['ID'])
+            elif op['op'] == 'update':
+                for column, value in op['changes'].items():
+                    latest.setdefault(column, {})[op['ID']] = value
+        
+        positions = pd.Index(df['ID'])
+        for column, values in latest.items():
+            indexer = positions.get_indexer(list(values))
+            found = indexer >= 0
+            new_values = pd.Series(list(values.values()), dtype=object)[found]
+            if column in DATE_COLUMNS:
+                new_values = pd.to_datetime(new_values, format='ISO8601')
+            elif column == '金额':
+                new_values = new_values.astype(float)
+            elif column in TEXT_COLUMNS and df[column].dtype != object:
+                # 整列为空的文本列读出来是float64，写入字符串前先换成object
+                df[column] = df[column].astype(object)
+            df.iloc[indexer[found], df.columns.get_loc(column)] = new_values.to_numpy()
+        
+        if deleted:
+            df = df[~df['ID'].isin(deleted)].reset_index(drop=True)
+        return df
+    
+    def _write_all(self, df):
+        """用给定数据整体重写Excel文件，并清空追加日志"""
+        next_id = self._allocate_id()
+        write_excel(df, self.file_path, next_id=next_id)
+        self._workbook_next_id = next_id
+        self._write_sidecar(df, next_id)
+        self._remove_journal()
+    
+    def _remove_journal(self):
+        """Excel已包含日志中的全部改动后删除日志"""
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+            fsync_directory(self.data_dir)
+        self._journal_rows = 0
+        self._id_signature = self.signature()
+
+
+def load_partition(partition_dir, filename, fold_rows=JOURNAL_FOLD_ROWS):
+    """读取一个分区的全部记录，供进程池中的工作进程调用"""
+    return ExcelBackend(partition_dir, filename, fold_rows=fold_rows).read_all()
+
+
+class PartitionedExcelBackend(StorageBackend):
+    """
+    按月或按年分区的Excel存储
+    
+    每个分区是分区目录下的一个Excel文件（例如 2024-08.xlsx），各自带追加日志和Parquet旁路文件，
+    新增、修改和删除只涉及记录日期所在的分区，不再解析和重写全部历史记录。
+    分区目录中的manifest.json保存分区粒度、下一个ID和已有的分区，ID在所有分区间统一分配。
+    
+    解析过的分区按文件签名缓存，某个分区被改动后只重新读取这一个分区；
+    按时间范围统计时只读取与范围重叠的分区。需要重新读取的分区不止一个时（例如冷启动），
+    用进程池或线程池同时读取。
+    """
+    
+    name = 'partitioned'
+    default_filename = 'account_records'
+    
+    def __init__(self, data_dir, filename=None, fold_rows=JOURNAL_FOLD_ROWS, partition_by='month',
+                 load_workers=None, load_executor='process'):
+        """
+        Args:
+            data_dir (str): 数据目录
+            filename (str): 分区目录名
+            fold_rows (int): 每个分区的追加日志达到多少条时合并进Excel
+            partition_by (str): 新建时的分区粒度，month 或 year；已有清单时以清单为准
+            load_workers (int): 并行读取分区的进程或线程数，默认为CPU核数，为1时逐个读取
+            load_executor (str): 并行读取的方式，process 或 thread
+        """
+        if partition_by not in PARTITION_FREQS:
+            raise ValueError(f"不支持的分区粒度: {partition_by}")
+        if load_executor not in LOAD_EXECUTORS:
+            raise ValueError(f"不支持的并行读取方式: {load_executor}")
+        
+        super().__init__(data_dir, filename)
+        self.partition_dir = self.file_path
+        self.file_path = os.path.join(self.partition_dir, MANIFEST_FILENAME)
+        self.fold_rows = fold_rows
+        
+        # 各分区的Excel存储，以及按分区文件签名缓存的已解析记录
+        self._partitions = {}
+        self._frames = {}
+        
+        # 并行读取分区的进程池或线程池，第一次需要时创建，之后一直复用
+        self.load_workers = load_workers or os.cpu_count() or 1
+        self.load_executor = load_executor
+        self._pool = None
+        
+        # 最近一次读取的清单及其文件签名，其他进程改写清单后重新读取
+        self._manifest = None
+        self._manifest_signature = None
+        
+        os.makedirs(self.partition_dir, exist_ok=True)
+        with self.lock:
+            if not os.path.exists(self.file_path):
+                self._save_manifest({'partition_by': partition_by, 'next_id': 1, 'partitions': []})
+        self.partition_by = self._read_manifest()['partition_by']
+    
+    def _read_manifest(self):
+        """读取清单，文件未变化时直接返回上次读取的内容"""
+        signature = file_signature(self.file_path)
+        if self._manifest is None or signature != self._manifest_signature:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_signature = signature
+        return self._manifest
+    
+    def _save_manifest(self, manifest):
+        """整体替换清单文件"""
+        def write(temp_path):
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+        
+        atomic_write(self.file_path, write)
+        self._manifest = manifest
+        self._manifest_signature = file_signature(self.file_path)
+    
+    def partition_key(self, value):
+        """日期所在分区的键"""
+        return str(pd.Timestamp(value).to_period(PARTITION_FREQS[self.partition_by]))
+    
+    def partition_keys(self, start_date=None, end_date=None):
+        """
+        与时间范围重叠的分区键，按时间顺序排列
+        
+        同一粒度的分区键按文本排序即是时间顺序，直接比较键即可。
+        """
+        keys = self._read_manifest()['partitions']
+        if start_date is not None:
+            first = self.partition_key(start_date)
+            keys = [key for key in keys if key >= first]
+        if end_date is not None:
+            last = self.partition_key(end_date)
+            keys = [key for key in keys if key <= last]
+        return keys
+    
+    def _partition(self, key):
+        """分区对应的Excel存储"""
+        if key not in self._partitions:
+            partition = ExcelBackend(self.partition_dir, f"{key}.xlsx", fold_rows=self.fold_rows)
+            # 各分区共用分区存储的锁，版本号也只在这一个锁文件中维护
+            partition.lock = self.lock
+            self._partitions[key] = partition
+        return self._partitions[key]
+    
+    def _read_partition(self, key):
+        """读取一个分区的记录，分区文件未变化时直接返回缓存"""
+        return self._read_partitions([key])[0]
+    
+    def _read_partitions(self, keys):
+        """
+        读取多个分区的记录，分区文件未变化时直接使用缓存
+        
+        Returns:
+            list: 与keys顺序对应的记录DataFrame
+        """
+        stale = {}
+        for key in keys:
+            signature = self._partition(key).signature()
+            cached = self._frames.get(key)
+            if cached is None or cached[0] != signature:
+                stale[key] = signature
+        
+        loaded = None
+        if len(stale) > 1 and self.load_workers > 1:
+            loaded = self._load_parallel(list(stale))
+        for key, signature in stale.items():
+            df = loaded[key] if loaded is not None else self._partition(key).read_all()
+            self._frames[key] = (signature, df)
+        
+        return [self._frames[key][1] for key in keys]
+    
+    def _load_parallel(self, keys):
+        """
+        用进程池或线程池同时读取多个分区，调用方已持有锁，工作进程读取期间文件不会被改动
+        
+        Returns:
+            dict: 分区键到记录DataFrame的映射，并行读取失败时返回None，由调用方逐个读取
+        """
+        try:
+            if self._pool is None:
+                if self.load_executor == 'process':
+                    self._pool = ProcessPoolExecutor(max_workers=self.load_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix="partition-loader")
+            
+            if self.load_executor == 'process':
+                futures = {
+                    key: self._pool.submit(load_partition, self.partition_dir, f"{key}.xlsx", self.fold_rows)
+                    for key in keys
+                }
+            else:
+                futures = {key: self._pool.submit(self._partition(key).read_all) for key in keys}
+            return {key: future.result() for key, future in futures.items()}
+        
+        except Exception as e:
+            print(f"并行读取分区时出错，改为逐个读取: {e}")
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            return None
+    
+    def _add_partitions(self, keys, next_id=None):
+        """先在清单中登记新分区和ID分配进度再写入分区，写入中途崩溃最多空出几个ID"""
+        manifest = dict(self._read_manifest())
+        manifest['partitions'] = sorted(set(manifest['partitions']) | set(keys))
+        if next_id is not None:
+            manifest['next_id'] = next_id
+        if manifest != self._manifest:
+            self._save_manifest(manifest)
+    
+    def _locate(self, ids):
+        """
+        查找记录所在的分区
+        
+        Returns:
+            dict: 分区键到该分区中记录ID列表的映射
+        """
+        remaining = {int(record_id) for record_id in ids}
+        located = {}
+        for key in self.partition_keys():
+            if not remaining:
+                break
+            df = self._read_partition(key)
+            found = [int(record_id) for record_id in df['ID'][df['ID'].isin(remaining)]]
+            if found:
+                located[key] = found
+                remaining -= set(found)
+        return located
+    
+    def read_all(self):
+        frames = [df for df in self._read_partitions(self.partition_keys()) if not df.empty]
+        if not frames:
+            return empty_frame()
+        
+        # 按ID排列即是写入顺序；改日期跨分区移动时中途崩溃，记录可能同时留在两个分区，只保留一条
+        df = pd.concat(frames, ignore_index=True).sort_values('ID', kind='stable')
+        return df.drop_duplicates('ID', keep='last').reset_index(drop=True)
+    
+    def read_range(self, start_date=None, end_date=None):
+        """
+        只读取与时间范围重叠的分区，返回范围内的记录
+        
+        Args:
+            start_date (datetime): 开始时间（含）
+            end_date (datetime): 结束时间（含）
+        
+        Returns:
+            pd.DataFrame: 范围内的记录
+        """
+        frames = [df for df in self._read_partitions(self.partition_keys(start_date, end_date)) if not df.empty]
+        if not frames:
+            return empty_frame()
+        
+        df = pd.concat(frames, ignore_index=True)
+        mask = pd.Series(True, index=df.index)
+        if start_date is not None:
+            mask &= df['日期'] >= pd.Timestamp(start_date)
+        if end_date is not None:
+            mask &= df['日期'] <= pd.Timestamp(end_date)
+        return df[mask].reset_index(drop=True)
+    
+    def append(self, df):
+        first_id = self._read_manifest()['next_id']
+        ids = list(range(first_id, first_id + len(df)))
+        
+        records = df.copy()
+        records.insert(0, 'ID', ids)
+        keys = records['日期'].dt.to_period(PARTITION_FREQS[self.partition_by]).astype(str)
+        self._add_partitions(keys.unique(), next_id=first_id + len(df))
+        
+        # 每个涉及的分区只追加一次
+        for key, group in records.groupby(keys, sort=True):
+            self._partition(key)._append_records(group)
+        return ids
+    
+    def delete(self, ids):
+        for key, key_ids in self._locate(ids).items():
+            self._partition(key).delete(key_ids)
+    
+    def update(self, record_id, changes):
+        self.update_many([(record_id, changes)])
+    
+    def update_many(self, updates):
+        located = self._locate([record_id for record_id, _ in updates])
+        partition_of = {record_id: key for key, key_ids in located.items() for record_id in key_ids}
+        
+        in_place = {}
+        moves = []
+        for record_id, changes in updates:
+            key = partition_of[int(record_id)]
+            if '日期' in changes and self.partition_key(changes['日期']) != key:
+                moves.append((key, int(record_id), changes))
+            else:
+                in_place.setdefault(key, []).append((record_id, changes))
+        
+        # 同一分区的修改一次追加
+        for key, key_updates in in_place.items():
+            self._partition(key).update_many(key_updates)
+        
+        # 日期改到其他分区时，带着原ID写入新分区后再从原分区删除，中途崩溃也不会丢失记录
+        for key, record_id, changes in moves:
+            df = self._read_partition(key)
+            record = df[df['ID'] == record_id].copy()
+            for column, value in changes.items():
+                record[column] = value
+            new_key = self.partition_key(changes['日期'])
+            self._add_partitions([new_key])
+            self._partition(new_key)._append_records(record)
+            self._partition(key).delete([record_id])
+    
+    def clear(self):
+        # 先从清单中移除全部分区，再删除分区文件，ID分配进度保留在清单中
+        keys = self.partition_keys()
+        manifest = dict(self._read_manifest())
+        manifest['partitions'] = []
+        self._save_manifest(manifest)
+        
+        for key in keys:
+            partition = self._partition(key)
+            for path in (partition.file_path, partition.journal_path, partition.sidecar_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        fsync_directory(self.partition_dir)
+        self._partitions = {}
+        self._frames = {}
+        return True
+    
+    def flush(self):
+        for key in self.partition_keys():
+            self._partition(key).flush()
+        return True
+    
+    def statistics(self, start_date=None, end_date=None):
+        df = self.read_range(start_date, end_date)
+        df = df[~invalid_records(df)]
+        cents = (df['金额'].astype(float) * 100).round().astype('int64')
+        totals = cents.groupby(df['类型']).sum()
+        return {
+            'total_income': int(totals.get('收入', 0)),
+            'total_expense': int(totals.get('支出', 0)),
+            'record_count': len(df)
+        }
+    
+    def _data_paths(self):
+        paths = [self.file_path]
+        for key in self.partition_keys():
+            paths.extend(self._partition(key)._data_paths())
+        return paths
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    SQLite数据库存储
+    
+    记录保存在单表records中，日期、类型、分类建有索引，
+    新增、按ID删除修改和按时间统计都直接在数据库中完成，无需读取全部记录。
+    下一个ID保存在meta表中，删除最大ID的记录后也不会重复使用。
+    """
+    
+    name = 'sqlite'
+    default_filename = 'account_records.db'
+    
+    def __init__(self, data_dir, filename=None):
+        super().__init__(data_dir, filename)
+        self._init_database()
+    
+    def _connect(self):
+        """打开数据库连接，每次操作单独连接以便在多个线程中使用"""
+        return closing(sqlite3.connect(self.file_path))
+    
+    def _init_database(self):
+        """初始化数据表和索引"""
+        with self._connect() as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    "ID" INTEGER PRIMARY KEY,
+                    "类型" TEXT NOT NULL,
+                    "金额" REAL NOT NULL,
+                    "分类" TEXT,
+                    "日期" TEXT NOT NULL,
+                    "备注" TEXT,
+                    "创建时间" TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_date ON records ("日期")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_type ON records ("类型")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_category ON records ("分类")')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+    
+    @staticmethod
+    def _format_date(value):
+        """把日期转换为数据库中的文本格式"""
+        return pd.Timestamp(value).strftime(DATE_FORMAT)
+    
+    def read_all(self):
+        metrics.add_file_read(self.file_path)
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                'SELECT "ID", "类型", "金额", "分类", "日期", "备注", "创建时间" '
+                'FROM records ORDER BY "ID"',
+                conn
+            )
+        df['日期'] = pd.to_datetime(df['日期'], format=DATE_FORMAT)
+        df['创建时间'] = pd.to_datetime(df['创建时间'], format=DATE_FORMAT)
+        return df
+    
+    def append(self, df):
+        rows = pd.DataFrame({
+            '类型': df['类型'],
+            '金额': df['金额'].astype(float),
+            '分类': df['分类'],
+            '日期': df['日期'].dt.strftime(DATE_FORMAT),
+            '备注': df['备注'],
+            '创建时间': df['创建时间'].dt.strftime(DATE_FORMAT)
+        })
+        
+        with self._connect() as conn, conn:
+            # 加写锁后再分配ID，整批记录用连续的ID一次插入
+            conn.execute('BEGIN IMMEDIATE')
+            first_id = conn.execute(
+                'SELECT MAX(COALESCE((SELECT value FROM meta WHERE key = \'next_id\'), 1), '
+                'COALESCE((SELECT MAX("ID") FROM records), 0) + 1)'
+            ).fetchone()[0]
+            ids = list(range(first_id, first_id + len(rows)))
+            rows.insert(0, 'ID', ids)
+            
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (\'next_id\', ?)',
+                (first_id + len(rows),)
+            )
+            
+            conn.executemany(
+                'INSERT INTO records ("ID", "类型", "金额", "分类", "日期", "备注", "创建时间") '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows.itertuples(index=False, name=None)
+            )
+        return ids
+    
+    def delete(self, ids):
+        with self._connect() as conn, conn:
+            conn.executemany(
+                'DELETE FROM records WHERE "ID" = ?',
+                [(int(record_id),) for record_id in ids]
+            )
+    
+    def update(self, record_id, changes):
+        self.update_many([(record_id, changes)])
+    
+    def update_many(self, updates):
+        # 按修改的字段分组，每组一条UPDATE语句，全部在同一个事务中执行
+        groups = {}
+        for record_id, changes in updates:
+            columns = tuple(changes)
+            values = [
+                self._format_date(changes[column]) if column in DATE_COLUMNS else changes[column]
+                for column in columns
+            ]
+            groups.setdefault(columns, []).append(values + [int(record_id)])
+        
+        with self._connect() as conn, conn:
+            for columns, rows in groups.items():
+                assignments = ', '.join(f'"{column}" = ?' for column in columns)
+                conn.executemany(f'UPDATE records SET {assignments} WHERE "ID" = ?', rows)
+    
+    def clear(self):
+        with self._connect() as conn, conn:
+            conn.execute('DELETE FROM records')
+        return True
+    
+    def statistics(self, start_date=None, end_date=None):
+        # 与读取时一样跳过没有金额或类型无效的记录
+        conditions = ['"金额" IS NOT NULL', '"类型" IN (?, ?)']
+        params = list(RECORD_TYPES)
+        if start_date:
+            conditions.append('"日期" >= ?')
+            params.append(self._format_date(start_date))
+        if end_date:
+            conditions.append('"日期" <= ?')
+            params.append(self._format_date(end_date))
+        where = f'WHERE {" AND ".join(conditions)}'
+        
+        # 逐条换算为分后再求和，合计没有浮点尾差
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT "类型", SUM(CAST(ROUND("金额" * 100) AS INTEGER)), COUNT(*) '
+                f'FROM records {where} GROUP BY "类型"',
+                params
+            ).fetchall()
+        
+        totals = {record_type: total for record_type, total, _ in rows}
+        return {
+            'total_income': totals.get('收入', 0),
+            'total_expense': totals.get('支出', 0),
+            'record_count': sum(count for _, _, count in rows)
+        }
+
+
+# 可选的存储后端
+BACKENDS = {
+    backend.name: backend for backend in (ExcelBackend, PartitionedExcelBackend, SQLiteBackend)
+}
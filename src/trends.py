@@ -0,0 +1,256 @@
+# 收支趋势模块
+
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+from .data_manager import RECORD_TYPES
+from .metrics import timed
+
+# 可选的趋势粒度及对应的pandas周期频率，从细到粗排列
+GRANULARITIES = {
+    'day': 'D',
+    'week': 'W',
+    'month': 'M',
+    'quarter': 'Q'
+}
+
+# 粒度在页面上的名称
+GRANULARITY_LABELS = {
+    'day': '按日',
+    'week': '按周',
+    'month': '按月',
+    'quarter': '按季度'
+}
+
+# 自动选择粒度时每条曲线最多的周期数，超过时换用更粗的粒度
+AUTO_MAX_POINTS = 180
+
+# 每条曲线发送到浏览器的最多点数，超过时用LTTB降采样
+MAX_CHART_POINTS = 1500
+
+# 点数超过该值的曲线改用WebGL绘制
+WEBGL_THRESHOLD = 500
+
+# 点数不超过该值时同时画出数据点标记
+MARKER_THRESHOLD = 100
+
+# 收入、支出曲线的颜色
+TREND_COLORS = {
+    '收入': '#4caf50',
+    '支出': '#f44336'
+}
+
+# 余额走势曲线的颜色
+BALANCE_COLOR = '#2196f3'
+
+
+def choose_granularity(start_date, end_date, max_points=AUTO_MAX_POINTS):
+    """
+    选择周期数不超过max_points的最细粒度
+    
+    Args:
+        start_date (date): 开始日期
+        end_date (date): 结束日期
+        max_points (int): 最多的周期数
+    
+    Returns:
+        str: GRANULARITIES中的粒度，范围再长也不会比按季度更粗
+    """
+    for granularity, freq in GRANULARITIES.items():
+        if len(pd.period_range(start_date, end_date, freq=freq)) <= max_points:
+            return granularity
+    return 'quarter'
+
+
+@timed(rows=len)
+def aggregate_trend(rollup, granularity, start_date=None, end_date=None):
+    """
+    把按日汇总的数据按粒度合计为收入、支出两列
+    
+    Args:
+        rollup (pd.DataFrame): DataManager.get_rollup 的结果，需要 日期、类型、金额 列
+        granularity (str): GRANULARITIES中的粒度
+        start_date (date): 开始日期，默认为最早的记录
+        end_date (date): 结束日期，默认为最晚的记录
+    
+    Returns:
+        pd.DataFrame: 以各周期第一天为索引的收入、支出两列，范围内没有记录的周期为0
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的趋势粒度: {granularity}")
+    if rollup.empty:
+        return pd.DataFrame(columns=list(RECORD_TYPES), dtype=float)
+    
+    freq = GRANULARITIES[granularity]
+    periods = rollup['日期'].dt.to_period(freq)
+    totals = rollup['金额'].groupby([periods, rollup['类型']]).sum().unstack(fill_value=0)
+    
+    # 补齐没有记录的周期，曲线在这些周期落到0而不是直接连到下一个有记录的周期
+    first = pd.Period(start_date, freq) if start_date is not None else periods.min()
+    last = pd.Period(end_date, freq) if end_date is not None else periods.max()
+    index = pd.period_range(first, last, freq=freq)
+    totals = totals.reindex(index=index, columns=list(RECORD_TYPES), fill_value=0).astype(float).round(2)
+    totals.index = index.start_time
+    return totals
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets降采样，返回保留的点的位置
+    
+    首尾两点总是保留，中间的点平均分成threshold-2个桶，每个桶保留与上一个保留点、
+    下一个桶的平均点构成的三角形面积最大的点，曲线的峰值和谷值因此得以保留。
+    
+    Args:
+        x (array-like): 横坐标，单调递增
+        y (array-like): 纵坐标
+        threshold (int): 保留的点数
+    
+    Returns:
+        np.ndarray: 保留的点在输入中的位置，按顺序排列
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    
+    # 中间各桶的边界，桶宽大于1，每个桶至少有一个点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        
+        # 三角形面积的两倍，只用于比较大小
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    
+    return selected
+
+
+def downsample(series, max_points=MAX_CHART_POINTS):
+    """
+    用LTTB把以日期为索引的序列降到最多max_points个点
+    
+    Returns:
+        pd.Series: 保留的点，点数不超过max_points时原样返回
+    """
+    if len(series) <= max_points:
+        return series
+    
+    # 以相对首个日期的偏移作横坐标，避免纳秒时间戳直接相乘损失精度
+    ticks = series.index.asi8
+    positions = lttb_indices(ticks - ticks[0], series.to_numpy(), max_points)
+    return series.iloc[positions]
+
+
+@timed()
+def build_trend(rollup, granularity='auto', start_date=None, end_date=None):
+    """
+    按粒度计算收支趋势，粒度为auto时按时间范围自动选择
+    
+    Args:
+        rollup (pd.DataFrame): DataManager.get_rollup 的结果
+        granularity (str): auto 或 GRANULARITIES中的粒度
+        start_date (date): 开始日期，默认为最早的记录
+        end_date (date): 结束日期，默认为最晚的记录
+    
+    Returns:
+        tuple: (aggregate_trend的结果, 实际使用的粒度)
+    """
+    if granularity == 'auto':
+        if rollup.empty:
+            granularity = 'day'
+        else:
+            first = start_date if start_date is not None else rollup['日期'].min()
+            last = end_date if end_date is not None else rollup['日期'].max()
+            granularity = choose_granularity(first, last)
+    return aggregate_trend(rollup, granularity, start_date, end_date), granularity
+
+
+def trend_figure(trend, granularity, max_points=MAX_CHART_POINTS, webgl_threshold=WEBGL_THRESHOLD):
+    """
+    绘制收支趋势图，每条曲线的点数不超过max_points，点数多时改用WebGL
+    
+    Args:
+        trend (pd.DataFrame): build_trend 的结果
+        granularity (str): 实际使用的粒度，显示在标题中
+        max_points (int): 每条曲线最多的点数
+        webgl_threshold (int): 点数超过该值时使用Scattergl
+    
+    Returns:
+        go.Figure: 趋势图，没有任何收入和支出时返回None
+    """
+    fig = go.Figure()
+    for record_type, color in TREND_COLORS.items():
+        if record_type not in trend.columns or not trend[record_type].any():
+            continue
+        
+        series = downsample(trend[record_type], max_points)
+        trace = go.Scattergl if len(series) > webgl_threshold else go.Scatter
+        fig.add_trace(trace(
+            x=series.index,
+            y=series.to_numpy(),
+            mode='lines+markers' if len(series) <= MARKER_THRESHOLD else 'lines',
+            name=record_type,
+            line=dict(color=color, width=3 if len(series) <= MARKER_THRESHOLD else 2)
+        ))
+    
+    if not fig.data:
+        return None
+    
+    fig.update_layout(
+        title=f"📈 收支趋势（{GRANULARITY_LABELS[granularity]}）",
+        xaxis_title="日期",
+        yaxis_title="金额 (元)",
+        height=400
+    )
+    return fig
+
+
+def balance_figure(balance, max_points=MAX_CHART_POINTS, webgl_threshold=WEBGL_THRESHOLD):
+    """
+    绘制余额走势图，余额在两次记账之间保持不变，画成阶梯线
+    
+    Args:
+        balance (pd.Series): DataManager.get_balance_series 的结果
+        max_points (int): 最多的点数
+        webgl_threshold (int): 点数超过该值时使用Scattergl
+    
+    Returns:
+        go.Figure: 余额走势图，没有数据时返回None
+    """
+    if balance.empty:
+        return None
+    
+    series = downsample(balance, max_points)
+    trace = go.Scattergl if len(series) > webgl_threshold else go.Scatter
+    fig = go.Figure(trace(
+        x=series.index,
+        y=series.to_numpy(),
+        mode='lines+markers' if len(series) <= MARKER_THRESHOLD else 'lines',
+        name='余额',
+        line=dict(color=BALANCE_COLOR, width=2, shape='hv')
+    ))
+    fig.update_layout(
+        title="💳 余额走势",
+        xaxis_title="日期",
+        yaxis_title="累计结余 (元)",
+        height=400
+    )
+    return fig
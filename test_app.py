@@ -7,8 +7,8 @@
 import sys
 import os
 
-# 添加src目录到Python路径
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 def test_imports():
     """测试导入是否正常"""
@@ -40,12 +40,19 @@ def test_imports():
         print(f"❌ Plotly 导入失败: {e}")
         return False
     
+    try:
+        import pyarrow
+        print("✅ PyArrow 导入成功")
+    except ImportError as e:
+        print(f"❌ PyArrow 导入失败: {e}")
+        return False
+    
     return True
 
 def test_data_manager():
     """测试数据管理器"""
     try:
-        from data_manager import DataManager
+        from src.data_manager import DataManager
         print("✅ DataManager 导入成功")
         
         # 创建测试数据管理器
@@ -83,11 +90,1022 @@ def test_data_manager():
             print("✅ 测试数据清理完成")
         
         return True
-        
+    
     except Exception as e:
         print(f"❌ DataManager 测试失败: {e}")
         return False
 
+def test_sqlite_backend():
+    """测试SQLite存储后端"""
+    try:
+        import pandas as pd
+        from src.data_manager import DataManager
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_sqlite_data", backend="sqlite")
+        dm.add_record("收入", 1000, "💼 工资", datetime(2024, 1, 1, 9, 0), "工资")
+        dm.add_record("支出", 35.5, "🍽️ 餐饮", datetime(2024, 1, 2, 12, 0), "午饭")
+        dm.add_record("支出", 12, "🚗 交通", datetime(2024, 2, 1, 8, 0), "地铁")
+        
+        stats = dm.get_statistics(datetime(2024, 1, 1), datetime(2024, 1, 31))
+        if stats['total_income'] == 1000 and stats['total_expense'] == 35.5 and stats['record_count'] == 2:
+            print("✅ SQLite 按时间统计测试成功")
+        else:
+            print(f"❌ SQLite 按时间统计测试失败: {stats}")
+            return False
+        
+        if dm.delete_record(1) and list(dm.get_all_records()['ID']) == [2, 3]:
+            print("✅ SQLite 删除记录测试成功")
+        else:
+            print("❌ SQLite 删除记录测试失败")
+            return False
+        
+        export_path = dm.export_to_excel()
+        if export_path and len(pd.read_excel(export_path)) == 2:
+            print("✅ SQLite 导出Excel测试成功")
+        else:
+            print("❌ SQLite 导出Excel测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_sqlite_data"):
+            shutil.rmtree("test_sqlite_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ SQLite 存储后端测试失败: {e}")
+        return False
+
+def test_partitioned_backend():
+    """测试按月分区的Excel存储"""
+    try:
+        import json
+        import shutil
+        from src.data_manager import DataManager
+        from datetime import datetime, date
+        
+        dm = DataManager(data_dir="test_partition_data", backend="partitioned", fold_rows=2)
+        dm.add_records([
+            {'类型': '支出', '金额': 10, '分类': '🍽️ 餐饮', '日期': datetime(2024, month, 15, 12, 0)}
+            for month in (1, 2, 2, 3)
+        ])
+        
+        with open(dm.backend.file_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['partitions'] == ['2024-01', '2024-02', '2024-03'] and manifest['next_id'] == 5:
+            print("✅ 分区清单测试成功")
+        else:
+            print(f"❌ 分区清单测试失败: {manifest}")
+            return False
+        
+        # 重新打开后按时间范围统计只读取重叠的分区
+        reopened = DataManager(data_dir="test_partition_data", backend="partitioned")
+        stats = reopened.get_statistics(date(2024, 2, 1), date(2024, 2, 29))
+        if stats['total_expense'] == 20 and stats['record_count'] == 2 and list(reopened.backend._frames) == ['2024-02']:
+            print("✅ 按范围读取分区测试成功")
+        else:
+            print(f"❌ 按范围读取分区测试失败: {stats} {list(reopened.backend._frames)}")
+            return False
+        
+        # 改日期后记录移到新的分区，ID不变
+        reopened.update_record(1, date=datetime(2024, 4, 1, 8, 0))
+        reopened.delete_record(2)
+        records = DataManager(data_dir="test_partition_data", backend="partitioned").get_all_records()
+        if records['ID'].tolist() == [1, 3, 4] and records['日期'].iloc[0] == datetime(2024, 4, 1, 8, 0):
+            print("✅ 跨分区修改和删除测试成功")
+        else:
+            print(f"❌ 跨分区修改和删除测试失败: {records}")
+            return False
+        
+        # 多个进程或线程同时读取各分区，结果与逐个读取一致
+        for executor in ("process", "thread"):
+            parallel = DataManager(data_dir="test_partition_data", backend="partitioned",
+                                   load_workers=2, load_executor=executor).get_all_records()
+            if not parallel.equals(records):
+                print(f"❌ 并行读取分区测试失败: {executor}")
+                return False
+        print("✅ 并行读取分区测试成功")
+        
+        # 清空后ID分配进度保留
+        reopened.clear_all_data()
+        reopened.add_record("收入", 100, "💼 工资", datetime(2025, 1, 1, 9, 0))
+        if DataManager(data_dir="test_partition_data", backend="partitioned").get_all_records()['ID'].tolist() == [5]:
+            print("✅ 分区清空测试成功")
+        else:
+            print("❌ 分区清空测试失败")
+            return False
+        
+        if os.path.exists("test_partition_data"):
+            shutil.rmtree("test_partition_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 分区存储测试失败: {e}")
+        return False
+
+def test_record_cache():
+    """测试记录缓存在文件被外部修改后失效"""
+    try:
+        import time
+        import pandas as pd
+        from src.data_manager import DataManager
+        from src.storage import write_excel
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_cache_data")
+        dm.add_record("支出", 20, "🍽️ 餐饮", datetime(2024, 3, 1, 12, 0), "午饭")
+        dm.flush()
+        
+        if dm.get_all_records() is not dm.get_all_records() and dm._cache_is_valid():
+            print("✅ 记录缓存命中测试成功")
+        else:
+            print("❌ 记录缓存命中测试失败")
+            return False
+        
+        # 模拟在Excel中手动修改金额
+        version = dm.get_version()
+        df = pd.read_excel(dm.file_path)
+        df.loc[0, '金额'] = 88
+        time.sleep(0.01)
+        write_excel(df, dm.file_path)
+        
+        if dm.get_all_records()['金额'].tolist() == [88] and dm.get_version() > version:
+            print("✅ 外部修改后缓存失效测试成功")
+        else:
+            print("❌ 外部修改后缓存失效测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_cache_data"):
+            shutil.rmtree("test_cache_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 记录缓存测试失败: {e}")
+        return False
+
+def test_parquet_sidecar():
+    """测试Parquet旁路文件在与Excel一致时被直接读取，Excel被修改后重建"""
+    try:
+        import time
+        import pandas as pd
+        from src.data_manager import DataManager
+        from src.storage import write_excel
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_sidecar_data")
+        dm.add_record("支出", 20, "🍽️ 餐饮", datetime(2024, 3, 1, 12, 0), "午饭")
+        dm.flush()
+        sidecar = dm.backend.sidecar_path
+        if not os.path.exists(sidecar):
+            print("❌ 旁路文件生成测试失败")
+            return False
+        
+        # 冷启动时直接读取旁路文件；解析Excel时会重写旁路文件，修改时间不变说明没有解析Excel
+        mtime = os.stat(sidecar).st_mtime_ns
+        time.sleep(0.01)
+        if DataManager(data_dir="test_sidecar_data").get_all_records()['金额'].tolist() == [20] \
+                and os.stat(sidecar).st_mtime_ns == mtime:
+            print("✅ 读取旁路文件测试成功")
+        else:
+            print("❌ 读取旁路文件测试失败")
+            return False
+        
+        # 在程序外修改Excel后，旁路文件过期，重新解析Excel并重建
+        df = pd.read_excel(dm.file_path)
+        df.loc[0, '金额'] = 66
+        write_excel(df, dm.file_path)
+        if DataManager(data_dir="test_sidecar_data").get_all_records()['金额'].tolist() == [66] \
+                and os.stat(sidecar).st_mtime_ns != mtime \
+                and pd.read_parquet(sidecar)['金额'].tolist() == [66]:
+            print("✅ 旁路文件重建测试成功")
+        else:
+            print("❌ 旁路文件重建测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_sidecar_data"):
+            shutil.rmtree("test_sidecar_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 旁路文件测试失败: {e}")
+        return False
+
+def test_ledger_schema():
+    """测试内存中的账本格式和以分为单位的合计"""
+    try:
+        import shutil
+        import pandas as pd
+        from src.data_manager import DataManager
+        from datetime import datetime, date
+        
+        for backend in ("excel", "sqlite"):
+            data_dir = f"test_schema_data_{backend}"
+            dm = DataManager(data_dir=data_dir, backend=backend)
+            dm.add_records([
+                {'类型': '支出', '金额': 0.1, '分类': '🍽️ 餐饮', '日期': datetime(2024, 8, 1, 12, 0) + pd.Timedelta(minutes=i)}
+                for i in range(10)
+            ] + [{'类型': '收入', '金额': 0.3, '分类': None, '日期': datetime(2024, 8, 2, 9, 0)}])
+            dm.flush()
+            
+            # 缓存中类型、分类为category，金额为分；对外返回的金额仍以元为单位
+            cache = DataManager(data_dir=data_dir, backend=backend)._load_records()
+            records = dm.get_all_records()
+            if not (isinstance(cache['类型'].dtype, pd.CategoricalDtype) and isinstance(cache['分类'].dtype, pd.CategoricalDtype)
+                    and cache['金额'].dtype == 'int64' and cache['金额'].tolist()[:2] == [10, 10]
+                    and records['金额'].tolist()[-1] == 0.3 and records['分类'].tolist()[-1] == ''):
+                print(f"❌ {backend} 账本格式测试失败: {cache.dtypes.to_dict()}")
+                return False
+            
+            # 0.1累加十次没有浮点尾差，按日统计和按时刻统计结果一致
+            whole_days = dm.get_statistics()
+            with_times = dm.get_statistics(datetime(2024, 8, 1), datetime(2024, 8, 3))
+            if whole_days['total_expense'] != 1.0 or whole_days['balance'] != -0.7 or with_times != whole_days:
+                print(f"❌ {backend} 合计尾差测试失败: {whole_days} {with_times}")
+                return False
+            
+            # 修改为新的分类后仍可按分类查询和汇总
+            first_id = int(records['ID'].iloc[0])
+            dm.update_record(first_id, category="🚗 交通", amount=12.34)
+            page, total = dm.query_records(category="🚗 交通")
+            rollup = dm.get_rollup(date(2024, 8, 1), date(2024, 8, 1))
+            if (total != 1 or page['金额'].tolist() != [12.34] or dm.get_record(first_id)['金额'] != 12.34
+                    or rollup.loc[rollup['分类'] == "🚗 交通", '金额'].tolist() != [12.34]):
+                print(f"❌ {backend} 修改分类测试失败: {rollup}")
+                return False
+            
+            if os.path.exists(data_dir):
+                shutil.rmtree(data_dir)
+        
+        # 手动编辑的Excel中金额留空、缺少ID或类型无效的行被跳过，其余记录照常读取和统计
+        import openpyxl
+        dm = DataManager(data_dir="test_schema_data_edited")
+        dm.add_records([{'类型': '支出', '金额': amount, '日期': datetime(2024, 8, 1, 12, 0)} for amount in (10, 20)])
+        dm.flush()
+        workbook = openpyxl.load_workbook(dm.file_path)
+        sheet = workbook['记账记录']
+        sheet.cell(row=2, column=3).value = None
+        sheet.append([None, '收入', 50, '💼 工资', datetime(2024, 8, 2, 9, 0), None, datetime(2024, 8, 2, 9, 0)])
+        sheet.append([9, '转账', 70, '', datetime(2024, 8, 2, 9, 0), None, datetime(2024, 8, 2, 9, 0)])
+        workbook.save(dm.file_path)
+        
+        for backend_dm in (DataManager(data_dir="test_schema_data_edited"), dm):
+            stats = backend_dm.get_statistics()
+            if backend_dm.get_all_records()['ID'].tolist() != [2] or stats['total_expense'] != 20 or stats['record_count'] != 1:
+                print(f"❌ 无效记录跳过测试失败: {stats}")
+                return False
+        shutil.rmtree("test_schema_data_edited")
+        
+        print("✅ 账本格式和合计尾差测试成功")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 账本格式测试失败: {e}")
+        return False
+
+def test_stable_ids():
+    """测试按ID删除和修改记录，ID不重复使用"""
+    try:
+        from src.data_manager import DataManager
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_id_data")
+        for day in range(1, 4):
+            dm.add_record("支出", day * 10, "🍽️ 餐饮", datetime(2024, 4, day, 12, 0))
+        
+        # 删除最大ID后落盘，新记录也不能重复使用它
+        dm.delete_record(3)
+        dm.flush()
+        dm = DataManager(data_dir="test_id_data")
+        dm.add_record("收入", 500, "🎁 奖金", datetime(2024, 4, 5, 9, 0))
+        
+        if dm.get_all_records()['ID'].tolist() == [1, 2, 4] and not dm.delete_record(3):
+            print("✅ 按ID删除记录测试成功")
+        else:
+            print("❌ 按ID删除记录测试失败")
+            return False
+        
+        if dm.update_record(2, amount=25.5, note="改过") and DataManager(data_dir="test_id_data").get_record(2)['金额'] == 25.5:
+            print("✅ 按ID修改记录测试成功")
+        else:
+            print("❌ 按ID修改记录测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_id_data"):
+            shutil.rmtree("test_id_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 按ID管理记录测试失败: {e}")
+        return False
+
+def test_add_records():
+    """测试批量添加记录"""
+    try:
+        import pandas as pd
+        from src.data_manager import DataManager
+        
+        dm = DataManager(data_dir="test_batch_data")
+        
+        df = pd.DataFrame({
+            '类型': ['支出'] * 5000,
+            '金额': [12.5] * 5000,
+            '分类': ['🍽️ 餐饮'] * 5000,
+            '日期': pd.date_range('2024-01-01', periods=5000, freq='h'),
+            '备注': ['银行流水'] * 5000
+        })
+        if dm.add_records(df) == 5000 and dm.get_all_records()['ID'].tolist() == list(range(1, 5001)):
+            print("✅ 批量添加记录测试成功")
+        else:
+            print("❌ 批量添加记录测试失败")
+            return False
+        
+        # 含无效记录的批次整批不写入
+        invalid = [{'record_type': '支出', 'amount': 10, 'date': '2024-06-01'},
+                   {'record_type': '转账', 'amount': 10, 'date': '2024-06-01'}]
+        if dm.add_records(invalid) == 0 and len(dm.get_all_records()) == 5000:
+            print("✅ 批量添加校验测试成功")
+        else:
+            print("❌ 批量添加校验测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_batch_data"):
+            shutil.rmtree("test_batch_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 批量添加记录测试失败: {e}")
+        return False
+
+def test_query_records():
+    """测试分页查询记录"""
+    try:
+        import pandas as pd
+        from src.data_manager import DataManager
+        
+        dm = DataManager(data_dir="test_query_data")
+        dm.add_records(pd.DataFrame({
+            '类型': ['支出', '收入'] * 60,
+            '金额': range(1, 121),
+            '分类': ['🍽️ 餐饮', '💼 工资'] * 60,
+            '日期': pd.date_range('2024-01-01', periods=120, freq='D')[::-1]
+        }))
+        
+        # 日期降序的第二页：跳过最新的10条支出
+        page, total = dm.query_records(record_type='支出', offset=10, limit=10)
+        if total == 60 and page['ID'].tolist() == list(range(21, 41, 2)):
+            print("✅ 按日期分页查询测试成功")
+        else:
+            print("❌ 按日期分页查询测试失败")
+            return False
+        
+        page, total = dm.query_records(category='💼 工资', start_date=pd.Timestamp('2024-04-01').date(),
+                                       sort_by='金额', ascending=False, limit=3)
+        if total == 14 and page['金额'].tolist() == [28, 26, 24]:
+            print("✅ 按金额分页查询测试成功")
+        else:
+            print("❌ 按金额分页查询测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_query_data"):
+            shutil.rmtree("test_query_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 分页查询测试失败: {e}")
+        return False
+
+def test_formatting():
+    """测试记录显示格式化"""
+    try:
+        import pandas as pd
+        from src.formatting import format_records, format_record_labels
+        
+        df = pd.DataFrame({
+            '类型': ['支出', '收入'],
+            '金额': [35.5, 1000],
+            '分类': ['🍽️ 餐饮', None],
+            '日期': pd.to_datetime(['2024-01-02 12:00:30', '2024-01-03 09:05:00'])
+        })
+        display_df = format_records(df)
+        labels = format_record_labels(df).tolist()
+        
+        if (display_df['金额'].tolist() == ['¥35.50', '¥1000.00']
+                and display_df['日期'].tolist() == ['2024-01-02 12:00', '2024-01-03 09:05']
+                and labels == ['2024-01-02 12:00 - 支出 - 🍽️ 餐饮 - ¥35.50', '2024-01-03 09:05 - 收入 -  - ¥1000.00']):
+            print("✅ 记录格式化测试成功")
+            return True
+        
+        print("❌ 记录格式化测试失败")
+        return False
+    
+    except Exception as e:
+        print(f"❌ 记录格式化测试失败: {e}")
+        return False
+
+def test_import_statement():
+    """测试导入支付宝账单及重复导入去重"""
+    try:
+        from src.data_manager import DataManager
+        from src.importer import import_statement
+        
+        dm = DataManager(data_dir="test_import_data")
+        path = os.path.join("test_import_data", "alipay.csv")
+        with open(path, "w", encoding="gbk", newline="") as f:
+            f.write("支付宝交易明细\n导出时间：[2024-06-01 10:00:00]\n\n")
+            f.write("交易时间,交易分类,交易对方,商品说明,收/支,金额,交易状态,备注\n")
+            f.write("2024-05-01 12:00:00,餐饮美食,美团,午餐,支出,25.50,交易成功,/\n")
+            f.write("2024-05-01 12:00:00,餐饮美食,美团,午餐,支出,25.50,交易成功,/\n")
+            f.write("2024-05-02 09:00:00,转账红包,张三,红包,收入,88.00,交易成功,/\n")
+            f.write("2024-05-03 18:00:00,投资理财,余额宝,收益,不计收支,0.01,交易成功,/\n")
+            f.write("2024-05-04 08:00:00,交通出行,滴滴,打车,支出,30.00,交易关闭,/\n")
+        
+        preview = import_statement(dm, path, dry_run=True)
+        if preview['format'] == '支付宝' and preview['new'] == 3 and preview['skipped'] == 2 and dm.get_all_records().empty:
+            print("✅ 账单预览测试成功")
+        else:
+            print(f"❌ 账单预览测试失败: {preview}")
+            return False
+        
+        # 同一账单中相同的两笔交易都导入，再次导入时全部跳过
+        first = import_statement(dm, path)
+        second = import_statement(dm, path)
+        records = dm.get_all_records()
+        if first['imported'] == 3 and second['duplicates'] == 3 and second['imported'] == 0 and records['备注'].tolist()[0] == '美团 午餐':
+            print("✅ 账单导入去重测试成功")
+        else:
+            print("❌ 账单导入去重测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_import_data"):
+            shutil.rmtree("test_import_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 账单导入测试失败: {e}")
+        return False
+
+def test_trends():
+    """测试收支趋势的粒度选择、合计和降采样"""
+    try:
+        import numpy as np
+        import pandas as pd
+        from datetime import date
+        from src.trends import choose_granularity, build_trend, trend_figure, lttb_indices
+        
+        if [choose_granularity(date(2024, 1, 1), end) for end in (date(2024, 3, 1), date(2026, 1, 1), date(2034, 1, 1))] \
+                != ['day', 'week', 'month']:
+            print("❌ 趋势粒度选择测试失败")
+            return False
+        
+        # 五年的按日汇总数据，每天一笔收入和一笔支出
+        days = pd.date_range('2020-01-01', '2024-12-31')
+        rollup = pd.DataFrame({
+            '日期': np.repeat(days, 2),
+            '类型': ['收入', '支出'] * len(days),
+            '分类': '',
+            '金额': 10.0,
+            '笔数': 1
+        })
+        trend, granularity = build_trend(rollup, 'auto')
+        if granularity != 'month' or len(trend) != 60 or trend.loc['2024-02-01', '支出'] != 290:
+            print(f"❌ 按月合计测试失败: {granularity} {len(trend)}")
+            return False
+        
+        # 按日显示五年时降采样并改用WebGL，发送到浏览器的点数有上限
+        trend, granularity = build_trend(rollup, 'day')
+        fig = trend_figure(trend, granularity, max_points=1000, webgl_threshold=500)
+        if len(trend) != len(days) or [(trace.type, len(trace.x)) for trace in fig.data] != [('scattergl', 1000)] * 2:
+            print(f"❌ 趋势降采样测试失败: {[(trace.type, len(trace.x)) for trace in fig.data]}")
+            return False
+        
+        # LTTB保留首尾两点和尖峰
+        values = np.sin(np.linspace(0, 20, 10000))
+        values[5000] = 5
+        kept = lttb_indices(np.arange(10000), values, 100)
+        if len(kept) == 100 and kept[0] == 0 and kept[-1] == 9999 and 5000 in kept:
+            print("✅ 收支趋势测试成功")
+        else:
+            print("❌ LTTB降采样测试失败")
+            return False
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 收支趋势测试失败: {e}")
+        return False
+
+def test_running_balance():
+    """测试累计结余的增量维护、按时刻查询和余额走势"""
+    try:
+        from src.data_manager import DataManager
+        from src.trends import balance_figure
+        from datetime import date, datetime
+        
+        dm = DataManager(data_dir="test_balance_data")
+        dm.add_records([
+            {'record_type': '收入', 'amount': 1000, 'category': '💼 工资', 'date': datetime(2024, 6, 1, 9, 0)},
+            {'record_type': '支出', 'amount': 30.1, 'category': '🍽️ 餐饮', 'date': datetime(2024, 6, 2, 12, 0)},
+            {'record_type': '支出', 'amount': 0.2, 'category': '🍽️ 餐饮', 'date': datetime(2024, 6, 2, 18, 0)},
+            {'record_type': '支出', 'amount': 100, 'category': '🛒 购物', 'date': datetime(2024, 6, 5, 20, 0)}
+        ])
+        if [dm.balance_at(when) for when in (date(2024, 5, 31), datetime(2024, 6, 2, 12, 0), date(2024, 6, 2))] \
+                != [0, 969.9, 969.7]:
+            print("❌ 按时刻查询累计结余测试失败")
+            return False
+        
+        # 在中间插入、删除和修改记录后，累计结余只更新其后的部分，结果与重新计算一致
+        dm.add_record("支出", 50, "🚗 交通", datetime(2024, 6, 1, 10, 0))
+        dm.delete_record(4)
+        dm.update_record(2, amount=20)
+        rebuilt = DataManager(data_dir="test_balance_data")
+        if dm.balance_at(date(2024, 6, 30)) != rebuilt.balance_at(date(2024, 6, 30)) or dm.balance_at(date(2024, 6, 30)) != 929.8:
+            print(f"❌ 累计结余增量维护测试失败: {dm.balance_at(date(2024, 6, 30))}")
+            return False
+        
+        # 余额走势从开始日期之前的结余接着算
+        series = dm.get_balance_series(date(2024, 6, 2))
+        fig = balance_figure(series)
+        if series.tolist() == [929.8] and len(series) == 1 and fig is not None and list(fig.data[0].y) == [929.8]:
+            print("✅ 累计结余测试成功")
+        else:
+            print(f"❌ 余额走势测试失败: {series.tolist()}")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_balance_data"):
+            shutil.rmtree("test_balance_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 累计结余测试失败: {e}")
+        return False
+
+def test_categorizer():
+    """测试分类规则、导入时自动分类和重新分类历史记录"""
+    try:
+        import pandas as pd
+        from src.data_manager import DataManager
+        from src.categorizer import Categorizer, load_rules
+        from src.importer import import_statement
+        
+        rules = [
+            {'category': '🎁 奖金', 'type': '收入', 'keywords': ['红包']},
+            {'category': '🍽️ 餐饮', 'type': '支出', 'keywords': ['美团', '红包']},
+            {'category': '🛒 购物', 'type': '支出', 'min_amount': 1000},
+            {'category': '🚗 交通', 'pattern': r'^滴滴\s*\d+'}
+        ]
+        categorizer = Categorizer(rules)
+        df = pd.DataFrame({
+            '类型': ['支出', '收入', '支出', '支出', '支出', '支出'],
+            '金额': [25.5, 88.0, 3000.0, 30.0, 12.0, 5.0],
+            '备注': ['美团 午餐', '张三 红包', '电脑', '滴滴 123', '红包封面', None]
+        })
+        # 第五条的“红包”先命中收入规则，类型不符时仍要落到后面的餐饮规则
+        expected = ['🍽️ 餐饮', '🎁 奖金', '🛒 购物', '🚗 交通', '🍽️ 餐饮', None]
+        if categorizer.categorize(df).tolist() == expected:
+            print("✅ 分类规则匹配测试成功")
+        else:
+            print(f"❌ 分类规则匹配测试失败: {categorizer.categorize(df).tolist()}")
+            return False
+        
+        # 内联全局标志、反向引用和同名分组的正则不能直接合并，单独匹配且不抛出re.error
+        special = Categorizer([
+            {'category': '🚗 交通', 'pattern': '(?i)didi'},
+            {'category': '🎮 娱乐', 'pattern': r'(哈)\1'},
+            {'category': '🛒 购物', 'pattern': r'(?P<shop>淘宝)店'},
+            {'category': '📚 教育', 'type': '支出', 'pattern': r'(?P<shop>书)店'},
+            {'category': '🍽️ 餐饮', 'keywords': ['didi']}
+        ])
+        notes = pd.DataFrame({'备注': ['DiDi 打车', '哈哈', '淘宝店', '书店', '其他'], '类型': '支出', '金额': 10.0})
+        try:
+            Categorizer([{'category': '🚗 交通', 'pattern': '(滴滴'}])
+            invalid_rejected = False
+        except ValueError:
+            invalid_rejected = True
+        if special.categorize(notes).tolist() == ['🚗 交通', '🎮 娱乐', '🛒 购物', '📚 教育', None] and invalid_rejected:
+            print("✅ 特殊正则规则测试成功")
+        else:
+            print(f"❌ 特殊正则规则测试失败: {special.categorize(notes).tolist()}")
+            return False
+        
+        dm = DataManager(data_dir="test_categorizer_data")
+        path = os.path.join("test_categorizer_data", "alipay.csv")
+        with open(path, "w", encoding="gbk", newline="") as f:
+            f.write("交易时间,交易对方,商品说明,收/支,金额,交易状态\n")
+            f.write("2024-05-01 12:00:00,美团,午餐,支出,25.50,交易成功\n")
+            f.write("2024-05-02 09:00:00,某商户,杂项,支出,8.00,交易成功\n")
+        
+        import_statement(dm, path, categorizer=categorizer)
+        if dm.get_all_records()['分类'].tolist() == ['🍽️ 餐饮', '其他']:
+            print("✅ 导入时自动分类测试成功")
+        else:
+            print("❌ 导入时自动分类测试失败")
+            return False
+        
+        # 新规则只改默认分类的记录，修改写入存储后重新读取也一致
+        dm.add_record('支出', 60.0, '其他', pd.Timestamp('2024-05-03'), '美团 晚餐')
+        version = dm.get_version()
+        changed = dm.recategorize(Categorizer([{'category': '🎮 娱乐', 'keywords': ['杂项', '美团']}]), only=['其他'])
+        reloaded = DataManager(data_dir="test_categorizer_data").get_all_records()
+        if (changed == 2 and dm.get_version() > version
+                and reloaded['分类'].tolist() == ['🍽️ 餐饮', '🎮 娱乐', '🎮 娱乐']
+                and dm.get_rollup()['笔数'].sum() == 3):
+            print("✅ 重新分类历史记录测试成功")
+        else:
+            print("❌ 重新分类历史记录测试失败")
+            return False
+        
+        # 规则文件不存在时写入默认规则
+        if load_rules("test_categorizer_data") and os.path.exists(os.path.join("test_categorizer_data", "category_rules.json")):
+            print("✅ 默认分类规则测试成功")
+        else:
+            print("❌ 默认分类规则测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_categorizer_data"):
+            shutil.rmtree("test_categorizer_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 自动分类测试失败: {e}")
+        return False
+
+def test_csv_export():
+    """测试分块流式导出CSV"""
+    try:
+        import gzip
+        import io
+        import pandas as pd
+        from src.data_manager import DataManager
+        from datetime import date
+        
+        dm = DataManager(data_dir="test_export_data")
+        dm.add_records(pd.DataFrame({
+            '类型': ['支出', '收入'] * 50,
+            '金额': [9.9] * 100,
+            '分类': ['🍽️ 餐饮', '💼 工资'] * 50,
+            '日期': pd.date_range('2024-05-01', periods=100, freq='D'),
+            '备注': ['含,逗号'] * 100
+        }))
+        
+        # 分成多块时BOM和表头只出现一次
+        data = b"".join(dm.iter_csv(chunk_size=7))
+        df = pd.read_csv(io.BytesIO(data), encoding='utf-8-sig')
+        if data.count(b'\xef\xbb\xbf') == 1 and len(df) == 100 and df['备注'].iloc[0] == '含,逗号':
+            print("✅ 分块导出CSV测试成功")
+        else:
+            print("❌ 分块导出CSV测试失败")
+            return False
+        
+        data = b"".join(dm.iter_csv(chunk_size=7, compress=True, start_date=date(2024, 5, 1),
+                                    end_date=date(2024, 5, 31), record_type='支出'))
+        df = pd.read_csv(io.BytesIO(gzip.decompress(data)), encoding='utf-8-sig')
+        if len(df) == 16 and set(df['类型']) == {'支出'}:
+            print("✅ 筛选并压缩导出测试成功")
+        else:
+            print("❌ 筛选并压缩导出测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_export_data"):
+            shutil.rmtree("test_export_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 导出CSV测试失败: {e}")
+        return False
+
+def test_metrics():
+    """测试性能统计和Prometheus格式导出"""
+    try:
+        import urllib.request
+        import pandas as pd
+        from src.data_manager import DataManager
+        from src.metrics import metrics
+        
+        metrics.reset()
+        metrics.enable()
+        try:
+            dm = DataManager(data_dir="test_metrics_data")
+            dm.add_records(pd.DataFrame({
+                '类型': ['支出'] * 20,
+                '金额': [9.9] * 20,
+                '分类': ['🍽️ 餐饮'] * 20,
+                '日期': pd.date_range('2024-05-01', periods=20, freq='D'),
+                '备注': [''] * 20
+            }))
+            dm.get_all_records()
+            dm.get_all_records()
+            dm.delete_record(1)
+            b"".join(dm.iter_csv())
+            
+            snapshot = metrics.snapshot()
+            operations = snapshot['operations']
+            if (operations['add_records']['count'] == 1 and operations['add_records']['rows'] == 20
+                    and operations['add_records']['bytes_written'] > 0
+                    and operations['delete_record']['rows'] == 1
+                    and operations['iter_csv']['bytes_written'] > 0
+                    and snapshot['cache']['records']['hits'] >= 1):
+                print("✅ 操作统计测试成功")
+            else:
+                print(f"❌ 操作统计测试失败: {operations}")
+                return False
+            
+            # 操作内捕获的错误也会被记录
+            dm.export_to_csv(os.path.join("test_metrics_data", "不存在的目录", "out.csv"))
+            text = metrics.to_prometheus()
+            server = metrics.serve_prometheus(0)
+            try:
+                url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+                served = urllib.request.urlopen(url, timeout=5).read().decode('utf-8')
+            finally:
+                server.shutdown()
+            if ('myaccount_operation_duration_seconds_count{operation="add_records"} 1' in text
+                    and 'myaccount_operation_errors_total{operation="export_to_csv"} 1' in text
+                    and 'myaccount_cache_requests_total{cache="records",result="hit"}' in served):
+                print("✅ Prometheus格式导出测试成功")
+            else:
+                print("❌ Prometheus格式导出测试失败")
+                return False
+        finally:
+            metrics.disable()
+            metrics.reset()
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_metrics_data"):
+            shutil.rmtree("test_metrics_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 性能统计测试失败: {e}")
+        return False
+
+def test_profiler():
+    """测试页面运行耗时分析"""
+    try:
+        import time
+        from src import profiler
+        
+        if (profiler.resolve_mode(None, '1') != 'timing' or profiler.resolve_mode('cprofile', '1') != 'cprofile'
+                or profiler.resolve_mode('', 'off') is not None):
+            print("❌ 分析方式识别测试失败")
+            return False
+        
+        # 未开启时section和checkpoint什么也不做
+        profiler.activate(None)
+        with profiler.section("页面"):
+            profiler.checkpoint("读取")
+        
+        rerun_profiler = profiler.RerunProfiler('cprofile')
+        profiler.activate(rerun_profiler)
+        try:
+            profiler.checkpoint("侧边栏")
+            with profiler.section("页面", profile=True):
+                time.sleep(0.01)
+                profiler.checkpoint("读取")
+                sorted(range(1000))
+                profiler.checkpoint("渲染")
+        finally:
+            profiler.activate(None)
+        
+        names = [(row['name'], row['depth']) for row in rerun_profiler.rows]
+        page = rerun_profiler.rows[1]
+        if (names == [("侧边栏", 0), ("页面", 0), ("读取", 1), ("渲染", 1)] and page['seconds'] >= 0.01
+                and 'function calls' in rerun_profiler.profile_text):
+            print("✅ 分段耗时和cProfile分析测试成功")
+        else:
+            print(f"❌ 分段耗时和cProfile分析测试失败: {names}")
+            return False
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 耗时分析测试失败: {e}")
+        return False
+
+def test_journal_recovery():
+    """测试追加日志的清空操作和合并中断后的重放"""
+    try:
+        import shutil
+        from src.data_manager import DataManager
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_journal_data")
+        dm.add_record("支出", 10, "🍽️ 餐饮", datetime(2024, 7, 1, 12, 0))
+        dm.flush()
+        dm.add_record("支出", 20, "🍽️ 餐饮", datetime(2024, 7, 2, 12, 0))
+        dm.clear_all_data()
+        dm.add_record("收入", 30, "💼 工资", datetime(2024, 7, 3, 9, 0))
+        
+        # 清空只写入日志，重新打开后重放结果一致，被清掉的ID也不会重复使用
+        if DataManager(data_dir="test_journal_data").get_all_records()['ID'].tolist() == [3]:
+            print("✅ 日志清空重放测试成功")
+        else:
+            print("❌ 日志清空重放测试失败")
+            return False
+        
+        # 模拟合并进Excel后、删除日志前崩溃：日志被重放两次也不会重复记录
+        dm.add_record("支出", 40, "🚗 交通", datetime(2024, 7, 4, 8, 0))
+        shutil.copy(dm.backend.journal_path, "test_journal_data/journal.bak")
+        dm.flush()
+        shutil.move("test_journal_data/journal.bak", dm.backend.journal_path)
+        
+        dm = DataManager(data_dir="test_journal_data")
+        if dm.get_all_records()['ID'].tolist() == [3, 4] and dm.flush() and len(dm.get_all_records()) == 2:
+            print("✅ 合并中断重放测试成功")
+        else:
+            print("❌ 合并中断重放测试失败")
+            return False
+        
+        # 写入中断在日志末尾留下没有换行的残缺行，下一次追加的记录不能与它连成一行而丢失
+        dm.add_record("支出", 50, "🚗 交通", datetime(2024, 7, 5, 8, 0))
+        with open(dm.backend.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"ID": 6, "类型": "支')
+        added = DataManager(data_dir="test_journal_data").add_record("支出", 60, "🚗 交通", datetime(2024, 7, 6, 8, 0))
+        if added and DataManager(data_dir="test_journal_data").get_all_records()['金额'].tolist() == [30, 40, 50, 60]:
+            print("✅ 残缺日志行后追加测试成功")
+        else:
+            print("❌ 残缺日志行后追加测试失败")
+            return False
+        dm = DataManager(data_dir="test_journal_data")
+        
+        # 备注整列为空的Excel会被读成float64，没有旁路文件时重放修改备注的日志也要能读出
+        from src.storage import write_excel
+        records = dm.get_all_records().assign(备注=None)
+        shutil.rmtree("test_journal_data")
+        os.makedirs("test_journal_data")
+        write_excel(records, os.path.join("test_journal_data", "account_records.xlsx"))
+        DataManager(data_dir="test_journal_data").update_record(3, note="补记")
+        dm = DataManager(data_dir="test_journal_data")
+        if dm.get_all_records()['备注'].tolist() == ["补记", "", "", ""] and dm.flush() \
+                and DataManager(data_dir="test_journal_data").get_record(3)['备注'] == "补记":
+            print("✅ 空备注列重放测试成功")
+        else:
+            print("❌ 空备注列重放测试失败")
+            return False
+        
+        # 清理测试数据
+        if os.path.exists("test_journal_data"):
+            shutil.rmtree("test_journal_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 追加日志测试失败: {e}")
+        return False
+
+def _concurrent_writer(data_dir, count):
+    """在独立进程中逐条添加记录"""
+    from src.data_manager import DataManager
+    from datetime import datetime
+    dm = DataManager(data_dir=data_dir, fold_rows=30)
+    for _ in range(count):
+        dm.add_record("支出", 1, "🚗 交通", datetime(2024, 8, 1, 8, 0))
+
+def test_concurrent_writes():
+    """测试多线程、多进程同时写入不丢记录，以及版本冲突检测"""
+    try:
+        import multiprocessing
+        from concurrent.futures import ThreadPoolExecutor
+        from src.data_manager import DataManager
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_lock_data", fold_rows=30)
+        
+        # 两个进程和同一进程内的多个线程同时写入
+        processes = [multiprocessing.Process(target=_concurrent_writer, args=("test_lock_data", 40)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda i: dm.add_record("支出", 2, "🍽️ 餐饮", datetime(2024, 8, 2, 12, 0)), range(80)
+            ))
+        for process in processes:
+            process.join()
+        
+        ids = DataManager(data_dir="test_lock_data").get_all_records()['ID']
+        if all(results) and len(ids) == 160 and ids.is_unique:
+            print("✅ 并发写入测试成功")
+        else:
+            print(f"❌ 并发写入测试失败: {len(ids)} 条记录")
+            return False
+        
+        # 读取后数据被其他会话修改，按旧版本删除会被拒绝
+        version = dm.get_version()
+        DataManager(data_dir="test_lock_data").delete_record(int(ids.iloc[0]))
+        if not dm.delete_record(int(ids.iloc[1]), expected_version=version) and dm.delete_record(int(ids.iloc[1]), expected_version=dm.get_version()):
+            print("✅ 版本冲突检测测试成功")
+        else:
+            print("❌ 版本冲突检测测试失败")
+            return False
+        
+        # 模拟Windows：其他进程长时间持锁时一直等待，而不是像LK_LOCK那样重试约10次后报错
+        from types import SimpleNamespace
+        from src import storage
+        attempts = []
+        def locking(fd, mode, size):
+            attempts.append(mode)
+            if mode == 'nb' and len(attempts) <= 30:
+                raise OSError("locked")
+        fcntl, msvcrt, interval = storage.fcntl, getattr(storage, 'msvcrt', None), storage.LOCK_RETRY_INTERVAL
+        storage.fcntl = None
+        storage.msvcrt = SimpleNamespace(locking=locking, LK_NBLCK='nb', LK_LOCK='lock', LK_UNLCK='unlock')
+        storage.LOCK_RETRY_INTERVAL = 0
+        try:
+            with storage.FileLock(os.path.join("test_lock_data", "windows.lock")):
+                pass
+        finally:
+            storage.fcntl, storage.LOCK_RETRY_INTERVAL = fcntl, interval
+            if msvcrt is None:
+                del storage.msvcrt
+            else:
+                storage.msvcrt = msvcrt
+        if attempts == ['nb'] * 31 + ['unlock']:
+            print("✅ Windows文件锁等待测试成功")
+        else:
+            print(f"❌ Windows文件锁等待测试失败: {len(attempts)} 次调用")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_lock_data"):
+            shutil.rmtree("test_lock_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 并发写入测试失败: {e}")
+        return False
+
+def test_async_writes():
+    """测试后台线程异步添加记录"""
+    try:
+        import time
+        from src.data_manager import DataManager
+        from datetime import datetime
+        
+        dm = DataManager(data_dir="test_async_data")
+        futures = [dm.add_record_async("支出", 5, "🛒 购物", datetime(2024, 9, day, 10, 0)) for day in range(1, 31)]
+        invalid = dm.add_record_async("支出", -5, "🛒 购物", datetime(2024, 9, 1, 10, 0))
+        
+        if all(future.result(timeout=10) for future in futures) and not invalid.result(timeout=10):
+            print("✅ 异步添加记录测试成功")
+        else:
+            print("❌ 异步添加记录测试失败")
+            return False
+        
+        # 后台线程已取出批次、还在写入时，wait_for_writes也要等它写完
+        append = dm.backend.append
+        dm.backend.append = lambda df: time.sleep(0.2) or append(df)
+        future = dm.add_records_async([{'类型': '收入', '金额': 100, '日期': '2024-09-30'}])
+        time.sleep(0.05)
+        if dm.wait_for_writes() and future.done() and DataManager(data_dir="test_async_data").get_all_records()['ID'].tolist() == list(range(1, 32)):
+            print("✅ 等待后台写入测试成功")
+        else:
+            print("❌ 等待后台写入测试失败")
+            return False
+        
+        # 清理测试数据
+        import shutil
+        if os.path.exists("test_async_data"):
+            shutil.rmtree("test_async_data")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ 异步添加记录测试失败: {e}")
+        return False
+
 def main():
     """主测试函数"""
     print("=" * 50)
@@ -106,6 +1124,120 @@ def main():
         print("\n❌ 数据管理器测试失败")
         return False
     
+    # 测试SQLite存储后端
+    print("\n🗃️ 测试SQLite存储后端...")
+    if not test_sqlite_backend():
+        print("\n❌ SQLite存储后端测试失败")
+        return False
+    
+    # 测试分区存储
+    print("\n🗂️ 测试分区存储...")
+    if not test_partitioned_backend():
+        print("\n❌ 分区存储测试失败")
+        return False
+    
+    # 测试记录缓存
+    print("\n⚡ 测试记录缓存...")
+    if not test_record_cache():
+        print("\n❌ 记录缓存测试失败")
+        return False
+    
+    # 测试Parquet旁路文件
+    print("\n🪶 测试Parquet旁路文件...")
+    if not test_parquet_sidecar():
+        print("\n❌ Parquet旁路文件测试失败")
+        return False
+    
+    # 测试账本格式
+    print("\n🧮 测试账本格式...")
+    if not test_ledger_schema():
+        print("\n❌ 账本格式测试失败")
+        return False
+    
+    # 测试按ID管理记录
+    print("\n🔑 测试按ID管理记录...")
+    if not test_stable_ids():
+        print("\n❌ 按ID管理记录测试失败")
+        return False
+    
+    # 测试批量添加记录
+    print("\n📥 测试批量添加记录...")
+    if not test_add_records():
+        print("\n❌ 批量添加记录测试失败")
+        return False
+    
+    # 测试追加日志
+    print("\n📒 测试追加日志...")
+    if not test_journal_recovery():
+        print("\n❌ 追加日志测试失败")
+        return False
+    
+    # 测试并发写入
+    print("\n🔒 测试并发写入...")
+    if not test_concurrent_writes():
+        print("\n❌ 并发写入测试失败")
+        return False
+    
+    # 测试异步添加记录
+    print("\n⏳ 测试异步添加记录...")
+    if not test_async_writes():
+        print("\n❌ 异步添加记录测试失败")
+        return False
+    
+    # 测试分页查询
+    print("\n📄 测试分页查询...")
+    if not test_query_records():
+        print("\n❌ 分页查询测试失败")
+        return False
+    
+    # 测试记录格式化
+    print("\n🧾 测试记录格式化...")
+    if not test_formatting():
+        print("\n❌ 记录格式化测试失败")
+        return False
+    
+    # 测试导入账单
+    print("\n📥 测试导入账单...")
+    if not test_import_statement():
+        print("\n❌ 导入账单测试失败")
+        return False
+    
+    # 测试收支趋势
+    print("\n📈 测试收支趋势...")
+    if not test_trends():
+        print("\n❌ 收支趋势测试失败")
+        return False
+    
+    # 测试累计结余
+    print("\n💳 测试累计结余...")
+    if not test_running_balance():
+        print("\n❌ 累计结余测试失败")
+        return False
+    
+    # 测试自动分类
+    print("\n🏷️ 测试自动分类...")
+    if not test_categorizer():
+        print("\n❌ 自动分类测试失败")
+        return False
+    
+    # 测试导出CSV
+    print("\n📤 测试导出CSV...")
+    if not test_csv_export():
+        print("\n❌ 导出CSV测试失败")
+        return False
+    
+    # 测试性能统计
+    print("\n🩺 测试性能统计...")
+    if not test_metrics():
+        print("\n❌ 性能统计测试失败")
+        return False
+    
+    # 测试耗时分析
+    print("\n⏱️ 测试耗时分析...")
+    if not test_profiler():
+        print("\n❌ 耗时分析测试失败")
+        return False
+    
     print("\n" + "=" * 50)
     print("🎉 所有测试通过！应用可以正常运行")
     print("=" * 50)